@@ -0,0 +1,48 @@
+import pytest
+from django.core.cache import caches
+
+from records.audit import audit_log
+from records.authentication import revocations
+from records.caching import stats
+from records.instrumentation import metrics
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    # Test transactions roll back without post_delete signals, so cached
+    # responses would otherwise leak between tests that reuse primary keys.
+    for cache in caches.all():
+        cache.clear()
+    stats.reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def clear_token_revocations(settings):
+    # Requests would otherwise read revocation rows on their first check,
+    # adding a query to the counts tests assert; revocation tests opt in.
+    settings.PHR_JWT_REVOCATION_SYNC_INTERVAL = None
+    revocations.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def clear_request_metrics():
+    metrics.reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def buffer_audit_events(settings):
+    # A writer thread would use its own connection, which cannot see (and
+    # would wait on) the test's transaction; tests call audit_log.flush().
+    settings.PHR_AUDIT_WRITER_THREAD = False
+    audit_log.discard()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def no_idempotency_sweeper(settings):
+    # Same for the sweep of expired idempotency keys; tests purge explicitly.
+    settings.PHR_IDEMPOTENCY_SWEEPER_THREAD = False
+    yield
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'phrapi.settings')
+# Serve list/detail GETs through the native async views (records/async_views.py).
+os.environ.setdefault('PHR_ASYNC_READS', '1')
 
 application = get_asgi_application()
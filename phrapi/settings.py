@@ -4,6 +4,7 @@
 # For more information: https://docs.djangoproject.com/en/5.1/topics/settings/
 # Full list: https://docs.djangoproject.com/en/5.1/ref/settings/
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,12 +40,129 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'records.authentication.RoleClaimJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Keyset pagination on every list endpoint; clients may lower or raise
+    # the page size with ?page_size= up to PHR_MAX_PAGE_SIZE.
+    'DEFAULT_PAGINATION_CLASS': 'records.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # JSON rendering is timed for the instrumentation middleware.
+    'DEFAULT_RENDERER_CLASSES': (
+        'records.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+}
+
+PHR_MAX_PAGE_SIZE = 500
+
+# Render appointment and health record list pages from .values() rows instead
+# of per-row serializer instances (records/fastpath.py).
+PHR_FAST_LIST_SERIALIZATION = False
+
+# Bulk create/update endpoints: rows per INSERT/UPDATE batch and items per request.
+PHR_BULK_BATCH_SIZE = 500
+PHR_BULK_MAX_ITEMS = 5000
+
+# Bulk user provisioning (records/provisioning.py): users per transaction,
+# and threads hashing passwords (None: one per CPU).
+PHR_PROVISION_BATCH_SIZE = 500
+PHR_PROVISION_HASH_WORKERS = None
+
+# ?ids= multi-gets on list endpoints: ids per request, and ids per IN query
+# (Django assumes SQLite's limit of 999 bound parameters per statement).
+PHR_MAX_MULTI_GET_IDS = 500
+PHR_MULTI_GET_BATCH_SIZE = 500
+
+# PHI access audit log (records/audit.py): which models' reads and writes are
+# recorded, responses queued before requests block, and the writer thread's
+# flush thresholds (events per batch, seconds).
+PHR_AUDIT_ENABLED = True
+PHR_AUDIT_MODELS = ['records.patient', 'records.healthrecord', 'records.prescription']
+PHR_AUDIT_QUEUE_SIZE = 10000
+PHR_AUDIT_BATCH_SIZE = 1000
+PHR_AUDIT_FLUSH_INTERVAL = 1.0
+PHR_AUDIT_WRITER_THREAD = True
+
+# Idempotency-Key on create endpoints (records/idempotency.py): how long
+# responses are kept for replay, how long a duplicate waits for the first
+# request before 409, after how long a pending key counts as abandoned, and
+# how often the background sweep purges expired keys (seconds).
+PHR_IDEMPOTENCY_TTL = 86400
+PHR_IDEMPOTENCY_WAIT = 10
+PHR_IDEMPOTENCY_LOCK_TIMEOUT = 60
+PHR_IDEMPOTENCY_SWEEP_INTERVAL = 300
+PHR_IDEMPOTENCY_SWEEPER_THREAD = True
+
+# Hot/cold archival (records/archive.py, manage.py archive_records): age in
+# days after which completed and cancelled appointments, with their
+# prescriptions, and health records move to the archive tables, and rows
+# moved per transaction.
+PHR_ARCHIVE_APPOINTMENT_DAYS = 365
+PHR_ARCHIVE_HEALTH_RECORD_DAYS = 1095
+PHR_ARCHIVE_CHUNK_SIZE = 500
+
+# Rows fetched per round-trip when streaming patient exports.
+PHR_EXPORT_CHUNK_SIZE = 2000
+
+# Longest bookable appointment; bounds the overlap query's index range scan.
+PHR_MAX_APPOINTMENT_MINUTES = 480
+# Longest range a doctor's availability can be searched over.
+PHR_MAX_AVAILABILITY_DAYS = 31
+
+# Access tokens carry role and staff claims, so requests authenticate and
+# authorize without reading User or UserProfile rows.
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'records.serializers.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'records.serializers.RoleTokenRefreshSerializer',
 }
+# Token ids (jti) to reject in addition to runtime revocations.
+PHR_JWT_REVOKED_JTIS = []
+# Seconds between each worker's reads of revocations made by the others
+# (None: only when refreshing tokens).
+PHR_JWT_REVOCATION_SYNC_INTERVAL = 5
+
+# Route list/detail GETs to native async views. phrapi/asgi.py enables this;
+# under WSGI the sync views are used directly.
+PHR_ASYNC_READS = os.environ.get('PHR_ASYNC_READS') == '1'
+
+# Cache backend for GET responses (records/caching.py). Local memory by
+# default; set PHR_CACHE_DIR for a file-based cache shared by local worker
+# processes, or PHR_REDIS_URL (requires the redis package) for Redis.
+if os.environ.get('PHR_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['PHR_REDIS_URL'],
+        }
+    }
+elif os.environ.get('PHR_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['PHR_CACHE_DIR'],
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'phrapi-responses',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+PHR_RESPONSE_CACHE_ENABLED = True
+PHR_RESPONSE_CACHE_ALIAS = 'default'
+# Seconds a cached response lives; invalidation normally evicts it sooner.
+PHR_RESPONSE_CACHE_TIMEOUT = 300
+
+# Fraction of requests the instrumentation middleware times (Server-Timing
+# header and the per-endpoint histograms at /api/_metrics/); 0 disables it.
+PHR_METRICS_SAMPLE_RATE = float(os.environ.get('PHR_METRICS_SAMPLE_RATE', '0.1'))
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Patient Health Records API',
@@ -53,11 +171,14 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    # First, so its total covers the rest of the stack.
+    'records.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'records.routing.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -89,10 +210,68 @@ WSGI_APPLICATION = 'phrapi.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # PHR_SQLITE_PATH points benchmarks and demos at a throwaway database file.
+        'NAME': os.environ.get('PHR_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# 'basic' is the stock Django configuration. 'production' (opt in with
+# PHR_DB_PROFILE=production) tunes SQLite for concurrent readers and writers;
+# it switches the database file to WAL mode, so it is not the default for
+# the checked-in db.sqlite3.
+PHR_DB_PROFILE = os.environ.get('PHR_DB_PROFILE', 'basic')
+
+# Applied to every new connection under the production profile.
+PHR_SQLITE_PRAGMAS = {
+    # Readers no longer block the writer, nor the writer readers.
+    'journal_mode': 'WAL',
+    # In WAL mode, only checkpoints fsync; still durable against app crashes.
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are KiB: 64 MiB of page cache per connection.
+    'cache_size': -64000,
+    # Wait up to 5 s for the write lock instead of failing at once.
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+PHR_SQLITE_PRODUCTION = {
+    # Keep connections (and their page cache and mmap) across requests.
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in PHR_SQLITE_PRAGMAS.items()),
+        # Take the write lock at BEGIN: a deferred transaction that reads
+        # first fails with "database is locked" when it tries to write
+        # after another writer, with no chance of busy_timeout waiting.
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+
+if PHR_DB_PROFILE == 'production':
+    DATABASES['default'].update(PHR_SQLITE_PRODUCTION)
+
+# Read replicas: SQLite files (separated by os.pathsep) holding copies of the
+# primary, refreshed with `manage.py sync_replicas`. records.routing sends
+# GET reads of the records app to them; see docs/model_design.md.
+PHR_READ_REPLICAS = [path for path in os.environ.get('PHR_READ_REPLICAS', '').split(os.pathsep) if path]
+for index, path in enumerate(PHR_READ_REPLICAS, 1):
+    options = dict(DATABASES['default'].get('OPTIONS', {}))
+    # Replica connections refuse writes.
+    options['init_command'] = ';'.join(filter(None, [options.get('init_command'), 'PRAGMA query_only=1']))
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'], 'NAME': path, 'OPTIONS': options,
+        # No separate test databases; the suite runs without replicas.
+        'TEST': {'MIRROR': 'default'},
+    }
+PHR_REPLICA_DATABASES = [f'replica{index}' for index in range(1, len(PHR_READ_REPLICAS) + 1)]
+# 'round_robin' or 'least_loaded' (fewest in-flight requests in this process).
+PHR_REPLICA_SELECTION = os.environ.get('PHR_REPLICA_SELECTION', 'round_robin')
+# After a write, its user reads from the primary for this many seconds.
+PHR_PRIMARY_STICKY_SECONDS = 5
+
+DATABASE_ROUTERS = ['records.routing.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -0,0 +1,135 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .caching import invalidate_instances
+from .models import (
+	Appointment, Prescription, HealthRecord, ArchivedAppointment, ArchivedPrescription, ArchivedHealthRecord,
+	AppointmentWithArchive, PrescriptionWithArchive, HealthRecordWithArchive,
+)
+
+ARCHIVED_STATUSES = ['completed', 'cancelled']
+
+# (read-only union model, hot model, archive model)
+UNION_VIEWS = [
+	(AppointmentWithArchive, Appointment, ArchivedAppointment),
+	(PrescriptionWithArchive, Prescription, ArchivedPrescription),
+	(HealthRecordWithArchive, HealthRecord, ArchivedHealthRecord),
+]
+
+
+def include_archived(request):
+	"""The ``?include_archived=`` flag of a request (true/false, 1/0, yes/no); off by default."""
+	value = request.query_params.get('include_archived')
+	if value is None:
+		return False
+	try:
+		return serializers.BooleanField().to_internal_value(value)
+	except serializers.ValidationError:
+		raise ValidationError({'include_archived': [f"Invalid value '{value}'."]})
+
+
+def _columns(model, conn):
+	return ', '.join(conn.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+
+
+def install_union_views(conn):
+	"""
+	(Re)create the views behind the ``*WithArchive`` models. Archived rows
+	keep their ids, which are never reused, so the two halves never overlap.
+	SQLite flattens ``UNION ALL`` views into the outer query, so a filtered,
+	ordered, limited read becomes a merge of two index scans.
+	"""
+	drop_union_views(conn)
+	with conn.cursor() as cursor:
+		for view_model, hot_model, archive_model in UNION_VIEWS:
+			columns = _columns(view_model, conn)
+			cursor.execute(
+				f'CREATE VIEW {conn.ops.quote_name(view_model._meta.db_table)} AS '
+				f'SELECT {columns} FROM {conn.ops.quote_name(hot_model._meta.db_table)} UNION ALL '
+				f'SELECT {columns} FROM {conn.ops.quote_name(archive_model._meta.db_table)}')
+
+
+def drop_union_views(conn):
+	with conn.cursor() as cursor:
+		for view_model, _, _ in UNION_VIEWS:
+			cursor.execute(f'DROP VIEW IF EXISTS {conn.ops.quote_name(view_model._meta.db_table)}')
+
+
+def _move(cursor, source, target, where, params):
+	"""Copy the ``source`` rows matching ``where`` into ``target`` with INSERT ... SELECT, then delete them."""
+	table = connection.ops.quote_name(source._meta.db_table)
+	columns = _columns(target, connection)
+	cursor.execute(
+		f'INSERT INTO {connection.ops.quote_name(target._meta.db_table)} ({columns}) '
+		f'SELECT {columns} FROM {table} WHERE {where}', params)
+	cursor.execute(f'DELETE FROM {table} WHERE {where}', params)
+
+
+def _archive_chunks(queryset, chunk_size, move, log=None, label=''):
+	"""
+	Move the rows of ``queryset`` ``chunk_size`` at a time, one transaction
+	per chunk. Moved rows no longer match, so an interrupted run resumes
+	where it stopped when started again.
+	"""
+	total = 0
+	while True:
+		with transaction.atomic():
+			pks = list(queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+			if not pks:
+				return total
+			move(pks)
+		total += len(pks)
+		if log:
+			log(f'{label}: {total}')
+
+
+def _move_appointments(pks):
+	placeholders = ', '.join(['%s'] * len(pks))
+	prescription_ids = list(Prescription.objects.filter(appointment_id__in=pks).values_list('pk', flat=True))
+	with connection.cursor() as cursor:
+		# Prescriptions follow their appointment, so each table's foreign keys
+		# only ever point within the hot or within the archive tables.
+		_move(cursor, Appointment, ArchivedAppointment, f'id IN ({placeholders})', pks)
+		_move(cursor, Prescription, ArchivedPrescription, f'appointment_id IN ({placeholders})', pks)
+	# No per-row signals ran; evict the cached responses showing these rows.
+	invalidate_instances(Appointment, pks)
+	invalidate_instances(Prescription, prescription_ids)
+
+
+def _move_health_records(pks):
+	with connection.cursor() as cursor:
+		_move(cursor, HealthRecord, ArchivedHealthRecord, f"id IN ({', '.join(['%s'] * len(pks))})", pks)
+	invalidate_instances(HealthRecord, pks)
+
+
+def archivable(appointment_days=None, health_record_days=None):
+	"""Querysets of the hot appointments and health records older than the archive horizons."""
+	now = timezone.now()
+	if appointment_days is None:
+		appointment_days = getattr(settings, 'PHR_ARCHIVE_APPOINTMENT_DAYS', 365)
+	if health_record_days is None:
+		health_record_days = getattr(settings, 'PHR_ARCHIVE_HEALTH_RECORD_DAYS', 3 * 365)
+	return (
+		Appointment.objects.filter(
+			status__in=ARCHIVED_STATUSES, appointment_datetime__lt=now - timedelta(days=appointment_days)),
+		HealthRecord.objects.filter(record_date__lt=(now - timedelta(days=health_record_days)).date()),
+	)
+
+
+def archive_records(appointment_days=None, health_record_days=None, chunk_size=None, log=None):
+	"""
+	Move completed and cancelled appointments (with their prescriptions) and
+	health records older than their horizons into the archive tables, in
+	chunked transactions of ``chunk_size`` rows. Returns the moved counts.
+	"""
+	chunk_size = chunk_size or getattr(settings, 'PHR_ARCHIVE_CHUNK_SIZE', 500)
+	appointments, health_records = archivable(appointment_days, health_record_days)
+	return {
+		'appointments': _archive_chunks(appointments, chunk_size, _move_appointments, log, 'appointments'),
+		'health_records': _archive_chunks(health_records, chunk_size, _move_health_records, log, 'health records'),
+	}
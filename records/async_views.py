@@ -0,0 +1,145 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, SynchronousOnlyOperation, ValidationError
+from django.http import Http404, HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.response import Response
+
+from .audit import audit_log
+from .authentication import revocations
+from .caching import get_cached, request_cache_key, response_cache_usable, set_cached
+from .conditional import not_modified, set_validators
+
+
+class AsyncReadView(View):
+	"""
+	Native async front for a DRF list/detail view class under ASGI.
+
+	GET runs on the event loop: the DRF view instance still does content
+	negotiation, claim-based authentication, permissions, filtering,
+	serialization and rendering (all CPU-only), while the database work
+	(the validator query, the keyset page or the single object) goes through
+	the async ORM. Responses match the sync view's byte for byte, including
+	ETags and the response cache. Writes and OPTIONS are handed to the sync
+	view in a worker thread, as Django would for any sync view.
+	"""
+	view_class = None
+	sync_view = None
+
+	@classmethod
+	def as_view(cls, **initkwargs):
+		initkwargs.setdefault('sync_view', initkwargs['view_class'].as_view())
+		view = super().as_view(**initkwargs)
+		# Let schema generation see the DRF view behind this one.
+		view.cls, view.initkwargs = initkwargs['view_class'], {}
+		return csrf_exempt(view)
+
+	async def get(self, request, *args, **kwargs):
+		if 'ids' in request.GET and hasattr(self.view_class, 'is_multi_get'):
+			# Multi-gets (MultiGetMixin) are served by the sync view.
+			response = await self.delegate(request, *args, **kwargs)
+			return response.render()
+		view = self.view_class()
+		view.audit_blocking = False
+		view.args, view.kwargs = args, kwargs
+		view.headers = view.default_response_headers
+		drf_request = view.initialize_request(request, *args, **kwargs)
+		view.request = drf_request
+		try:
+			# Authentication checks the revocation list, which reads other
+			# workers' revocations once its sync interval has passed; that
+			# read happens in a worker thread first.
+			async with revocations.synced_off_loop():
+				try:
+					view.initial(drf_request, *args, **kwargs)
+				except SynchronousOnlyOperation:
+					# Tokens without role claims authenticate against the database.
+					await sync_to_async(view.initial)(drf_request, *args, **kwargs)
+			response = await self.read(view, drf_request)
+		except Exception as exc:
+			response = view.handle_exception(exc)
+		response = view.finalize_response(drf_request, response, *args, **kwargs)
+		if getattr(view, 'audit_pending', None) is not None:
+			# The audit queue was full; wait for room off the event loop.
+			await sync_to_async(audit_log.put, thread_sensitive=False)(view.audit_pending)
+		# Render here so Django does not hop to a thread to do it.
+		response.render()
+		http_response = HttpResponse(response.content, status=response.status_code)
+		for header, value in response.items():
+			http_response[header] = value
+		return http_response
+
+	async def delegate(self, request, *args, **kwargs):
+		return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+	post = put = patch = delete = options = delegate
+
+	async def read(self, view, request):
+		validators = None
+		if 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers:
+			validators = await self.get_validators(view)
+			if validators and not_modified(request, *validators):
+				return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), *validators)
+
+		# Cache backends (file, Redis) block, so they are called from worker threads.
+		cache_enabled = await sync_to_async(response_cache_usable, thread_sensitive=False)()
+		key = request_cache_key(request) if cache_enabled else None
+		data = await sync_to_async(get_cached, thread_sensitive=False)(key) if cache_enabled else None
+		if data is not None:
+			response = Response(data, headers={'X-Cache': 'HIT'})
+		else:
+			data = await (self.retrieve(view) if view.is_detail_request() else self.list(view))
+			response = Response(data)
+			if cache_enabled:
+				await sync_to_async(set_cached, thread_sensitive=False)(key, data, view.get_cache_tags(data))
+				response['X-Cache'] = 'MISS'
+
+		validators = validators or view.get_data_validators(data) or await self.get_validators(view)
+		if validators:
+			set_validators(response, *validators)
+		return response
+
+	async def get_validators(self, view):
+		queryset = view.get_validator_queryset()
+		rows = None
+		if not view.is_detail_request() and view.paginator is not None:
+			rows = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+		if rows is None:
+			return view.validators_from_rows([row async for row in queryset], False)
+		return view.validators_from_rows(rows, True)
+
+	async def list(self, view):
+		reader = view.get_values_reader() if hasattr(view, 'get_values_reader') else None
+		if reader is not None:
+			queryset, render = view.get_values_queryset(reader), reader.render
+		else:
+			queryset = view.filter_queryset(view.get_queryset())
+			render = lambda objects: view.get_serializer(objects, many=True).data
+		page = None
+		if view.paginator is not None:
+			page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+		if page is None:
+			return render([obj async for obj in queryset])
+		return view.get_paginated_response(render(page)).data
+
+	async def retrieve(self, view):
+		queryset = view.filter_queryset(view.get_queryset())
+		lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+		try:
+			instance = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+		except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+			raise Http404
+		view.check_object_permissions(view.request, instance)
+		return view.get_serializer(instance).data
+
+
+def read_view(view_class):
+	"""
+	The URL view for a DRF list/detail view class: its async front when
+	PHR_ASYNC_READS is enabled (ASGI deployments), else the sync view itself.
+	"""
+	if getattr(settings, 'PHR_ASYNC_READS', False):
+		return AsyncReadView.as_view(view_class=view_class)
+	return view_class.as_view()
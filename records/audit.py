@@ -0,0 +1,204 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import AuditEvent
+from .permissions import user_role
+
+logger = logging.getLogger(__name__)
+
+AUDIT_ACTIONS = {'GET': 'read', 'POST': 'create', 'PUT': 'update', 'PATCH': 'update', 'DELETE': 'delete'}
+
+
+def is_audited(model):
+	return model._meta.label_lower in getattr(
+		settings, 'PHR_AUDIT_MODELS', ['records.patient', 'records.healthrecord', 'records.prescription'])
+
+
+def rendered_objects(serializer, items, action, objects=None):
+	"""
+	``(action, model, pk)`` for every object rendered in ``items`` (serializer
+	output dicts). Objects nested through expanded relations count as read.
+	"""
+	objects = [] if objects is None else objects
+	model = serializer.Meta.model
+	nested = [(name, field) for name, field in serializer.fields.items() if isinstance(field, serializers.BaseSerializer)]
+	audited = is_audited(model)
+	for item in items:
+		if item is None:
+			continue
+		if audited and 'id' in item:
+			objects.append((action, model, item['id']))
+		for name, field in nested:
+			if item.get(name) is not None:
+				rendered_objects(field, [item[name]], 'read', objects)
+	return objects
+
+
+def write_events(entries):
+	"""Insert the events of queued ``entries`` with batched INSERTs."""
+	AuditEvent.objects.bulk_create(
+		[
+			AuditEvent(user_id=user_id, role=role, action=action, model=model, object_id=pk, timestamp=timestamp)
+			for user_id, role, timestamp, objects in entries
+			for action, model, pk in objects
+		],
+		batch_size=getattr(settings, 'PHR_BULK_BATCH_SIZE', 500))
+
+
+class AuditLog:
+	"""
+	In-process audit queue. Requests only put one entry per response on a
+	bounded queue; a daemon writer thread takes entries off it and writes
+	their events with bulk_create once PHR_AUDIT_BATCH_SIZE events are
+	waiting or PHR_AUDIT_FLUSH_INTERVAL seconds have passed, so audited
+	requests issue no INSERT of their own and readers do not queue behind
+	SQLite's writer lock per request.
+
+	Nothing is dropped: a full queue blocks the requests adding to it until
+	the writer has made room (async views hand that wait to a worker thread
+	instead of the event loop), failed writes are retried, and at exit close()
+	waits for everything queued to be written. With PHR_AUDIT_WRITER_THREAD
+	off (as in the test suite), entries stay queued until flush(), or are
+	written by the request that finds the queue full.
+	"""
+	def __init__(self, write=write_events, maxsize=None):
+		self._write = write
+		self._queue = queue.Queue(maxsize=maxsize or getattr(settings, 'PHR_AUDIT_QUEUE_SIZE', 10000))
+		self._lock = threading.Lock()
+		self._stopping = threading.Event()
+		self._thread = None
+		self._exit_registered = False
+
+	def record(self, request, objects, block=True):
+		"""
+		Queue the audited ones among ``objects`` (``(action, model, pk)``) for
+		``request``'s user. With ``block`` off, a full queue does not wait: the
+		entry is returned instead, for the caller to put() from a thread.
+		"""
+		if not getattr(settings, 'PHR_AUDIT_ENABLED', True):
+			return None
+		objects = tuple((action, model._meta.model_name, int(pk)) for action, model, pk in objects if is_audited(model))
+		if not objects:
+			return None
+		user = request.user
+		user_id = int(user.pk) if user.is_authenticated else None
+		entry = (user_id, user_role(user) or '', timezone.now(), objects)
+		try:
+			self.put(entry, block)
+		except queue.Full:
+			return entry
+		return None
+
+	def put(self, entry, block=True):
+		"""Queue ``entry``; with ``block`` off, raise queue.Full rather than wait for room or write."""
+		self._start_writer()
+		if not block:
+			self._queue.put_nowait(entry)
+			return
+		if self._thread is None:
+			# No writer thread: the request that fills the queue writes it.
+			if self._queue.full():
+				self.flush()
+			self._queue.put_nowait(entry)
+			return
+		# Back-pressure: wait for the writer to make room rather than drop events.
+		self._queue.put(entry)
+
+	def flush(self):
+		"""Return once every event queued so far has been written."""
+		if self._thread is not None and self._thread.is_alive():
+			self._queue.join()
+			return
+		while True:
+			entries = self._next_batch(wait=False)
+			if not entries:
+				return
+			self._write_batch(entries)
+
+	def close(self):
+		"""Stop the writer thread after it has written everything queued."""
+		self._stopping.set()
+		with self._lock:
+			thread, self._thread = self._thread, None
+		if thread is not None:
+			thread.join()
+		self.flush()
+		self._stopping.clear()
+
+	def discard(self):
+		"""Drop everything queued without writing it (tests)."""
+		while True:
+			try:
+				self._queue.get_nowait()
+			except queue.Empty:
+				return
+			self._queue.task_done()
+
+	def _start_writer(self):
+		if self._thread is not None or not getattr(settings, 'PHR_AUDIT_WRITER_THREAD', True):
+			return
+		with self._lock:
+			if self._thread is None and not self._stopping.is_set():
+				self._thread = threading.Thread(target=self._run, name='phr-audit-writer', daemon=True)
+				self._thread.start()
+				if not self._exit_registered:
+					atexit.register(self.close)
+					self._exit_registered = True
+
+	def _run(self):
+		while not (self._stopping.is_set() and self._queue.empty()):
+			entries = self._next_batch(wait=True)
+			if entries:
+				# This thread's connection lives across batches; drop it if it broke.
+				close_old_connections()
+				self._write_batch(entries)
+
+	def _next_batch(self, wait):
+		"""Queued entries holding up to PHR_AUDIT_BATCH_SIZE events, waiting up to the flush interval if ``wait``."""
+		batch_size = getattr(settings, 'PHR_AUDIT_BATCH_SIZE', 1000)
+		deadline = time.monotonic() + getattr(settings, 'PHR_AUDIT_FLUSH_INTERVAL', 1.0)
+		entries, events = [], 0
+		while events < batch_size:
+			timeout = deadline - time.monotonic()
+			try:
+				if wait and timeout > 0 and not self._stopping.is_set():
+					entry = self._queue.get(timeout=timeout)
+				else:
+					entry = self._queue.get_nowait()
+			except queue.Empty:
+				break
+			entries.append(entry)
+			events += len(entry[-1])
+		return entries
+
+	def _write_batch(self, entries):
+		in_writer = threading.current_thread() is self._thread
+		attempts = 0
+		try:
+			while True:
+				try:
+					self._write(entries)
+					return
+				except Exception:
+					attempts += 1
+					events = sum(len(entry[-1]) for entry in entries)
+					# The writer retries until it succeeds; elsewhere, and at exit, give up after three tries.
+					if attempts >= 3 and not (in_writer and not self._stopping.is_set()):
+						logger.exception('Lost %d audit events after %d failed writes.', events, attempts)
+						return
+					logger.exception('Writing %d audit events failed; retrying.', events)
+					time.sleep(min(attempts, 5))
+		finally:
+			for _ in entries:
+				self._queue.task_done()
+
+
+audit_log = AuditLog()
@@ -0,0 +1,164 @@
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .instrumentation import timed
+from .models import TokenRevocation
+
+# Set while a request on the event loop authenticates after syncing from a
+# worker thread, so is_revoked() does not query on the loop.
+_synced_for_request = ContextVar('revocations_synced_for_request', default=False)
+
+
+class RevocationList:
+    """
+    Revoked tokens, shared by every worker through ``TokenRevocation`` rows
+    and mirrored in memory, so requests check them without a database or
+    cache round-trip. Tokens are revoked individually by ``jti`` or per
+    user, which rejects every token issued to that user up to now. Each
+    process reads the rows written since its last sync at most every
+    PHR_JWT_REVOCATION_SYNC_INTERVAL seconds, so a revocation reaches other
+    workers within that interval (and survives restarts); refreshes sync
+    first. With the interval set to None (as in the test suite) requests
+    only see this process's revocations. Also seeded from
+    ``PHR_JWT_REVOKED_JTIS``.
+    """
+    # Rows are read again for this long after a sync, in case a revocation
+    # committed after a later one was already read.
+    SYNC_OVERLAP = timedelta(seconds=60)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Forget the in-memory mirror; the next check reloads it from the database."""
+        with self._lock:
+            self._jtis = set(getattr(settings, 'PHR_JWT_REVOKED_JTIS', ()))
+            self._users = {}
+            self._synced_from = None
+            self._next_sync = 0
+
+    def revoke_token(self, jti):
+        self._store('token', [jti])
+
+    def revoke_user(self, user_id):
+        self.revoke_users([user_id])
+
+    def revoke_users(self, user_ids):
+        self._store('user', [str(user_id) for user_id in user_ids])
+
+    def _store(self, kind, subjects):
+        if not subjects:
+            return
+        now = timezone.now()
+        TokenRevocation.objects.bulk_create(
+            [TokenRevocation(kind=kind, subject=subject, revoked_at=now) for subject in subjects],
+            update_conflicts=True, unique_fields=['kind', 'subject'], update_fields=['revoked_at'],
+            batch_size=getattr(settings, 'PHR_BULK_BATCH_SIZE', 500))
+        self._remember([(kind, subject, now) for subject in subjects])
+
+    def _remember(self, rows):
+        with self._lock:
+            for kind, subject, revoked_at in rows:
+                if kind == 'token':
+                    self._jtis.add(subject)
+                else:
+                    self._users[subject] = max(self._users.get(subject, 0), revoked_at.timestamp())
+
+    def sync_due(self):
+        interval = getattr(settings, 'PHR_JWT_REVOCATION_SYNC_INTERVAL', 5)
+        return interval is not None and not _synced_for_request.get() and time.monotonic() >= self._next_sync
+
+    def sync(self, force=False):
+        """Read revocations written by other processes, if the sync interval has passed or ``force``."""
+        if not force and not self.sync_due():
+            return
+        interval = getattr(settings, 'PHR_JWT_REVOCATION_SYNC_INTERVAL', 5)
+        now = timezone.now()
+        # Older revocations only reject tokens that have expired anyway.
+        since = self._synced_from or now - api_settings.REFRESH_TOKEN_LIFETIME
+        rows = TokenRevocation.objects.filter(revoked_at__gte=since).values_list('kind', 'subject', 'revoked_at')
+        self._remember(list(rows))
+        with self._lock:
+            self._synced_from = now - self.SYNC_OVERLAP
+            self._next_sync = time.monotonic() + (interval or 0)
+
+    @asynccontextmanager
+    async def synced_off_loop(self):
+        """For requests on the event loop: sync() from a worker thread, then skip it in is_revoked() inside the block."""
+        if self.sync_due():
+            await sync_to_async(self.sync)()
+        token = _synced_for_request.set(True)
+        try:
+            yield
+        finally:
+            _synced_for_request.reset(token)
+
+    def is_revoked(self, token):
+        self.sync()
+        if token.get(api_settings.JTI_CLAIM) in self._jtis:
+            return True
+        revoked_at = self._users.get(str(token.get(api_settings.USER_ID_CLAIM)))
+        # Tokens issued here carry a sub-second iat (see stamp_issued_at), so
+        # one issued just after a revocation in the same second stays valid.
+        return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+
+revocations = RevocationList()
+
+
+def stamp_issued_at(token):
+    """Set ``iat`` with sub-second precision (a JWT NumericDate may be fractional)."""
+    token['iat'] = token.current_time.timestamp()
+
+
+class PreciseRefreshToken(RefreshToken):
+    """Refresh token stamping itself and the access tokens made from it with a sub-second ``iat``."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.token is None:
+            stamp_issued_at(self)
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        stamp_issued_at(access)
+        return access
+
+
+def check_not_revoked(token, fresh=False):
+    """Raise InvalidToken if ``token`` is revoked; ``fresh`` syncs with the other workers first."""
+    if fresh:
+        revocations.sync(force=True)
+    if revocations.is_revoked(token):
+        raise InvalidToken('Token has been revoked.')
+
+
+class RoleClaimJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticates from the token alone: tokens issued by
+    ``RoleTokenObtainPairSerializer`` carry the user id, role and staff flag,
+    so the request user is a ``TokenUser`` built from claims and neither the
+    ``User`` nor the ``UserProfile`` row is read. Tokens without a ``role``
+    claim (issued before it was added) fall back to the database lookup.
+    """
+    def authenticate(self, request):
+        with timed('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        check_not_revoked(validated_token)
+        if 'role' not in validated_token:
+            return JWTAuthentication.get_user(self, validated_token)
+        return super().get_user(validated_token)
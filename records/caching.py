@@ -0,0 +1,173 @@
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import serializers
+
+from .permissions import user_role
+from .routing import reads_own_writes, served_by_replica
+
+KEY_PREFIX = 'phr:resp:'
+TAG_PREFIX = 'phr:tag:'
+
+
+def response_cache():
+	return caches[getattr(settings, 'PHR_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+class CacheStats:
+	"""In-process hit/miss counters for the response cache."""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		with self._lock:
+			self.hits = self.misses = self.invalidations = 0
+
+	def record(self, name, count=1):
+		with self._lock:
+			setattr(self, name, getattr(self, name) + count)
+
+	def as_dict(self):
+		with self._lock:
+			total = self.hits + self.misses
+			return {
+				'hits': self.hits,
+				'misses': self.misses,
+				'invalidations': self.invalidations,
+				'hit_rate': self.hits / total if total else None,
+			}
+
+
+stats = CacheStats()
+
+
+def response_cache_usable():
+	"""
+	Whether the current request may read and fill the response cache. Not
+	while it reads from the primary to see its user's own writes: an entry
+	filled since from a lagging replica could hide them.
+	"""
+	return getattr(settings, 'PHR_RESPONSE_CACHE_ENABLED', True) and not reads_own_writes()
+
+
+def _new_version(changed_at=None):
+	"""A tag version recording when the tag was last invalidated (0: never)."""
+	return f'{time.time() if changed_at is None else changed_at}:{uuid.uuid4().hex}'
+
+
+def _changed_at(version):
+	head, sep, _ = (version or '').partition(':')
+	try:
+		return float(head) if sep else 0.0
+	except ValueError:
+		return 0.0
+
+
+def model_tag(model, pk):
+	return f'{model._meta.label_lower}:{pk}'
+
+
+def list_tag(model):
+	return f'{model._meta.label_lower}:list'
+
+
+def request_cache_key(request):
+	"""Key on host, path, sorted query parameters, renderer format and the caller's role."""
+	role = (user_role(request.user) or '') if request.user.is_authenticated else 'anonymous'
+	query = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+	fmt = getattr(request, 'accepted_renderer', None)
+	raw = repr((request.get_host(), request.path, query, getattr(fmt, 'format', ''), role))
+	return KEY_PREFIX + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def collect_tags(serializer, items, tags):
+	"""
+	Add a tag for every object rendered in ``items`` (serializer output dicts),
+	including nested objects and objects referenced by primary key.
+	"""
+	model = serializer.Meta.model
+	fields = serializer.fields
+	for item in items:
+		if item is None:
+			continue
+		if 'id' in item:
+			tags.add(model_tag(model, item['id']))
+		for name, value in item.items():
+			field = fields.get(name)
+			if value is None or field is None:
+				continue
+			if isinstance(field, serializers.BaseSerializer):
+				collect_tags(field, [value], tags)
+			elif isinstance(field, serializers.RelatedField):
+				tags.add(model_tag(field.queryset.model, value))
+	return tags
+
+
+def get_cached(key):
+	"""Return cached response data, or None if missing or any of its tags was invalidated."""
+	cache = response_cache()
+	entry = cache.get(key)
+	if entry is None:
+		stats.record('misses')
+		return None
+	versions = entry['versions']
+	current = cache.get_many([TAG_PREFIX + tag for tag in versions])
+	if any(current.get(TAG_PREFIX + tag) != version for tag, version in versions.items()):
+		stats.record('misses')
+		return None
+	stats.record('hits')
+	return entry['data']
+
+
+def set_cached(key, data, tags):
+	"""
+	Store ``data`` along with the current version of each tag. Tags without a
+	version get a fresh one; versions never expire, and an evicted version
+	reads as a miss, so entries can only ever be dropped early, never served
+	stale. Responses read from a replica are not stored while one of their
+	tags was invalidated within PHR_PRIMARY_STICKY_SECONDS.
+	"""
+	cache = response_cache()
+	tag_keys = [TAG_PREFIX + tag for tag in tags]
+	current = cache.get_many(tag_keys)
+	for tag_key in tag_keys:
+		if tag_key not in current:
+			cache.add(tag_key, _new_version(0), timeout=None)
+	current = cache.get_many(tag_keys)
+	versions = {tag: current.get(TAG_PREFIX + tag) for tag in tags}
+	if served_by_replica():
+		# A replica may not have applied a write made in the last
+		# PHR_PRIMARY_STICKY_SECONDS; its rows would be cached as current.
+		lag = getattr(settings, 'PHR_PRIMARY_STICKY_SECONDS', 5)
+		if any(time.time() - _changed_at(version) < lag for version in versions.values()):
+			return
+	timeout = getattr(settings, 'PHR_RESPONSE_CACHE_TIMEOUT', 300)
+	cache.set(key, {'data': data, 'versions': versions}, timeout=timeout)
+
+
+def invalidate_tags(tags):
+	"""Evict every cached response tagged with any of ``tags``."""
+	tags = list(tags)
+	if not tags:
+		return
+	version = _new_version()
+	response_cache().set_many({TAG_PREFIX + tag: version for tag in tags}, timeout=None)
+	stats.record('invalidations', len(tags))
+
+
+def invalidate_instances(model, pks):
+	"""
+	Evict responses rendering these objects and every list page of the model.
+	Inside a transaction the tags are invalidated again on commit, dropping
+	anything a concurrent request cached from the pre-commit state.
+	"""
+	tags = [list_tag(model), *(model_tag(model, pk) for pk in pks)]
+	invalidate_tags(tags)
+	if transaction.get_connection().in_atomic_block:
+		transaction.on_commit(lambda: invalidate_tags(tags))
@@ -0,0 +1,95 @@
+import hashlib
+
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+	status_code = status.HTTP_412_PRECONDITION_FAILED
+	default_detail = 'The resource has been modified since it was fetched.'
+	default_code = 'precondition_failed'
+
+
+def version_columns(serializer, prefix=''):
+	"""
+	The ``version`` and ``updated_at`` columns of every object ``serializer``
+	renders, following expanded relations, as ``.values()`` paths.
+	"""
+	columns = [prefix + 'pk', prefix + 'version', prefix + 'updated_at']
+	for field in serializer.fields.values():
+		if isinstance(field, serializers.BaseSerializer) and not field.write_only:
+			columns += version_columns(field, prefix + field.source + '__')
+	return columns
+
+
+def version_rows(serializer, items):
+	"""
+	Rebuild ``version_columns`` rows from rendered ``items``, so responses that
+	were serialized anyway need no extra query. Returns None when sparse
+	fieldsets left out a version column.
+	"""
+	rows = []
+	for item in items:
+		row = []
+		if not _flatten(serializer, item, row):
+			return None
+		rows.append(tuple(row))
+	return rows
+
+
+def _flatten(serializer, item, row):
+	if item is None:
+		row.extend([None] * len(version_columns(serializer)))
+		return True
+	if not {'id', 'version', 'updated_at'} <= item.keys():
+		return False
+	row.extend([item['id'], item['version'], parse_datetime(item['updated_at'])])
+	for name, field in serializer.fields.items():
+		if isinstance(field, serializers.BaseSerializer) and not field.write_only:
+			if not _flatten(field, item.get(name), row):
+				return False
+	return True
+
+
+def compute_validators(request, rows, extra=()):
+	"""
+	Return ``(etag, last_modified)`` for a response built from ``rows`` (tuples
+	of ``version_columns`` values). The ETag hashes ids and versions together
+	with the query string and renderer, since each representation needs its
+	own strong validator.
+	"""
+	renderer = getattr(request, 'accepted_renderer', None)
+	query = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+	versions = [(row[0::3], row[1::3]) for row in rows]
+	digest = hashlib.sha1(repr((query, getattr(renderer, 'format', ''), extra, versions)).encode())
+	timestamps = [value for row in rows for value in row[2::3] if value is not None]
+	return f'"{digest.hexdigest()}"', max(timestamps) if timestamps else None
+
+
+def etag_matches(header, etag, weak=False):
+	if header is None:
+		return False
+	if header.strip() == '*':
+		return True
+	tags = parse_etags(header)
+	if weak:
+		tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+	return etag in tags
+
+
+def not_modified(request, etag, last_modified):
+	"""Evaluate If-None-Match, or If-Modified-Since when no ETag was sent."""
+	if_none_match = request.headers.get('If-None-Match')
+	if if_none_match is not None:
+		return etag_matches(if_none_match, etag, weak=True)
+	since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+	return since is not None and last_modified is not None and int(last_modified.timestamp()) <= since
+
+
+def set_validators(response, etag, last_modified):
+	response['ETag'] = etag
+	if last_modified is not None:
+		response['Last-Modified'] = http_date(last_modified.timestamp())
+	return response
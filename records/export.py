@@ -0,0 +1,79 @@
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .fastpath import ValuesReader
+from .models import Patient, AppointmentWithArchive, PrescriptionWithArchive, HealthRecordWithArchive
+from .serializers import (
+	PatientSerializer, AppointmentSerializer, PrescriptionSerializer, HealthRecordSerializer
+)
+
+EXPORT_FORMATS = {
+	'ndjson': 'application/x-ndjson',
+	'csv': 'text/csv',
+}
+
+
+def _sections(patient_id):
+	"""
+	(record type, serializer class, queryset) for each part of a patient's
+	chart; the full chart, so archived rows are included.
+	"""
+	return [
+		('patient', PatientSerializer, Patient.objects.filter(pk=patient_id)),
+		('health_record', HealthRecordSerializer,
+			HealthRecordWithArchive.objects.filter(patient_id=patient_id).order_by('record_date', 'id')),
+		('appointment', AppointmentSerializer,
+			AppointmentWithArchive.objects.filter(patient_id=patient_id).order_by('appointment_datetime', 'id')),
+		('prescription', PrescriptionSerializer,
+			PrescriptionWithArchive.objects.filter(appointment__patient_id=patient_id).order_by('id')),
+	]
+
+
+def csv_columns():
+	"""Union of the exported fields, in serializer order, after a leading 'type'."""
+	columns = ['type']
+	for _, serializer_class, _ in _sections(None):
+		for key in ValuesReader(serializer_class()).keys:
+			if key not in columns:
+				columns.append(key)
+	return columns
+
+
+def iter_patient_records(patient_id, chunk_size=None):
+	"""
+	Yield ``(record type, data)`` for a patient and every row of their chart.
+
+	Rows are read with server-side chunked iteration and rendered with the
+	same field representations as the API, so memory use does not depend on
+	the size of the chart.
+	"""
+	chunk_size = chunk_size or getattr(settings, 'PHR_EXPORT_CHUNK_SIZE', 2000)
+	for record_type, serializer_class, queryset in _sections(patient_id):
+		reader = ValuesReader(serializer_class())
+		for row in reader.values(queryset).iterator(chunk_size=chunk_size):
+			yield record_type, reader.render_row(row)
+
+
+class _Echo:
+	"""File-like object whose write() returns the value, for csv.writer streaming."""
+	def write(self, value):
+		return value
+
+
+def iter_export_lines(patient_id, export_format, chunk_size=None):
+	"""Yield the patient's chart as NDJSON or CSV text lines."""
+	records = iter_patient_records(patient_id, chunk_size)
+	if export_format == 'ndjson':
+		for record_type, data in records:
+			yield json.dumps({'type': record_type, **data}, cls=JSONEncoder) + '\n'
+		return
+
+	columns = csv_columns()
+	writer = csv.writer(_Echo())
+	yield writer.writerow(columns)
+	for record_type, data in records:
+		data['type'] = record_type
+		yield writer.writerow([data.get(column) for column in columns])
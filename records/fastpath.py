@@ -0,0 +1,82 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from .instrumentation import timed
+
+
+class ValuesReader:
+    """
+    Read-only rendering of a serializer's output from ``.values()`` rows.
+
+    The serializer's field tree is compiled once per request into a flat list
+    of ``(key, column, to_representation)`` steps, so rows are built without
+    instantiating serializers or walking model instances. Fields call the same
+    ``to_representation`` the serializer would, which keeps the output
+    identical. Nested objects are built once per distinct id and shared
+    between rows through a per-request cache.
+    """
+    def __init__(self, serializer):
+        self.columns = []
+        self.steps = self._compile(serializer, '')
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """Return a reader, or ``None`` if a field cannot be read from columns."""
+        try:
+            return cls(serializer)
+        except FieldDoesNotExist:
+            return None
+
+    def _compile(self, serializer, prefix):
+        model = serializer.Meta.model
+        steps = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*':
+                raise FieldDoesNotExist(name)
+            model._meta.get_field(field.source)
+            column = prefix + field.source
+            self.columns.append(column)
+            if isinstance(field, serializers.BaseSerializer):
+                steps.append((name, column, None, self._compile(field, column + '__')))
+            elif isinstance(field, serializers.RelatedField):
+                # The foreign key column already holds the primary key.
+                steps.append((name, column, None, None))
+            else:
+                steps.append((name, column, field.to_representation, None))
+        return steps
+
+    def values(self, queryset, extra_fields=()):
+        columns = list(dict.fromkeys([*self.columns, *extra_fields]))
+        return queryset.values(*columns)
+
+    def render(self, rows):
+        cache = {}
+        with timed('serialize'):
+            return [self._build(row, self.steps, cache) for row in rows]
+
+    def render_row(self, row):
+        """Render one row without the shared cache, for unbounded streams."""
+        return self._build(row, self.steps, {})
+
+    @property
+    def keys(self):
+        return [name for name, _, _, _ in self.steps]
+
+    def _build(self, row, steps, cache):
+        data = {}
+        for name, column, to_representation, nested in steps:
+            value = row[column]
+            if value is None:
+                data[name] = None
+            elif nested is not None:
+                key = (column, value)
+                if key not in cache:
+                    cache[key] = self._build(row, nested, cache)
+                data[name] = cache[key]
+            elif to_representation is None:
+                data[name] = value
+            else:
+                data[name] = to_representation(value)
+        return data
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class IdempotentResponse(Exception):
+	"""Raised before the handler runs to answer with ``response`` (a replay or an error) instead."""
+	def __init__(self, response):
+		super().__init__(response.status_code)
+		self.response = response
+
+
+def request_fingerprint(request):
+	payload = json.dumps([request.method, request.path, request.data], sort_keys=True, separators=(',', ':'), default=str)
+	return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def replay(record):
+	"""The stored response, as sent the first time; no serializer or model code runs."""
+	response = HttpResponse(zlib.decompress(record.body), status=record.status_code, content_type=record.content_type)
+	response['Idempotent-Replayed'] = 'true'
+	return response
+
+
+def claim_key(user_id, key, fingerprint):
+	"""
+	Claim ``key`` for a new request: returns ``(record, None)`` when the
+	request should run, or ``(None, response)`` to send instead.
+
+	The unique (user, key) row is inserted before the request runs, so of
+	concurrent duplicates only one gets to run. The others poll the row for
+	up to PHR_IDEMPOTENCY_WAIT seconds and replay its response, or get 409.
+	Expired rows, and rows of requests that died without finishing
+	(pending for PHR_IDEMPOTENCY_LOCK_TIMEOUT), are replaced.
+	"""
+	sweeper.start()
+	ttl = timedelta(seconds=getattr(settings, 'PHR_IDEMPOTENCY_TTL', 86400))
+	lock_timeout = timedelta(seconds=getattr(settings, 'PHR_IDEMPOTENCY_LOCK_TIMEOUT', 60))
+	deadline = time.monotonic() + getattr(settings, 'PHR_IDEMPOTENCY_WAIT', 10)
+	while True:
+		now = timezone.now()
+		try:
+			with transaction.atomic():
+				record = IdempotencyKey.objects.create(
+					user_id=user_id, key=key, fingerprint=fingerprint, created_at=now, expires_at=now + ttl)
+			return record, None
+		except IntegrityError:
+			pass
+		record = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+		if record is None:
+			continue
+		if record.expires_at <= now or (record.status_code is None and record.created_at <= now - lock_timeout):
+			IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+			continue
+		if record.fingerprint != fingerprint:
+			return None, Response(
+				{'detail': 'This Idempotency-Key was already used for a different request.'},
+				status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+		if record.status_code is not None:
+			return None, replay(record)
+		if time.monotonic() >= deadline:
+			return None, Response(
+				{'detail': 'A request with this Idempotency-Key is still in progress.'},
+				status=status.HTTP_409_CONFLICT)
+		time.sleep(getattr(settings, 'PHR_IDEMPOTENCY_POLL_INTERVAL', 0.05))
+
+
+def store_response(record, response):
+	"""Save the rendered response on the claimed key; server errors release the key so a retry runs again."""
+	if response.status_code >= 500:
+		release_key(record)
+		return
+	if hasattr(response, 'render'):
+		response.render()
+	IdempotencyKey.objects.filter(pk=record.pk).update(
+		status_code=response.status_code, content_type=response.get('Content-Type', ''),
+		body=zlib.compress(response.content))
+
+
+def release_key(record):
+	IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+
+def purge_expired_keys(batch_size=1000):
+	"""Delete expired keys, ``batch_size`` per statement so the write lock is held briefly; returns the count."""
+	purged = 0
+	while True:
+		pks = list(IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size])
+		if not pks:
+			return purged
+		purged += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+
+
+class KeySweeper:
+	"""Daemon thread purging expired keys every PHR_IDEMPOTENCY_SWEEP_INTERVAL seconds, started with the first key."""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._thread = None
+
+	def start(self):
+		if self._thread is not None or not getattr(settings, 'PHR_IDEMPOTENCY_SWEEPER_THREAD', True):
+			return
+		with self._lock:
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, name='phr-idempotency-sweeper', daemon=True)
+				self._thread.start()
+
+	def _run(self):
+		while True:
+			time.sleep(getattr(settings, 'PHR_IDEMPOTENCY_SWEEP_INTERVAL', 300))
+			try:
+				close_old_connections()
+				purged = purge_expired_keys()
+				if purged:
+					logger.info('Purged %d expired idempotency keys.', purged)
+			except Exception:
+				logger.exception('Purging expired idempotency keys failed.')
+
+
+sweeper = KeySweeper()
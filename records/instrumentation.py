@@ -0,0 +1,277 @@
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+PHASES = ('db', 'auth', 'serialize', 'render')
+
+# Timings of the sampled request being served in this context. Context
+# variables follow the request into sync_to_async worker threads, so queries
+# run by the async views are attributed to the right request.
+_current = ContextVar('phr_request_timings', default=None)
+
+
+class RequestTimings:
+	"""Per-phase durations (seconds) and query count of one sampled request."""
+	def __init__(self):
+		self.started = time.perf_counter()
+		self.phases = dict.fromkeys(PHASES, 0.0)
+		self.queries = 0
+
+	def add(self, phase, seconds):
+		self.phases[phase] += seconds
+
+
+@contextmanager
+def timed(phase):
+	"""Add the time spent in the block to ``phase`` of the current sampled request."""
+	timings = _current.get()
+	if timings is None:
+		yield
+		return
+	started = time.perf_counter()
+	try:
+		yield
+	finally:
+		timings.add(phase, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+	"""Database execute wrapper counting queries and their time."""
+	timings = _current.get()
+	if timings is None:
+		return execute(sql, params, many, context)
+	started = time.perf_counter()
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		timings.add('db', time.perf_counter() - started)
+		timings.queries += 1
+
+
+def install_query_recorder(connection):
+	"""
+	Append ``record_query`` to a connection's execute wrappers for its whole
+	life, the permanent form of ``connection.execute_wrapper()``. Connections
+	are per thread, so a wrapper entered around the request would miss the
+	queries the async views run in worker threads.
+	"""
+	if record_query not in connection.execute_wrappers:
+		connection.execute_wrappers.append(record_query)
+
+
+class TimedJSONRenderer(JSONRenderer):
+	"""JSON renderer reporting its time as the ``render`` phase."""
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		with timed('render'):
+			return super().render(data, accepted_media_type, renderer_context)
+
+
+class LatencyHistogram:
+	"""
+	Log-bucketed latency histogram: bucket ``i`` holds durations up to
+	``BASE_MS * GROWTH ** i``, so percentiles are within 10% of the exact
+	value in constant memory however many requests are recorded.
+	"""
+	BASE_MS = 0.05
+	GROWTH = 1.1
+
+	def __init__(self):
+		self.buckets = {}
+		self.count = 0
+		self.max_ms = 0.0
+
+	def add(self, ms):
+		index = 0 if ms <= self.BASE_MS else math.ceil(math.log(ms / self.BASE_MS, self.GROWTH))
+		self.buckets[index] = self.buckets.get(index, 0) + 1
+		self.count += 1
+		self.max_ms = max(self.max_ms, ms)
+
+	def percentile(self, fraction):
+		if not self.count:
+			return None
+		target = max(1, math.ceil(self.count * fraction))
+		seen = 0
+		for index in sorted(self.buckets):
+			seen += self.buckets[index]
+			if seen >= target:
+				return min(self.BASE_MS * self.GROWTH ** index, self.max_ms)
+		return self.max_ms
+
+
+class EndpointMetrics:
+	def __init__(self):
+		self.latency = LatencyHistogram()
+		self.total_ms = 0.0
+		self.phase_ms = dict.fromkeys(PHASES, 0.0)
+		self.queries = 0
+
+	def add(self, total_ms, timings):
+		self.latency.add(total_ms)
+		self.total_ms += total_ms
+		self.queries += timings.queries
+		for phase, seconds in timings.phases.items():
+			self.phase_ms[phase] += seconds * 1000
+
+	def as_dict(self):
+		count = self.latency.count
+		data = {
+			'count': count,
+			'p50_ms': round(self.latency.percentile(0.50), 2),
+			'p95_ms': round(self.latency.percentile(0.95), 2),
+			'p99_ms': round(self.latency.percentile(0.99), 2),
+			'max_ms': round(self.latency.max_ms, 2),
+			'mean_ms': round(self.total_ms / count, 2),
+			'mean_queries': round(self.queries / count, 2),
+		}
+		for phase, total in self.phase_ms.items():
+			data[f'mean_{phase}_ms'] = round(total / count, 2)
+		return data
+
+
+class MetricsRegistry:
+	"""Per-endpoint request metrics of this worker process."""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._endpoints = {}
+
+	def record(self, endpoint, total_ms, timings):
+		with self._lock:
+			metrics = self._endpoints.get(endpoint)
+			if metrics is None:
+				metrics = self._endpoints[endpoint] = EndpointMetrics()
+			metrics.add(total_ms, timings)
+
+	def reset(self):
+		with self._lock:
+			self._endpoints = {}
+
+	def as_dict(self):
+		with self._lock:
+			return {endpoint: metrics.as_dict() for endpoint, metrics in sorted(self._endpoints.items())}
+
+
+metrics = MetricsRegistry()
+
+
+def endpoint_name(request):
+	"""``METHOD /route`` with URL parameters left as placeholders."""
+	match = getattr(request, 'resolver_match', None)
+	route = f'/{match.route}' if match is not None else 'unmatched'
+	return f'{request.method} {route}'
+
+
+def server_timing(timings, total_ms, streaming=False):
+	entries = [f'db;dur={timings.phases["db"] * 1000:.2f};desc="{timings.queries} queries"']
+	entries += [f'{phase};dur={timings.phases[phase] * 1000:.2f}' for phase in PHASES[1:]]
+	entries.append(f'total;dur={total_ms:.2f}' + (';desc="until headers"' if streaming else ''))
+	return ', '.join(entries)
+
+
+def timed_stream(chunks, timings, done):
+	"""
+	Yield ``chunks`` with ``timings`` current while each is produced, so the
+	queries of a streamed body count; ``done`` runs once the stream is
+	exhausted or closed.
+	"""
+	iterator = iter(chunks)
+	try:
+		while True:
+			token = _current.set(timings)
+			try:
+				chunk = next(iterator)
+			except StopIteration:
+				return
+			finally:
+				_current.reset(token)
+			yield chunk
+	finally:
+		done()
+
+
+async def atimed_stream(chunks, timings, done):
+	"""Same as ``timed_stream`` for async streaming content."""
+	iterator = aiter(chunks)
+	try:
+		while True:
+			token = _current.set(timings)
+			try:
+				chunk = await anext(iterator)
+			except StopAsyncIteration:
+				return
+			finally:
+				_current.reset(token)
+			yield chunk
+	finally:
+		done()
+
+
+class InstrumentationMiddleware:
+	"""
+	Times a sample of requests (``PHR_METRICS_SAMPLE_RATE``): database
+	queries and time, authentication and permission checks, serialization and
+	rendering. Sampled responses carry the breakdown in a ``Server-Timing``
+	header, and each is added to the per-endpoint histograms served at
+	``/api/_metrics/``. Unsampled requests only pay for one random draw.
+	"""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.is_async = iscoroutinefunction(get_response)
+		if self.is_async:
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if self.is_async:
+			return self.__acall__(request)
+		if not self.sampled():
+			return self.get_response(request)
+		timings = RequestTimings()
+		token = _current.set(timings)
+		try:
+			response = self.get_response(request)
+		finally:
+			_current.reset(token)
+		return self.finish(request, response, timings)
+
+	async def __acall__(self, request):
+		if not self.sampled():
+			return await self.get_response(request)
+		timings = RequestTimings()
+		token = _current.set(timings)
+		try:
+			response = await self.get_response(request)
+		finally:
+			_current.reset(token)
+		return self.finish(request, response, timings)
+
+	def sampled(self):
+		rate = getattr(settings, 'PHR_METRICS_SAMPLE_RATE', 0.0)
+		return rate >= 1 or (rate > 0 and random.random() < rate)
+
+	def finish(self, request, response, timings):
+		total_ms = (time.perf_counter() - timings.started) * 1000
+		if not response.streaming:
+			response['Server-Timing'] = server_timing(timings, total_ms)
+			metrics.record(endpoint_name(request), total_ms, timings)
+			return response
+		# The body of a streaming response (exports) is produced as it is
+		# sent, after the headers: the header can only cover the time until
+		# then, and the sample is recorded once the stream ends.
+		response['Server-Timing'] = server_timing(timings, total_ms, streaming=True)
+		endpoint = endpoint_name(request)
+
+		def done():
+			metrics.record(endpoint, (time.perf_counter() - timings.started) * 1000, timings)
+
+		wrap = atimed_stream if response.is_async else timed_stream
+		response.streaming_content = wrap(response.streaming_content, timings, done)
+		return response
@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from records.archive import archivable, archive_records
+
+# Each chunk's ids are bound as parameters of one statement.
+MAX_CHUNK_SIZE = 999
+
+
+class Command(BaseCommand):
+	help = (
+		'Move completed and cancelled appointments (with their prescriptions) and health records older than '
+		'the archive horizons into the archive tables, in chunked transactions. Safe to interrupt and re-run.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--appointment-days', type=int, default=None,
+			help='Archive appointments older than this many days (default PHR_ARCHIVE_APPOINTMENT_DAYS).')
+		parser.add_argument(
+			'--health-record-days', type=int, default=None,
+			help='Archive health records older than this many days (default PHR_ARCHIVE_HEALTH_RECORD_DAYS).')
+		parser.add_argument(
+			'--chunk-size', type=int, default=None,
+			help='Rows moved per transaction (default PHR_ARCHIVE_CHUNK_SIZE).')
+		parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be archived.')
+
+	def handle(self, *args, **options):
+		for option in ('appointment_days', 'health_record_days'):
+			if options[option] is not None and options[option] < 0:
+				raise CommandError(f"--{option.replace('_', '-')} must not be negative.")
+		chunk_size = options['chunk_size'] or getattr(settings, 'PHR_ARCHIVE_CHUNK_SIZE', 500)
+		if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+			raise CommandError(f'--chunk-size must be between 1 and {MAX_CHUNK_SIZE}.')
+
+		if options['dry_run']:
+			appointments, health_records = archivable(options['appointment_days'], options['health_record_days'])
+			self.stdout.write(
+				f'Would archive {appointments.count()} appointments and {health_records.count()} health records.')
+			return
+
+		started = time.perf_counter()
+		moved = archive_records(
+			options['appointment_days'], options['health_record_days'], chunk_size,
+			log=self.stderr.write if options['verbosity'] > 1 else None)
+		self.stdout.write(self.style.SUCCESS(
+			f"Archived {moved['appointments']} appointments and {moved['health_records']} health records "
+			f'in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,287 @@
+import json
+import random
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import RequestFactory
+from django.test.client import FakePayload
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from records.instrumentation import metrics
+from records.management.commands.benchmark_servers import _percentiles
+from records.models import Patient, Doctor, Appointment, Prescription, HealthRecord, UserProfile
+from records.seeding import DIAGNOSES, MEDICATIONS, seed_dataset
+from records.serializers import RoleTokenObtainPairSerializer
+
+BENCH_PASSWORD = 'bench-pass-123'
+BENCH_USERS = {'patient': 'bench_patient', 'doctor': 'bench_doctor', 'staff': 'bench_staff'}
+MODELS = {
+	'patients': Patient, 'doctors': Doctor, 'appointments': Appointment,
+	'prescriptions': Prescription, 'health_records': HealthRecord,
+}
+
+
+def _pk(context, name, rng):
+	low, high = context[name]
+	return rng.randint(low, high)
+
+
+def _slot(context, index, offset=0):
+	# Future slots no seeded or earlier benchmark appointment occupies.
+	start = context['future'] + timedelta(hours=2 * index + offset)
+	return start.isoformat()
+
+
+def _page(params=None):
+	return '?' + urlencode({'page_size': 50, **(params or {})})
+
+
+# (url name, method, role, build) where build(context, rng, index) returns
+# (url kwargs, query string, JSON body). Every route of records/urls.py and
+# the token endpoint has at least one entry; DELETE is left out so runs do
+# not shrink the dataset.
+SCENARIOS = [
+	('patient-list-create', 'GET', 'patient', lambda c, r, i: ({}, _page(), None)),
+	('patient-list-create', 'POST', 'patient', lambda c, r, i: ({}, '', {
+		'first_name': 'Bench', 'last_name': 'Patient', 'date_of_birth': '1990-01-01',
+		'email': f"bench-{c['tag']}-{i}@example.com"})),
+	('patient-detail', 'GET', 'patient', lambda c, r, i: ({'pk': _pk(c, 'patients', r)}, '', None)),
+	('patient-detail', 'PATCH', 'patient', lambda c, r, i: ({'pk': _pk(c, 'patients', r)}, '', {'phone': f'555-{i:04d}'})),
+	('patient-export', 'GET', 'patient', lambda c, r, i: ({'pk': _pk(c, 'patients', r)}, '', None)),
+	('patient-timeline', 'GET', 'patient', lambda c, r, i: ({'pk': _pk(c, 'patients', r)}, _page(), None)),
+	('doctor-list-create', 'GET', 'doctor', lambda c, r, i: ({}, _page(), None)),
+	('doctor-list-create', 'POST', 'doctor', lambda c, r, i: ({}, '', {
+		'first_name': 'Bench', 'last_name': 'Doctor', 'specialty': 'Benchmarking',
+		'email': f"bench-doctor-{c['tag']}-{i}@example.com"})),
+	('doctor-detail', 'GET', 'doctor', lambda c, r, i: ({'pk': _pk(c, 'doctors', r)}, '', None)),
+	('doctor-detail', 'PATCH', 'doctor', lambda c, r, i: ({'pk': _pk(c, 'doctors', r)}, '', {'phone': f'555-{i:04d}'})),
+	('doctor-availability', 'GET', 'patient', lambda c, r, i: ({'pk': _pk(c, 'doctors', r)}, '?' + urlencode({
+		'from': c['first_slot'].isoformat(), 'to': (c['first_slot'] + timedelta(days=7)).isoformat()}), None)),
+	('appointment-list-create', 'GET', 'patient', lambda c, r, i: ({}, _page({'status': 'scheduled'}), None)),
+	('appointment-list-create', 'POST', 'patient', lambda c, r, i: ({}, '', {
+		'patient_id': _pk(c, 'patients', r), 'doctor_id': _pk(c, 'doctors', r), 'appointment_datetime': _slot(c, i)})),
+	('appointment-detail', 'GET', 'patient', lambda c, r, i: ({'pk': _pk(c, 'appointments', r)}, '', None)),
+	('appointment-detail', 'PATCH', 'patient', lambda c, r, i: ({'pk': _pk(c, 'appointments', r)}, '', {'status': 'completed'})),
+	('appointment-bulk', 'POST', 'patient', lambda c, r, i: ({}, '', [
+		{'patient_id': _pk(c, 'patients', r), 'doctor_id': _pk(c, 'doctors', r), 'appointment_datetime': _slot(c, i * 10 + item, offset=1)}
+		for item in range(10)])),
+	('appointment-bulk', 'PATCH', 'patient', lambda c, r, i: ({}, '', [
+		{'id': pk, 'status': 'completed'} for pk in {_pk(c, 'appointments', r) for _ in range(10)}])),
+	('prescription-list-create', 'GET', 'doctor', lambda c, r, i: ({}, _page(), None)),
+	('prescription-list-create', 'POST', 'doctor', lambda c, r, i: ({}, '', {
+		'appointment_id': _pk(c, 'appointments', r), 'medication': r.choice(MEDICATIONS), 'dosage': '10mg'})),
+	('prescription-detail', 'GET', 'doctor', lambda c, r, i: ({'pk': _pk(c, 'prescriptions', r)}, '', None)),
+	('prescription-detail', 'PATCH', 'doctor', lambda c, r, i: ({'pk': _pk(c, 'prescriptions', r)}, '', {'dosage': '20mg'})),
+	('prescription-bulk', 'POST', 'doctor', lambda c, r, i: ({}, '', [
+		{'appointment_id': _pk(c, 'appointments', r), 'medication': r.choice(MEDICATIONS), 'dosage': '5mg'} for _ in range(10)])),
+	('prescription-bulk', 'PATCH', 'doctor', lambda c, r, i: ({}, '', [
+		{'id': pk, 'dosage': '50mg'} for pk in {_pk(c, 'prescriptions', r) for _ in range(10)}])),
+	('healthrecord-list-create', 'GET', 'doctor', lambda c, r, i: ({}, _page({'patient': _pk(c, 'patients', r)}), None)),
+	('healthrecord-list-create', 'POST', 'doctor', lambda c, r, i: ({}, '', {
+		'patient_id': _pk(c, 'patients', r), 'doctor_id': _pk(c, 'doctors', r),
+		'record_date': '2024-06-01', 'diagnosis': r.choice(DIAGNOSES)})),
+	('healthrecord-detail', 'GET', 'doctor', lambda c, r, i: ({'pk': _pk(c, 'health_records', r)}, '', None)),
+	('healthrecord-detail', 'PATCH', 'doctor', lambda c, r, i: ({'pk': _pk(c, 'health_records', r)}, '', {'treatment': 'Follow-up'})),
+	('healthrecord-bulk', 'POST', 'doctor', lambda c, r, i: ({}, '', [
+		{'patient_id': _pk(c, 'patients', r), 'doctor_id': _pk(c, 'doctors', r),
+		 'record_date': '2024-06-01', 'diagnosis': r.choice(DIAGNOSES)} for _ in range(10)])),
+	('healthrecord-bulk', 'PATCH', 'doctor', lambda c, r, i: ({}, '', [
+		{'id': pk, 'treatment': 'Reviewed'} for pk in {_pk(c, 'health_records', r) for _ in range(10)}])),
+	('healthrecord-search', 'GET', 'doctor', lambda c, r, i: ({}, '?' + urlencode({
+		'q': r.choice(DIAGNOSES).split()[-1], 'page_size': 20}), None)),
+	('stats-doctor-days', 'GET', 'staff', lambda c, r, i: ({}, _page({'doctor': _pk(c, 'doctors', r)}), None)),
+	('stats-appointment-status', 'GET', 'staff', lambda c, r, i: ({}, '', None)),
+	('stats-top-medications', 'GET', 'staff', lambda c, r, i: ({}, '?limit=10', None)),
+	('user-bulk', 'POST', 'staff', lambda c, r, i: ({}, '', [
+		{'username': username, 'role': '' if role == 'staff' else role} for role, username in BENCH_USERS.items()])),
+	('audit-list', 'GET', 'staff', lambda c, r, i: ({}, _page(), None)),
+	('cache-stats', 'GET', 'staff', lambda c, r, i: ({}, '', None)),
+	('metrics', 'GET', 'staff', lambda c, r, i: ({}, '', None)),
+	('token_obtain_pair', 'POST', None, lambda c, r, i: ({}, '', {
+		'username': BENCH_USERS[r.choice(['patient', 'doctor'])], 'password': BENCH_PASSWORD})),
+]
+
+
+def ensure_bench_users():
+	"""Create the users the benchmark authenticates as; returns an access token per role."""
+	tokens = {}
+	for role, username in BENCH_USERS.items():
+		user = User.objects.filter(username=username).first()
+		if user is None:
+			user = User.objects.create_user(username=username, password=BENCH_PASSWORD, is_staff=role == 'staff')
+		UserProfile.objects.filter(user=user).update(role='' if role == 'staff' else role)
+		user.refresh_from_db()
+		tokens[role] = str(RoleTokenObtainPairSerializer.get_token(user).access_token)
+	return tokens
+
+
+def build_context():
+	context = {'tag': uuid.uuid4().hex[:8]}
+	for name, model in MODELS.items():
+		bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+		if bounds['low'] is None:
+			raise CommandError(f'The database has no {name}; run with --seed or seed it first.')
+		context[name] = (bounds['low'], bounds['high'])
+	span = Appointment.objects.aggregate(first=Min('appointment_datetime'), last=Max('end_datetime'))
+	context['first_slot'] = span['first']
+	context['future'] = span['last'].replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+	return context
+
+
+def run_scenarios(handler, scenarios, context, tokens, requests, concurrency):
+	"""
+	Send ``requests`` requests from ``concurrency`` threads through the WSGI
+	handler, taking turns between ``scenarios`` when there are several.
+	"""
+	factory = RequestFactory()
+	latencies, errors, lock = [], [0], threading.Lock()
+
+	def one(index):
+		name, method, role, build = scenarios[index % len(scenarios)]
+		# Requests depend only on their index, so runs are comparable.
+		kwargs, query, body = build(context, random.Random(index), index)
+		payload = json.dumps(body).encode() if body is not None else b''
+		environ = factory._base_environ(
+			PATH_INFO=reverse(name, kwargs=kwargs), QUERY_STRING=query.lstrip('?'), REQUEST_METHOD=method,
+			CONTENT_TYPE='application/json', CONTENT_LENGTH=str(len(payload)), **{'wsgi.input': FakePayload(payload)})
+		if role is not None:
+			environ['HTTP_AUTHORIZATION'] = f'Bearer {tokens[role]}'
+		status_line = []
+		started = time.perf_counter()
+		response = handler(environ, lambda status, headers, exc_info=None: status_line.append(status))
+		for _ in response:
+			pass
+		response.close()
+		elapsed = time.perf_counter() - started
+		with lock:
+			latencies.append(elapsed)
+			errors[0] += int(status_line[0].split()[0]) >= 400
+
+	metrics.reset()
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=concurrency) as pool:
+		list(pool.map(one, range(requests)))
+	elapsed = time.perf_counter() - started
+	sampled = list(metrics.as_dict().values())
+	count = sum(endpoint['count'] for endpoint in sampled)
+	return {
+		'requests': requests,
+		'errors': errors[0],
+		'requests_per_second': round(requests / elapsed, 1),
+		**_percentiles(latencies),
+		'mean_queries': round(sum(endpoint['mean_queries'] * endpoint['count'] for endpoint in sampled) / count, 2) if count else None,
+	}
+
+
+def compare(results, baseline):
+	"""Throughput ratio and p95 change of each route against an earlier run."""
+	changes = {}
+	for route, result in results['routes'].items():
+		before = baseline.get('routes', {}).get(route)
+		if not before:
+			continue
+		changes[route] = {
+			'throughput_ratio': round(result['requests_per_second'] / before['requests_per_second'], 2),
+			'p95_ms_change': round(result['p95_ms'] - before['p95_ms'], 2),
+			'queries_change': round((result['mean_queries'] or 0) - (before['mean_queries'] or 0), 2),
+		}
+	return changes
+
+
+def _commit():
+	try:
+		output = subprocess.run(
+			['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10)
+	except (OSError, subprocess.SubprocessError):
+		return None
+	return output.stdout.strip() or None
+
+
+class Command(BaseCommand):
+	help = (
+		'Benchmark every API route and the token endpoint with concurrent clients against the current '
+		'database, optionally seeding a synthetic dataset first. Prints throughput, latency percentiles '
+		'and queries per request as JSON.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('routes', nargs='*', help="Scenarios to run, as 'METHOD url-name' or url names (default: all).")
+		parser.add_argument('--seed', action='store_true', help='Migrate and seed the database if it holds no patients.')
+		parser.add_argument('--patients', type=int, default=1000)
+		parser.add_argument('--doctors', type=int, default=20)
+		parser.add_argument('--appointments', type=int, default=10000)
+		parser.add_argument('--prescriptions', type=int, default=30000)
+		parser.add_argument('--health-records', type=int, default=10000)
+		parser.add_argument('--random-seed', type=int, default=0, help='Seed for the generated dataset.')
+		parser.add_argument('--requests', type=int, default=200, help='Requests per scenario (in total with --mixed).')
+		parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads.')
+		parser.add_argument('--cache', action='store_true', help='Leave the response cache on (off by default).')
+		parser.add_argument(
+			'--mixed', action='store_true',
+			help="Run the selected scenarios interleaved as one concurrent workload, reported as 'mixed'.")
+		parser.add_argument('--output', help='Also write the JSON report to this file.')
+		parser.add_argument('--compare', help='Report changes against the JSON report of an earlier run.')
+
+	def handle(self, *args, **options):
+		if options['seed']:
+			call_command('migrate', verbosity=0)
+			if not Patient.objects.exists():
+				seed_dataset(
+					options['patients'], options['doctors'], options['appointments'], options['prescriptions'],
+					options['health_records'], seed=options['random_seed'],
+					log=lambda message: self.stderr.write(message) if options['verbosity'] > 1 else None)
+
+		scenarios = [
+			scenario for scenario in SCENARIOS
+			if not options['routes'] or scenario[0] in options['routes'] or f'{scenario[1]} {scenario[0]}' in options['routes']
+		]
+		if not scenarios:
+			raise CommandError('No scenario matches the given routes.')
+		context = build_context()
+		tokens = ensure_bench_users()
+		handler = WSGIHandler()
+
+		routes = {}
+		overrides = {
+			'PHR_RESPONSE_CACHE_ENABLED': options['cache'], 'PHR_METRICS_SAMPLE_RATE': 1.0, 'ALLOWED_HOSTS': ['*']}
+		with override_settings(**overrides):
+			if options['mixed']:
+				routes['mixed'] = run_scenarios(
+					handler, scenarios, context, tokens, options['requests'], options['concurrency'])
+			else:
+				for scenario in scenarios:
+					if options['verbosity'] > 1:
+						self.stderr.write(f'{scenario[1]} {scenario[0]}')
+					routes[f'{scenario[1]} {scenario[0]}'] = run_scenarios(
+						handler, [scenario], context, tokens, options['requests'], options['concurrency'])
+
+		results = {
+			'commit': _commit(),
+			'database': {'vendor': connection.vendor, 'name': str(connection.settings_dict['NAME'])},
+			'rows': {name: model.objects.count() for name, model in MODELS.items()},
+			'requests_per_scenario': options['requests'],
+			'concurrency': options['concurrency'],
+			'response_cache': options['cache'],
+			'routes': routes,
+		}
+		if options['compare']:
+			with open(options['compare'], encoding='utf-8') as baseline:
+				results['comparison'] = compare(results, json.load(baseline))
+		report = json.dumps(results, indent=2)
+		if options['output']:
+			with open(options['output'], 'w', encoding='utf-8') as output:
+				output.write(report + '\n')
+		self.stdout.write(report)
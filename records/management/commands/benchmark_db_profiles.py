@@ -0,0 +1,72 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+PROFILES = ('basic', 'production')
+# Concurrent reads and writes over the busiest tables.
+DEFAULT_SCENARIOS = [
+	'GET appointment-list-create', 'GET appointment-detail', 'GET patient-detail', 'GET healthrecord-list-create',
+	'PATCH appointment-detail', 'POST appointment-list-create', 'PATCH patient-detail', 'POST healthrecord-list-create',
+]
+
+
+def copy_database(source, target, journal_mode):
+	"""Copy a SQLite database with the backup API, which also takes pages still in the WAL."""
+	src, dst = sqlite3.connect(source), sqlite3.connect(target)
+	try:
+		src.backup(dst)
+		dst.execute(f'PRAGMA journal_mode={journal_mode}')
+	finally:
+		src.close()
+		dst.close()
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare concurrent read/write throughput of the 'basic' (stock Django) and 'production' SQLite "
+		'profiles (PHR_DB_PROFILE) on copies of the current database. Prints JSON.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'scenarios', nargs='*', default=DEFAULT_SCENARIOS,
+			help="benchmark_api scenarios to interleave (default: a mix of reads and writes).")
+		parser.add_argument('--requests', type=int, default=2000)
+		parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client threads.')
+
+	def handle(self, *args, **options):
+		if connection.vendor != 'sqlite':
+			raise CommandError('This benchmark compares SQLite profiles; the database is not SQLite.')
+		source = str(settings.DATABASES['default']['NAME'])
+
+		results = {}
+		with tempfile.TemporaryDirectory() as directory:
+			for profile in PROFILES:
+				# Each profile gets a fresh copy, so both start from the same rows,
+				# and the basic one in SQLite's default rollback journal mode.
+				database = Path(directory) / f'{profile}.sqlite3'
+				copy_database(source, database, 'WAL' if profile == 'production' else 'DELETE')
+				env = dict(
+					os.environ, PHR_DB_PROFILE=profile, PHR_SQLITE_PATH=str(database),
+					DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+				command = [
+					sys.executable, '-m', 'django', 'benchmark_api', *options['scenarios'], '--mixed',
+					'--requests', str(options['requests']), '--concurrency', str(options['concurrency'])]
+				output = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+				if output.returncode:
+					raise CommandError(output.stderr)
+				report = json.loads(output.stdout)
+				results[profile] = report['routes']['mixed']
+
+		results['throughput_ratio'] = round(
+			results['production']['requests_per_second'] / results['basic']['requests_per_second'], 2)
+		results['scenarios'] = options['scenarios']
+		self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from records.models import Appointment
+
+MODES = ('wsgi', 'asgi')
+
+
+def _token(role):
+	# Claims-only token: stateless authentication never looks the user up.
+	token = AccessToken()
+	token['user_id'] = '0'
+	token['role'] = role
+	token['is_staff'] = False
+	return str(token)
+
+
+def _percentiles(latencies):
+	if not latencies:
+		return {}
+	ordered = sorted(latencies)
+	pick = lambda fraction: ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+	return {
+		'p50_ms': round(pick(0.50) * 1000, 2),
+		'p95_ms': round(pick(0.95) * 1000, 2),
+		'p99_ms': round(pick(0.99) * 1000, 2),
+		'mean_ms': round(statistics.fmean(ordered) * 1000, 2),
+	}
+
+
+def run_wsgi(urls, token, requests, threads, client_delay):
+	"""Drive Django's WSGI handler from a fixed pool of worker threads, like a threaded WSGI server."""
+	from django.core.handlers.wsgi import WSGIHandler
+
+	handler = WSGIHandler()
+	factory = RequestFactory()
+	latencies, errors, lock = [], [0], threading.Lock()
+
+	def one(index):
+		url = urlsplit(urls[index % len(urls)])
+		environ = factory._base_environ(
+			PATH_INFO=url.path, QUERY_STRING=url.query, REQUEST_METHOD='GET', HTTP_AUTHORIZATION=f'Bearer {token}')
+		status_line = []
+		started = time.perf_counter()
+		body = handler(environ, lambda status, headers, exc_info=None: status_line.append(status))
+		for _ in body:
+			# A slow client keeps the worker thread busy while it reads.
+			time.sleep(client_delay)
+		body.close()
+		elapsed = time.perf_counter() - started
+		with lock:
+			latencies.append(elapsed)
+			errors[0] += not status_line[0].startswith('200')
+
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=threads) as pool:
+		list(pool.map(one, range(requests)))
+	return time.perf_counter() - started, latencies, errors[0]
+
+
+def run_asgi(urls, token, requests, concurrency, client_delay):
+	"""Drive Django's ASGI handler with many concurrent connections on one event loop."""
+	from django.core.handlers.asgi import ASGIHandler
+
+	handler = ASGIHandler()
+	latencies, errors = [], [0]
+
+	async def one(index, semaphore):
+		url = urlsplit(urls[index % len(urls)])
+		scope = {
+			'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+			'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(), 'root_path': '',
+			'query_string': url.query.encode(), 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+			'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+		}
+		disconnected = asyncio.Event()
+		first = [True]
+
+		async def receive():
+			if first[0]:
+				first[0] = False
+				return {'type': 'http.request', 'body': b'', 'more_body': False}
+			await disconnected.wait()
+			return {'type': 'http.disconnect'}
+
+		status = []
+
+		async def send(message):
+			if message['type'] == 'http.response.start':
+				status.append(message['status'])
+			elif not message.get('more_body'):
+				# A slow client; the event loop serves others meanwhile.
+				await asyncio.sleep(client_delay)
+
+		async with semaphore:
+			started = time.perf_counter()
+			await handler(scope, receive, send)
+			latencies.append(time.perf_counter() - started)
+			disconnected.set()
+			errors[0] += status[0] != 200
+
+	async def main():
+		semaphore = asyncio.Semaphore(concurrency)
+		await asyncio.gather(*(one(index, semaphore) for index in range(requests)))
+
+	started = time.perf_counter()
+	asyncio.run(main())
+	return time.perf_counter() - started, latencies, errors[0]
+
+
+class Command(BaseCommand):
+	help = (
+		'Compare WSGI and ASGI (native async read views) throughput for the same GET requests '
+		'against the current database, with optional slow-client delay. Prints JSON.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('urls', nargs='*', default=['/api/appointments/?page_size=20'], help='Paths to request, round-robin.')
+		parser.add_argument('--role', default='patient', choices=['patient', 'doctor'], help='Role claim of the token used.')
+		parser.add_argument('--requests', type=int, default=2000)
+		parser.add_argument('--concurrency', type=int, default=200, help='Concurrent ASGI connections.')
+		parser.add_argument('--wsgi-threads', type=int, default=16, help='WSGI worker threads.')
+		parser.add_argument('--client-delay', type=float, default=0.05, help='Seconds each simulated client takes to read a response.')
+		parser.add_argument('--cache', action='store_true', help='Leave the response cache on (off by default).')
+		parser.add_argument('--mode', choices=MODES, help='Run one mode in this process (used internally).')
+
+	def handle(self, *args, **options):
+		if not Appointment.objects.exists():
+			raise CommandError('The database has no appointments; seed it before benchmarking.')
+		if options['mode']:
+			self.stdout.write(json.dumps(self._run_mode(options)))
+			return
+
+		# Each mode runs in its own process so the URLconf picks sync or async views.
+		results = {}
+		for mode in MODES:
+			env = dict(
+				os.environ, PHR_ASYNC_READS='1' if mode == 'asgi' else '0',
+				DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+			command = [sys.executable, '-m', 'django', 'benchmark_servers', *options['urls'], '--mode', mode]
+			for option in ('role', 'requests', 'concurrency', 'wsgi_threads', 'client_delay'):
+				command += [f"--{option.replace('_', '-')}", str(options[option])]
+			if options['cache']:
+				command.append('--cache')
+			output = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+			if output.returncode:
+				raise CommandError(output.stderr)
+			results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+		results['asgi_speedup'] = round(results['asgi']['requests_per_second'] / results['wsgi']['requests_per_second'], 2)
+		self.stdout.write(json.dumps(results, indent=2))
+
+	def _run_mode(self, options):
+		mode = options['mode']
+		if (mode == 'asgi') != settings.PHR_ASYNC_READS:
+			raise CommandError(f'Run with PHR_ASYNC_READS={int(mode == "asgi")} for {mode} mode.')
+		token = _token(options['role'])
+		with override_settings(PHR_RESPONSE_CACHE_ENABLED=options['cache'], ALLOWED_HOSTS=['*']):
+			if mode == 'wsgi':
+				elapsed, latencies, errors = run_wsgi(
+					options['urls'], token, options['requests'], options['wsgi_threads'], options['client_delay'])
+			else:
+				elapsed, latencies, errors = run_asgi(
+					options['urls'], token, options['requests'], options['concurrency'], options['client_delay'])
+		return {
+			'mode': mode,
+			'requests': options['requests'],
+			'concurrency': options['concurrency'] if mode == 'asgi' else options['wsgi_threads'],
+			'client_delay_s': options['client_delay'],
+			'errors': errors,
+			'elapsed_s': round(elapsed, 3),
+			'requests_per_second': round(options['requests'] / elapsed, 1),
+			**_percentiles(latencies),
+		}
@@ -0,0 +1,62 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from records.export import EXPORT_FORMATS, iter_export_lines
+from records.models import Patient
+
+
+def _init_worker():
+	# Needed under the 'spawn' start method; a no-op once apps are loaded.
+	django.setup()
+
+
+def _export_patient(patient_id, path, export_format, chunk_size):
+	lines = 0
+	with open(path, 'w', encoding='utf-8', newline='') as output:
+		for line in iter_export_lines(patient_id, export_format, chunk_size):
+			output.write(line)
+			lines += 1
+	return patient_id, lines
+
+
+class Command(BaseCommand):
+	help = "Export patients' full records to one NDJSON or CSV file per patient, optionally in parallel worker processes."
+
+	def add_arguments(self, parser):
+		parser.add_argument('patient_ids', nargs='*', type=int, help='Patients to export (default: all).')
+		parser.add_argument('--output-dir', required=True, help='Directory to write patient-<id>.<format> files to.')
+		parser.add_argument('--format', dest='export_format', choices=list(EXPORT_FORMATS), default='ndjson')
+		parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+		parser.add_argument('--chunk-size', type=int, default=None, help='Rows fetched per database round-trip.')
+
+	def handle(self, *args, **options):
+		output_dir = Path(options['output_dir'])
+		output_dir.mkdir(parents=True, exist_ok=True)
+		export_format = options['export_format']
+
+		patient_ids = options['patient_ids']
+		if patient_ids:
+			missing = set(patient_ids) - set(Patient.objects.filter(pk__in=patient_ids).values_list('pk', flat=True))
+			if missing:
+				raise CommandError(f"Unknown patient ids: {', '.join(map(str, sorted(missing)))}")
+		else:
+			patient_ids = list(Patient.objects.order_by('pk').values_list('pk', flat=True))
+
+		jobs = [
+			(patient_id, output_dir / f'patient-{patient_id}.{export_format}', export_format, options['chunk_size'])
+			for patient_id in patient_ids
+		]
+		if options['workers'] > 1:
+			# Worker processes must open their own database connections.
+			connections.close_all()
+			with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+				results = list(pool.map(_export_patient, *zip(*jobs))) if jobs else []
+		else:
+			results = [_export_patient(*job) for job in jobs]
+
+		total = sum(lines for _, lines in results)
+		self.stdout.write(self.style.SUCCESS(f'Exported {len(results)} patients ({total} lines) to {output_dir}'))
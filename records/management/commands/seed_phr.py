@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from records.seeding import seed_dataset
+
+
+class Command(BaseCommand):
+	help = (
+		'Add deterministic synthetic patients, doctors, appointments, prescriptions, health records and '
+		'user logins to the database, generated in parallel worker processes and written in batched inserts.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--patients', type=int, default=1000)
+		parser.add_argument('--doctors', type=int, default=20)
+		parser.add_argument('--appointments', type=int, default=10000)
+		parser.add_argument('--prescriptions', type=int, default=30000)
+		parser.add_argument('--health-records', type=int, default=10000)
+		parser.add_argument('--no-users', action='store_true', help='Skip the User/UserProfile per patient and doctor.')
+		parser.add_argument('--password', default='pass123', help='Password of every seeded user.')
+		parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed yields the same rows.')
+		parser.add_argument('--chunk-size', type=int, default=10000, help='Rows generated and inserted per batch.')
+		parser.add_argument('--workers', type=int, default=1, help='Worker processes generating rows.')
+
+	def handle(self, *args, **options):
+		counts = [options[name] for name in ('patients', 'doctors', 'appointments', 'prescriptions', 'health_records')]
+		if min(counts) < 0 or options['chunk_size'] < 1 or options['workers'] < 1:
+			raise CommandError('Counts must not be negative; --chunk-size and --workers must be positive.')
+
+		started = time.perf_counter()
+		created = seed_dataset(
+			*counts, users=not options['no_users'], password=options['password'], seed=options['seed'],
+			chunk_size=options['chunk_size'], workers=options['workers'],
+			log=self.stderr.write if options['verbosity'] > 1 else None)
+		elapsed = time.perf_counter() - started
+
+		total = sum(len(ids) for ids in created.values())
+		for name, ids in created.items():
+			if ids:
+				self.stdout.write(f'{name}: {len(ids)} (ids {ids.start}-{ids.stop - 1})')
+		self.stdout.write(self.style.SUCCESS(
+			f'Seeded {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)'))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from records.management.commands.benchmark_db_profiles import copy_database
+
+
+class Command(BaseCommand):
+	help = (
+		'Copy the primary SQLite database over each read replica (PHR_READ_REPLICAS), the local '
+		'stand-in for replication. Replicas serve the data as of the last sync.'
+	)
+
+	def handle(self, *args, **options):
+		aliases = getattr(settings, 'PHR_REPLICA_DATABASES', [])
+		if not aliases:
+			raise CommandError('No read replicas are configured; set PHR_READ_REPLICAS.')
+		primary = connections[DEFAULT_DB_ALIAS]
+		if primary.vendor != 'sqlite':
+			raise CommandError('Replicas can only be synced from a SQLite primary.')
+		for alias in aliases:
+			# Open replica connections would keep reading the old file contents.
+			connections[alias].close()
+			copy_database(primary.settings_dict['NAME'], connections[alias].settings_dict['NAME'], 'WAL')
+			self.stdout.write(f"{alias}: {connections[alias].settings_dict['NAME']}")
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def populate_end_datetime(apps, schema_editor):
+    Appointment = apps.get_model('records', 'Appointment')
+    batch = []
+    for appointment in Appointment.objects.only('appointment_datetime', 'duration_minutes').iterator(chunk_size=2000):
+        appointment.end_datetime = appointment.appointment_datetime + timedelta(minutes=appointment.duration_minutes)
+        batch.append(appointment)
+        if len(batch) >= 2000:
+            Appointment.objects.bulk_update(batch, ['end_datetime'])
+            batch = []
+    Appointment.objects.bulk_update(batch, ['end_datetime'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0002_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=30),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='end_datetime',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_end_datetime, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointment',
+            name='end_datetime',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_datetime', 'end_datetime'], name='appointment_doctor_span_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0006_row_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenRevocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('token', 'Token'), ('user', 'User')], max_length=5)),
+                ('subject', models.CharField(max_length=255)),
+                ('revoked_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['revoked_at'], name='tokenrevocation_revoked_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'subject'), name='tokenrevocation_subject_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of the summary triggers as of this migration; the live
+# definitions in records.stats are only reapplied by post_migrate.
+STATUSES = ['scheduled', 'completed', 'cancelled']
+TRIGGER_SUFFIXES = ('appointment_ai', 'appointment_ad', 'appointment_au', 'prescription_ai', 'prescription_ad', 'prescription_au')
+
+
+def _count_appointment(row, sign):
+    day = f'date({row}.appointment_datetime)'
+    flags = ', '.join(f"{sign} * ({row}.status = '{status}')" for status in STATUSES)
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in ['total', *STATUSES])
+    return f"""
+        INSERT INTO records_doctordaystats (doctor_id, day, total, {', '.join(STATUSES)})
+        VALUES ({row}.doctor_id, {day}, {sign}, {flags})
+        ON CONFLICT (doctor_id, day) DO UPDATE SET {updates};
+        DELETE FROM records_doctordaystats WHERE doctor_id = {row}.doctor_id AND day = {day} AND total = 0;
+        INSERT INTO records_appointmentstatusstats (status, appointments) VALUES ({row}.status, {sign})
+        ON CONFLICT (status) DO UPDATE SET appointments = appointments + excluded.appointments;
+    """
+
+
+def _count_prescription(row, sign):
+    return f"""
+        INSERT INTO records_medicationstats (medication, prescriptions) VALUES ({row}.medication, {sign})
+        ON CONFLICT (medication) DO UPDATE SET prescriptions = prescriptions + excluded.prescriptions;
+        DELETE FROM records_medicationstats WHERE medication = {row}.medication AND prescriptions = 0;
+    """
+
+
+STATS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_appointment_ai AFTER INSERT ON records_appointment BEGIN
+        {_count_appointment('new', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_appointment_ad AFTER DELETE ON records_appointment BEGIN
+        {_count_appointment('old', -1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_appointment_au
+        AFTER UPDATE OF doctor_id, appointment_datetime, status ON records_appointment
+        WHEN old.doctor_id IS NOT new.doctor_id OR old.status IS NOT new.status
+            OR date(old.appointment_datetime) IS NOT date(new.appointment_datetime)
+        BEGIN
+        {_count_appointment('old', -1)}
+        {_count_appointment('new', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_prescription_ai AFTER INSERT ON records_prescription BEGIN
+        {_count_prescription('new', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_prescription_ad AFTER DELETE ON records_prescription BEGIN
+        {_count_prescription('old', -1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_prescription_au AFTER UPDATE OF medication ON records_prescription
+        WHEN old.medication IS NOT new.medication
+        BEGIN
+        {_count_prescription('old', -1)}
+        {_count_prescription('new', 1)}
+    END""",
+]
+
+
+def create_stats(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in STATS_SQL:
+            cursor.execute(statement)
+        cursor.execute(
+            "INSERT INTO records_doctordaystats (doctor_id, day, total, scheduled, completed, cancelled) "
+            "SELECT doctor_id, date(appointment_datetime), COUNT(*), SUM(status = 'scheduled'), "
+            "SUM(status = 'completed'), SUM(status = 'cancelled') "
+            "FROM records_appointment GROUP BY doctor_id, date(appointment_datetime)")
+        cursor.execute(
+            "INSERT INTO records_appointmentstatusstats (status, appointments) "
+            "SELECT status, COUNT(*) FROM records_appointment GROUP BY status")
+        cursor.execute(
+            "INSERT INTO records_medicationstats (medication, prescriptions) "
+            "SELECT medication, COUNT(*) FROM records_prescription GROUP BY medication")
+
+
+def remove_stats(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for suffix in TRIGGER_SUFFIXES:
+            cursor.execute(f'DROP TRIGGER IF EXISTS records_stats_{suffix}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0007_tokenrevocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentStatusStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20, unique=True)),
+                ('appointments', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MedicationStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('medication', models.CharField(max_length=200, unique=True)),
+                ('prescriptions', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-prescriptions', 'medication'], name='medicationstats_top_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DoctorDayStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('scheduled', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='records.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='doctordaystats_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'day'), name='doctordaystats_doctor_day_uniq')],
+            },
+        ),
+        migrations.RunPython(create_stats, remove_stats),
+    ]
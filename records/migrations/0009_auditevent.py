@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0008_summary_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(null=True)),
+                ('role', models.CharField(blank=True, max_length=10)),
+                ('action', models.CharField(choices=[('read', 'Read'), ('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('export', 'Export')], max_length=10)),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'object_id', 'timestamp'], name='auditevent_object_ts_idx'), models.Index(fields=['user_id', 'timestamp'], name='auditevent_user_ts_idx'), models.Index(fields=['timestamp'], name='auditevent_ts_idx')],
+            },
+        ),
+    ]
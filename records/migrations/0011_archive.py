@@ -0,0 +1,201 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copies of the union views and archive summary triggers as of this
+# migration, with explicit column lists; records.archive and records.stats
+# rebuild the live definitions from the models on post_migrate.
+UNION_VIEWS = [
+    ('records_appointment_with_archive', 'records_appointment', 'records_archivedappointment',
+     ['id', 'patient_id', 'doctor_id', 'appointment_datetime', 'duration_minutes', 'end_datetime', 'status', 'version', 'updated_at']),
+    ('records_prescription_with_archive', 'records_prescription', 'records_archivedprescription',
+     ['id', 'appointment_id', 'medication', 'dosage', 'instructions', 'version', 'updated_at']),
+    ('records_healthrecord_with_archive', 'records_healthrecord', 'records_archivedhealthrecord',
+     ['id', 'patient_id', 'doctor_id', 'record_date', 'diagnosis', 'treatment', 'version', 'updated_at']),
+]
+STATUSES = ['scheduled', 'completed', 'cancelled']
+
+
+def _count_appointment(row, sign):
+    day = f'date({row}.appointment_datetime)'
+    flags = ', '.join(f"{sign} * ({row}.status = '{status}')" for status in STATUSES)
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in ['total', *STATUSES])
+    return f"""
+        INSERT INTO records_doctordaystats (doctor_id, day, total, {', '.join(STATUSES)})
+        VALUES ({row}.doctor_id, {day}, {sign}, {flags})
+        ON CONFLICT (doctor_id, day) DO UPDATE SET {updates};
+        DELETE FROM records_doctordaystats WHERE doctor_id = {row}.doctor_id AND day = {day} AND total = 0;
+        INSERT INTO records_appointmentstatusstats (status, appointments) VALUES ({row}.status, {sign})
+        ON CONFLICT (status) DO UPDATE SET appointments = appointments + excluded.appointments;
+    """
+
+
+def _count_prescription(row, sign):
+    return f"""
+        INSERT INTO records_medicationstats (medication, prescriptions) VALUES ({row}.medication, {sign})
+        ON CONFLICT (medication) DO UPDATE SET prescriptions = prescriptions + excluded.prescriptions;
+        DELETE FROM records_medicationstats WHERE medication = {row}.medication AND prescriptions = 0;
+    """
+
+
+ARCHIVE_STATS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_archivedappointment_ai AFTER INSERT ON records_archivedappointment BEGIN
+        {_count_appointment('new', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_archivedappointment_ad AFTER DELETE ON records_archivedappointment BEGIN
+        {_count_appointment('old', -1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_archivedprescription_ai AFTER INSERT ON records_archivedprescription BEGIN
+        {_count_prescription('new', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS records_stats_archivedprescription_ad AFTER DELETE ON records_archivedprescription BEGIN
+        {_count_prescription('old', -1)}
+    END""",
+]
+
+
+def create_views(apps, schema_editor):
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for view, hot_table, archive_table, columns in UNION_VIEWS:
+            columns = ', '.join(quote(column) for column in columns)
+            cursor.execute(f'DROP VIEW IF EXISTS {quote(view)}')
+            cursor.execute(
+                f'CREATE VIEW {quote(view)} AS SELECT {columns} FROM {quote(hot_table)} '
+                f'UNION ALL SELECT {columns} FROM {quote(archive_table)}')
+        if connection.vendor == 'sqlite':
+            for statement in ARCHIVE_STATS_SQL:
+                cursor.execute(statement)
+
+
+def remove_views(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for view, *_ in UNION_VIEWS:
+            cursor.execute(f'DROP VIEW IF EXISTS {quote(view)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentWithArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_datetime', models.DateTimeField()),
+                ('duration_minutes', models.PositiveIntegerField()),
+                ('end_datetime', models.DateTimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('version', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'records_appointment_with_archive',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HealthRecordWithArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_date', models.DateField()),
+                ('diagnosis', models.TextField()),
+                ('treatment', models.TextField(blank=True)),
+                ('version', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'records_healthrecord_with_archive',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PrescriptionWithArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('medication', models.CharField(max_length=200)),
+                ('dosage', models.CharField(max_length=100)),
+                ('instructions', models.TextField(blank=True)),
+                ('version', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'records_prescription_with_archive',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_datetime', models.DateTimeField()),
+                ('duration_minutes', models.PositiveIntegerField()),
+                ('end_datetime', models.DateTimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('version', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='records.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='records.patient')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedHealthRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('record_date', models.DateField()),
+                ('diagnosis', models.TextField()),
+                ('treatment', models.TextField(blank=True)),
+                ('version', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+                ('doctor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_health_records', to='records.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_health_records', to='records.patient')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPrescription',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('medication', models.CharField(max_length=200)),
+                ('dosage', models.CharField(max_length=100)),
+                ('instructions', models.TextField(blank=True)),
+                ('version', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prescriptions', to='records.archivedappointment')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['patient', 'appointment_datetime'], name='archivedappt_patient_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['doctor', 'appointment_datetime'], name='archivedappt_doctor_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['status', 'appointment_datetime'], name='archivedappt_status_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['appointment_datetime'], name='archivedappt_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedhealthrecord',
+            index=models.Index(fields=['patient', 'record_date'], name='archivedhr_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedhealthrecord',
+            index=models.Index(fields=['doctor', 'record_date'], name='archivedhr_doctor_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedhealthrecord',
+            index=models.Index(fields=['record_date'], name='archivedhr_date_idx'),
+        ),
+        migrations.RunPython(create_views, remove_views),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# Frozen copy of the index and triggers as of this migration; the live
+# definitions in records.search are only reapplied by post_migrate.
+FTS_TABLE = 'records_archivedhealthrecord_fts'
+
+FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        diagnosis, treatment,
+        content='records_archivedhealthrecord', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON records_archivedhealthrecord BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, diagnosis, treatment) VALUES (new.id, new.diagnosis, new.treatment);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON records_archivedhealthrecord BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, diagnosis, treatment)
+        VALUES ('delete', old.id, old.diagnosis, old.treatment);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF diagnosis, treatment ON records_archivedhealthrecord BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, diagnosis, treatment)
+        VALUES ('delete', old.id, old.diagnosis, old.treatment);
+        INSERT INTO {FTS_TABLE}(rowid, diagnosis, treatment) VALUES (new.id, new.diagnosis, new.treatment);
+    END""",
+]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in FTS_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def remove_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0011_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, remove_index),
+    ]
@@ -1,5 +1,7 @@
 
 
+from datetime import timedelta
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -16,8 +18,41 @@ class UserProfile(models.Model):
 	def __str__(self):
 		return f"{self.user.username} ({self.role})"
 
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		# The stored values, so saves that would change nothing can be skipped.
+		instance._loaded_values = dict(zip(field_names, values))
+		return instance
+
+	def save(self, *args, **kwargs):
+		super().save(*args, **kwargs)
+		self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+	def has_changed(self):
+		"""Whether saving would write anything: new, or modified since loaded or saved."""
+		loaded = getattr(self, '_loaded_values', None)
+		if self._state.adding or loaded is None:
+			return True
+		return any(getattr(self, name) != value for name, value in loaded.items())
+
+# VersionedModel: Adds a per-row version counter and modification timestamp, used for ETags and If-Match.
+class VersionedModel(models.Model):
+	version = models.PositiveIntegerField(default=1, editable=False)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		abstract = True
+
+	def save(self, *args, **kwargs):
+		if not self._state.adding:
+			self.version += 1
+		if kwargs.get('update_fields') is not None:
+			kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+		super().save(*args, **kwargs)
+
 # Patient: Stores demographic and contact information for individuals receiving medical care.
-class Patient(models.Model):
+class Patient(VersionedModel):
 	first_name = models.CharField(max_length=100)
 	last_name = models.CharField(max_length=100)
 	date_of_birth = models.DateField()
@@ -28,7 +63,7 @@ class Patient(models.Model):
 		return f"{self.first_name} {self.last_name}"
 
 # Doctor: Represents medical professionals, including their specialization and contact details.
-class Doctor(models.Model):
+class Doctor(VersionedModel):
 	first_name = models.CharField(max_length=100)
 	last_name = models.CharField(max_length=100)
 	specialty = models.CharField(max_length=100, blank=True)
@@ -38,8 +73,8 @@ class Doctor(models.Model):
 	def __str__(self):
 		return f"Dr. {self.first_name} {self.last_name}"
 
-# Appointment: Links a patient and a doctor for a scheduled meeting, tracks date/time and status.
-class Appointment(models.Model):
+# Appointment: Links a patient and a doctor for a scheduled meeting, tracks date/time, duration and status.
+class Appointment(VersionedModel):
 	STATUS_CHOICES = [
 		('scheduled', 'Scheduled'),
 		('completed', 'Completed'),
@@ -48,13 +83,35 @@ class Appointment(models.Model):
 	patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments')
 	doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments')
 	appointment_datetime = models.DateTimeField()
+	duration_minutes = models.PositiveIntegerField(default=30)
+	# Denormalized appointment_datetime + duration_minutes, so overlap checks are an indexed range query.
+	end_datetime = models.DateTimeField(editable=False)
 	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['patient', 'appointment_datetime'], name='appointment_patient_dt_idx'),
+			models.Index(fields=['doctor', 'appointment_datetime', 'end_datetime'], name='appointment_doctor_span_idx'),
+			models.Index(fields=['doctor', 'status', 'appointment_datetime'], name='appointment_doctor_status_idx'),
+			models.Index(fields=['status', 'appointment_datetime'], name='appointment_status_dt_idx'),
+			models.Index(fields=['appointment_datetime'], name='appointment_dt_idx'),
+		]
+
 	def __str__(self):
 		return f"Appointment: {self.patient} with {self.doctor} at {self.appointment_datetime}"
 
+	def compute_end_datetime(self):
+		start = self._meta.get_field('appointment_datetime').to_python(self.appointment_datetime)
+		return start + timedelta(minutes=self.duration_minutes)
+
+	def save(self, *args, **kwargs):
+		self.end_datetime = self.compute_end_datetime()
+		if kwargs.get('update_fields') is not None:
+			kwargs['update_fields'] = {*kwargs['update_fields'], 'end_datetime'}
+		super().save(*args, **kwargs)
+
 # Prescription: Contains medication orders and instructions, linked to a specific appointment.
-class Prescription(models.Model):
+class Prescription(VersionedModel):
 	appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='prescriptions')
 	medication = models.CharField(max_length=200)
 	dosage = models.CharField(max_length=100)
@@ -64,12 +121,206 @@ class Prescription(models.Model):
 		return f"Prescription for {self.appointment.patient} - {self.medication}"
 
 # HealthRecord: Stores clinical notes, diagnosis, and treatment details for a patient, authored by a doctor.
-class HealthRecord(models.Model):
+class HealthRecord(VersionedModel):
 	patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='health_records')
 	doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, null=True, related_name='health_records')
 	record_date = models.DateField()
 	diagnosis = models.TextField()
 	treatment = models.TextField(blank=True)
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['patient', 'record_date'], name='healthrecord_patient_date_idx'),
+			models.Index(fields=['doctor', 'record_date'], name='healthrecord_doctor_date_idx'),
+			models.Index(fields=['record_date'], name='healthrecord_date_idx'),
+		]
+
 	def __str__(self):
 		return f"Record for {self.patient} on {self.record_date}"
+
+# DoctorDayStats: Appointments per doctor per (UTC) day, by status. Kept up to date by the triggers in records/stats.py.
+class DoctorDayStats(models.Model):
+	# No database constraint: rows are written by triggers and removed when they reach zero.
+	doctor = models.ForeignKey(Doctor, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+	day = models.DateField()
+	total = models.IntegerField(default=0)
+	scheduled = models.IntegerField(default=0)
+	completed = models.IntegerField(default=0)
+	cancelled = models.IntegerField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['doctor', 'day'], name='doctordaystats_doctor_day_uniq'),
+		]
+		indexes = [
+			models.Index(fields=['day'], name='doctordaystats_day_idx'),
+		]
+
+# AppointmentStatusStats: Appointment count per status.
+class AppointmentStatusStats(models.Model):
+	status = models.CharField(max_length=20, unique=True)
+	appointments = models.IntegerField(default=0)
+
+# MedicationStats: Prescription count per medication, indexed for most-prescribed lookups.
+class MedicationStats(models.Model):
+	medication = models.CharField(max_length=200, unique=True)
+	prescriptions = models.IntegerField(default=0)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['-prescriptions', 'medication'], name='medicationstats_top_idx'),
+		]
+
+# AuditEvent: One read or change of an audited object (PHR_AUDIT_MODELS), written in batches by records/audit.py.
+class AuditEvent(models.Model):
+	ACTION_CHOICES = [
+		('read', 'Read'),
+		('create', 'Create'),
+		('update', 'Update'),
+		('delete', 'Delete'),
+		('export', 'Export'),
+	]
+	# Plain columns rather than foreign keys: events outlive the users and objects they name.
+	user_id = models.BigIntegerField(null=True)
+	role = models.CharField(max_length=10, blank=True)
+	action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+	model = models.CharField(max_length=100)
+	object_id = models.BigIntegerField()
+	timestamp = models.DateTimeField()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['model', 'object_id', 'timestamp'], name='auditevent_object_ts_idx'),
+			models.Index(fields=['user_id', 'timestamp'], name='auditevent_user_ts_idx'),
+			models.Index(fields=['timestamp'], name='auditevent_ts_idx'),
+		]
+
+# IdempotencyKey: A create request's Idempotency-Key and, once it has finished, its compressed response (records/idempotency.py).
+class IdempotencyKey(models.Model):
+	user_id = models.BigIntegerField()
+	key = models.CharField(max_length=255)
+	# SHA-256 of method, path and body; a key may not be reused for another request.
+	fingerprint = models.CharField(max_length=64)
+	# Null while the first request is still running.
+	status_code = models.PositiveSmallIntegerField(null=True)
+	content_type = models.CharField(max_length=100, blank=True)
+	body = models.BinaryField(null=True)
+	created_at = models.DateTimeField()
+	expires_at = models.DateTimeField()
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user_id', 'key'], name='idempotencykey_user_key_uniq'),
+		]
+		indexes = [
+			models.Index(fields=['expires_at'], name='idempotencykey_expires_idx'),
+		]
+
+# ArchivedAppointment: A completed or cancelled appointment moved out of Appointment by records/archive.py, keeping its id.
+class ArchivedAppointment(models.Model):
+	id = models.BigIntegerField(primary_key=True)
+	patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='archived_appointments')
+	doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='archived_appointments')
+	appointment_datetime = models.DateTimeField()
+	duration_minutes = models.PositiveIntegerField()
+	end_datetime = models.DateTimeField()
+	status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+	version = models.PositiveIntegerField()
+	updated_at = models.DateTimeField()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['patient', 'appointment_datetime'], name='archivedappt_patient_dt_idx'),
+			models.Index(fields=['doctor', 'appointment_datetime'], name='archivedappt_doctor_dt_idx'),
+			models.Index(fields=['status', 'appointment_datetime'], name='archivedappt_status_dt_idx'),
+			models.Index(fields=['appointment_datetime'], name='archivedappt_dt_idx'),
+		]
+
+# ArchivedPrescription: A prescription archived together with its appointment, so it references the archived row.
+class ArchivedPrescription(models.Model):
+	id = models.BigIntegerField(primary_key=True)
+	appointment = models.ForeignKey(ArchivedAppointment, on_delete=models.CASCADE, related_name='prescriptions')
+	medication = models.CharField(max_length=200)
+	dosage = models.CharField(max_length=100)
+	instructions = models.TextField(blank=True)
+	version = models.PositiveIntegerField()
+	updated_at = models.DateTimeField()
+
+# ArchivedHealthRecord: A health record older than the archive horizon, moved out of HealthRecord by records/archive.py.
+class ArchivedHealthRecord(models.Model):
+	id = models.BigIntegerField(primary_key=True)
+	patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='archived_health_records')
+	doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, null=True, related_name='archived_health_records')
+	record_date = models.DateField()
+	diagnosis = models.TextField()
+	treatment = models.TextField(blank=True)
+	version = models.PositiveIntegerField()
+	updated_at = models.DateTimeField()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['patient', 'record_date'], name='archivedhr_patient_date_idx'),
+			models.Index(fields=['doctor', 'record_date'], name='archivedhr_doctor_date_idx'),
+			models.Index(fields=['record_date'], name='archivedhr_date_idx'),
+		]
+
+# AppointmentWithArchive: Read-only UNION ALL view of Appointment and ArchivedAppointment, for ?include_archived= reads.
+class AppointmentWithArchive(models.Model):
+	patient = models.ForeignKey(Patient, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+	doctor = models.ForeignKey(Doctor, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+	appointment_datetime = models.DateTimeField()
+	duration_minutes = models.PositiveIntegerField()
+	end_datetime = models.DateTimeField()
+	status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+	version = models.PositiveIntegerField()
+	updated_at = models.DateTimeField()
+
+	class Meta:
+		managed = False
+		db_table = 'records_appointment_with_archive'
+
+# PrescriptionWithArchive: Read-only view of Prescription and ArchivedPrescription.
+class PrescriptionWithArchive(models.Model):
+	appointment = models.ForeignKey(AppointmentWithArchive, on_delete=models.DO_NOTHING, db_constraint=False, related_name='prescriptions')
+	medication = models.CharField(max_length=200)
+	dosage = models.CharField(max_length=100)
+	instructions = models.TextField(blank=True)
+	version = models.PositiveIntegerField()
+	updated_at = models.DateTimeField()
+
+	class Meta:
+		managed = False
+		db_table = 'records_prescription_with_archive'
+
+# HealthRecordWithArchive: Read-only view of HealthRecord and ArchivedHealthRecord.
+class HealthRecordWithArchive(models.Model):
+	patient = models.ForeignKey(Patient, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+	doctor = models.ForeignKey(Doctor, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+	record_date = models.DateField()
+	diagnosis = models.TextField()
+	treatment = models.TextField(blank=True)
+	version = models.PositiveIntegerField()
+	updated_at = models.DateTimeField()
+
+	class Meta:
+		managed = False
+		db_table = 'records_healthrecord_with_archive'
+
+# TokenRevocation: A revoked token (by jti) or all of a user's tokens issued before revoked_at, shared by every worker (records/authentication.py).
+class TokenRevocation(models.Model):
+	KIND_CHOICES = [
+		('token', 'Token'),
+		('user', 'User'),
+	]
+	kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+	# The token's jti, or the user id.
+	subject = models.CharField(max_length=255)
+	revoked_at = models.DateTimeField()
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['kind', 'subject'], name='tokenrevocation_subject_uniq'),
+		]
+		indexes = [
+			models.Index(fields=['revoked_at'], name='tokenrevocation_revoked_idx'),
+		]
@@ -0,0 +1,137 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+	"""
+	Keyset (seek) pagination over a composite, unique ordering.
+
+	DRF's ``CursorPagination`` only seeks on the first ordering field and falls
+	back to an offset for ties. Here the cursor carries the full ordering key of
+	the boundary row (e.g. ``appointment_datetime, id``), so every page is a
+	single ``WHERE key > cursor ORDER BY key LIMIT n`` that an index can serve
+	and no ``COUNT(*)`` is ever issued. Views declare their ordering through an
+	``ordering`` attribute; the last field must be unique (normally ``id``).
+	"""
+	page_size_query_param = 'page_size'
+	max_page_size = getattr(settings, 'PHR_MAX_PAGE_SIZE', 500)
+	ordering = ('id',)
+
+	def paginate_queryset(self, queryset, request, view=None):
+		queryset = self._page_queryset(queryset, request, view)
+		if queryset is None:
+			return None
+		return self._set_page(list(queryset))
+
+	async def apaginate_queryset(self, queryset, request, view=None):
+		"""paginate_queryset() for async views, fetching the page with the async ORM."""
+		queryset = self._page_queryset(queryset, request, view)
+		if queryset is None:
+			return None
+		return self._set_page([row async for row in queryset])
+
+	def _page_queryset(self, queryset, request, view):
+		self.request = request
+		self.page_size = self.get_page_size(request)
+		if not self.page_size:
+			return None
+
+		self.base_url = request.build_absolute_uri()
+		self.ordering = self.get_ordering(request, queryset, view)
+
+		self.cursor = self.decode_cursor(request)
+		if self.cursor is None:
+			self._reverse, self._position = False, None
+		else:
+			self._reverse = self.cursor.reverse
+			self._position = self._decode_position(queryset.model, self.cursor.position)
+
+		if self._reverse:
+			queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+		else:
+			queryset = queryset.order_by(*self.ordering)
+
+		if self._position is not None:
+			queryset = queryset.filter(self._seek_filter(self._position, self._reverse))
+
+		# Fetch one extra row to learn whether another page follows.
+		return queryset[:self.page_size + 1]
+
+	def _set_page(self, results):
+		has_more = len(results) > self.page_size
+		self.page = results[:self.page_size]
+
+		if self._reverse:
+			self.page.reverse()
+			self.has_next = True
+			self.has_previous = has_more
+		else:
+			self.has_next = has_more
+			self.has_previous = self._position is not None
+
+		if (self.has_previous or self.has_next) and self.template is not None:
+			self.display_page_controls = True
+
+		return self.page
+
+	def get_ordering(self, request, queryset, view):
+		ordering = getattr(view, 'ordering', None) or self.ordering
+		if isinstance(ordering, str):
+			return (ordering,)
+		return tuple(ordering)
+
+	def get_next_link(self):
+		if not self.has_next or not self.page:
+			return None
+		position = self._get_position_from_instance(self.page[-1], self.ordering)
+		return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+	def get_previous_link(self):
+		if not self.has_previous or not self.page:
+			return None
+		position = self._get_position_from_instance(self.page[0], self.ordering)
+		return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+	def _get_position_from_instance(self, instance, ordering):
+		values = []
+		for order in ordering:
+			field_name = order.lstrip('-')
+			if isinstance(instance, dict):
+				value = instance[field_name]
+			else:
+				value = getattr(instance, field_name)
+			values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+		return json.dumps(values, separators=(',', ':'))
+
+	def _decode_position(self, model, position):
+		if position is None:
+			return None
+		try:
+			values = json.loads(position)
+			if not isinstance(values, list) or len(values) != len(self.ordering):
+				raise ValueError
+			return [
+				model._meta.get_field(order.lstrip('-')).to_python(value)
+				for order, value in zip(self.ordering, values)
+			]
+		except (TypeError, ValueError, ValidationError):
+			raise NotFound(self.invalid_cursor_message)
+
+	def _seek_filter(self, position, reverse):
+		"""
+		Build ``(a > x) OR (a = x AND b > y) OR ...`` for the ordering key,
+		flipping each comparison for descending fields and reverse cursors.
+		"""
+		condition = Q()
+		equal = {}
+		for order, value in zip(self.ordering, position):
+			field_name = order.lstrip('-')
+			lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+			condition |= Q(**equal, **{f'{field_name}__{lookup}': value})
+			equal[field_name] = value
+		return condition
@@ -1,19 +1,25 @@
 from rest_framework.permissions import BasePermission
+from rest_framework_simplejwt.models import TokenUser
+
+from .instrumentation import timed
+
+
+def user_role(user):
+    """The user's role, read from token claims when available, else from its profile."""
+    if not user.is_authenticated:
+        return None
+    if isinstance(user, TokenUser):
+        return user.token.get('role')
+    return getattr(getattr(user, 'profile', None), 'role', None)
 
 class IsDoctor(BasePermission):
     """Allows access only to users with role 'doctor'."""
     def has_permission(self, request, view):
-        return (
-            request.user.is_authenticated and
-            hasattr(request.user, 'profile') and
-            request.user.profile.role == 'doctor'
-        )
+        with timed('auth'):
+            return user_role(request.user) == 'doctor'
 
 class IsPatient(BasePermission):
     """Allows access only to users with role 'patient'."""
     def has_permission(self, request, view):
-        return (
-            request.user.is_authenticated and
-            hasattr(request.user, 'profile') and
-            request.user.profile.role == 'patient'
-        )
+        with timed('auth'):
+            return user_role(request.user) == 'patient'
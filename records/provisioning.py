@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .authentication import revocations
+from .models import UserProfile
+from .serializers import UserProvisionSerializer
+
+USER_FIELDS = ('email', 'first_name', 'last_name', 'is_staff')
+
+
+class ProvisioningError(Exception):
+	"""Raised before anything is written; ``errors`` holds one dict per input row, empty for valid rows."""
+	def __init__(self, errors):
+		super().__init__('Invalid users.')
+		self.errors = errors
+
+
+def read_csv_rows(stream):
+	"""Rows of a CSV text stream with a header line; empty cells are left out, as if not given."""
+	return [
+		{key: value for key, value in row.items() if key and value not in (None, '')}
+		for row in csv.DictReader(stream)
+	]
+
+
+def read_rows(stream, format):
+	"""Users from a CSV or JSON (array of objects) text stream."""
+	if format == 'csv':
+		return read_csv_rows(stream)
+	rows = json.load(stream)
+	if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+		raise ValueError('Expected a JSON array of objects.')
+	return rows
+
+
+class CSVRowsParser(BaseParser):
+	"""Parses a ``text/csv`` body into a list of row dicts (see read_csv_rows)."""
+	media_type = 'text/csv'
+
+	def parse(self, stream, media_type=None, parser_context=None):
+		encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+		try:
+			text = stream.read().decode(encoding) if stream is not None else ''
+			return read_csv_rows(io.StringIO(text, newline=''))
+		except (UnicodeDecodeError, csv.Error) as exc:
+			raise ParseError(f'CSV parse error - {exc}')
+
+
+def hash_passwords(passwords, workers=None):
+	"""
+	``make_password`` over ``passwords`` in a thread pool. PBKDF2 runs in
+	OpenSSL without the GIL, so threads hash in parallel.
+	"""
+	workers = workers or getattr(settings, 'PHR_PROVISION_HASH_WORKERS', None) or os.cpu_count() or 1
+	if workers == 1 or len(passwords) < 2:
+		return [make_password(password) for password in passwords]
+	with ThreadPoolExecutor(max_workers=min(workers, len(passwords))) as pool:
+		return list(pool.map(make_password, passwords))
+
+
+def _existing_users(usernames, batch_size):
+	users = {}
+	for start in range(0, len(usernames), batch_size):
+		chunk = usernames[start:start + batch_size]
+		users.update((user.username, user) for user in User.objects.select_related('profile').filter(username__in=chunk))
+	return users
+
+
+def _validate(rows, existing):
+	serializer = UserProvisionSerializer(data=rows, many=True)
+	if not serializer.is_valid():
+		raise ProvisioningError(serializer.errors)
+	items = serializer.validated_data
+
+	errors, seen = [{} for _ in items], set()
+	for index, item in enumerate(items):
+		username = item['username']
+		if username in seen:
+			errors[index]['username'] = ['Duplicate username in this batch.']
+		seen.add(username)
+		if 'password' not in item:
+			if username not in existing:
+				errors[index]['password'] = ['This field is required for new users.']
+			continue
+		user = existing.get(username) or User(
+			username=username, **{field: item[field] for field in USER_FIELDS if field in item})
+		try:
+			validate_password(item['password'], user)
+		except ValidationError as exc:
+			errors[index]['password'] = list(exc.messages)
+	if any(errors):
+		raise ProvisioningError(errors)
+	return items
+
+
+def provision_users(rows, batch_size=None, workers=None):
+	"""
+	Create or update users and their profiles' roles from ``rows`` (dicts
+	validated by UserProvisionSerializer), matched by username.
+
+	Every row is validated, and every given password hashed in a worker pool,
+	before anything is written; invalid input raises ProvisioningError. Rows
+	are then written ``batch_size`` at a time, one transaction per batch,
+	with bulk_create/bulk_update for users and profiles: no per-user save()
+	or post_save profile signals. Users whose role or staff flag changes
+	have their tokens revoked, as a role change through the profile would.
+	"""
+	batch_size = batch_size or getattr(settings, 'PHR_PROVISION_BATCH_SIZE', 500)
+	existing = _existing_users(list({row.get('username') for row in rows if isinstance(row.get('username'), str)}), batch_size)
+	items = _validate(rows, existing)
+	hashed = iter(hash_passwords([item['password'] for item in items if 'password' in item], workers))
+
+	results = []
+	for start in range(0, len(items), batch_size):
+		batch = items[start:start + batch_size]
+		new_users, user_updates, new_profiles, profile_updates, revoked = [], [], [], [], []
+		user_fields = set()
+		for item in batch:
+			password = next(hashed) if 'password' in item else None
+			user = existing.get(item['username'])
+			if user is None:
+				user = User(
+					username=item['username'], password=password,
+					**{field: item[field] for field in USER_FIELDS if field in item})
+				new_users.append(user)
+				results.append((user, item.get('role', ''), 'created'))
+				continue
+
+			changed = {field for field in USER_FIELDS if field in item and getattr(user, field) != item[field]}
+			for field in changed:
+				setattr(user, field, item[field])
+			if password is not None:
+				user.password = password
+				changed.add('password')
+			if changed:
+				user_fields.update(changed)
+				user_updates.append(user)
+
+			profile = getattr(user, 'profile', None)
+			role = item.get('role', getattr(profile, 'role', ''))
+			if profile is None:
+				new_profiles.append(UserProfile(user=user, role=role))
+				changed.add('role')
+			elif profile.role != role:
+				profile.role = role
+				profile_updates.append(profile)
+				changed.add('role')
+			if changed & {'role', 'is_staff'}:
+				revoked.append(user.pk)
+			results.append((user, role, 'updated' if changed else 'unchanged'))
+
+		with transaction.atomic():
+			User.objects.bulk_create(new_users)
+			# Profiles of new users, created here rather than by the post_save signal.
+			new_profiles.extend(UserProfile(user=user, role=role) for user, role, result in results[start:] if result == 'created')
+			UserProfile.objects.bulk_create(new_profiles)
+			if user_updates:
+				User.objects.bulk_update(user_updates, sorted(user_fields))
+			if profile_updates:
+				UserProfile.objects.bulk_update(profile_updates, ['role'])
+		revocations.revoke_users(revoked)
+
+	counts = {result: sum(1 for *_, outcome in results if outcome == result) for result in ('created', 'updated', 'unchanged')}
+	return {
+		**counts,
+		'users': [{'id': user.pk, 'username': user.username, 'role': role, 'result': result} for user, role, result in results],
+	}
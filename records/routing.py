@@ -0,0 +1,182 @@
+import itertools
+import threading
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_PREFIX = 'phr:pin:'
+# Methods whose reads may be served by a replica.
+REPLICA_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Routing state of the request being served in this context; it follows the
+# request into sync_to_async worker threads like the instrumentation timings.
+_current = ContextVar('phr_db_routing', default=None)
+
+
+def replica_aliases():
+	return getattr(settings, 'PHR_REPLICA_DATABASES', [])
+
+
+def pin_key(user_id):
+	return f'{PIN_PREFIX}{user_id}'
+
+
+def pin_cache():
+	return caches[getattr(settings, 'PHR_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def reads_own_writes():
+	"""
+	Whether the current request must see its user's writes: it is routed to
+	the primary because it wrote or its user is pinned there, while replicas
+	are in use.
+	"""
+	state = _current.get()
+	if state is None or not state.replica_reads or not replica_aliases():
+		return False
+	return state.read_alias() == DEFAULT_DB_ALIAS
+
+
+def served_by_replica():
+	"""Whether the current request's reads went to a replica."""
+	state = _current.get()
+	return state is not None and state.alias not in (None, DEFAULT_DB_ALIAS)
+
+
+class ReplicaPool:
+	"""
+	Picks the replica a request reads from: in turn (``round_robin``), or the
+	one serving the fewest requests of this process (``least_loaded``, ties
+	in turn).
+	"""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._turn = itertools.count()
+		self.active = {}
+
+	def acquire(self, aliases, strategy):
+		with self._lock:
+			start = next(self._turn)
+			ordered = [aliases[(start + offset) % len(aliases)] for offset in range(len(aliases))]
+			if strategy == 'least_loaded':
+				alias = min(ordered, key=lambda name: self.active.get(name, 0))
+			else:
+				alias = ordered[0]
+			self.active[alias] = self.active.get(alias, 0) + 1
+			return alias
+
+	def release(self, alias):
+		with self._lock:
+			self.active[alias] -= 1
+
+
+replicas = ReplicaPool()
+
+
+class RoutingState:
+	"""Where one request's reads go, decided at its first routed read."""
+	def __init__(self, request):
+		self.request = request
+		self.replica_reads = request.method in REPLICA_METHODS
+		self.alias = None
+		self.wrote = False
+
+	def read_alias(self):
+		if self.wrote or not self.replica_reads:
+			return DEFAULT_DB_ALIAS
+		if self.alias is None:
+			aliases = replica_aliases()
+			if not aliases or self.pinned():
+				self.alias = DEFAULT_DB_ALIAS
+			else:
+				self.alias = replicas.acquire(aliases, getattr(settings, 'PHR_REPLICA_SELECTION', 'round_robin'))
+		return self.alias
+
+	def user_id(self):
+		# DRF sets the authenticated user on the Django request as well.
+		user = self.request.__dict__.get('user')
+		if user is None or not getattr(user, 'is_authenticated', False):
+			return None
+		return user.pk
+
+	def pinned(self):
+		user_id = self.user_id()
+		return user_id is not None and pin_cache().get(pin_key(user_id)) is not None
+
+	def finish(self):
+		if self.alias not in (None, DEFAULT_DB_ALIAS):
+			replicas.release(self.alias)
+		seconds = getattr(settings, 'PHR_PRIMARY_STICKY_SECONDS', 5)
+		user_id = self.user_id()
+		if self.wrote and seconds > 0 and user_id is not None:
+			pin_cache().set(pin_key(user_id), True, timeout=seconds)
+
+
+class ReplicaRouter:
+	"""
+	Sends reads of the records app to a read replica
+	(``PHR_REPLICA_DATABASES``) during GET, HEAD and OPTIONS requests, and
+	everything else to the primary. A request that writes reads from the
+	primary from then on, and so does its user for
+	``PHR_PRIMARY_STICKY_SECONDS`` afterwards, so clients see their own
+	writes despite replication lag. Work outside a request (management
+	commands, shells, tests) stays on the primary.
+	"""
+	def db_for_read(self, model, **hints):
+		state = _current.get()
+		if state is None or model._meta.app_label != 'records':
+			return None
+		return state.read_alias()
+
+	def db_for_write(self, model, **hints):
+		state = _current.get()
+		if state is not None and model._meta.app_label == 'records':
+			state.wrote = True
+		return DEFAULT_DB_ALIAS
+
+	def allow_relation(self, obj1, obj2, **hints):
+		databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+		if obj1._state.db in databases and obj2._state.db in databases:
+			return True
+		return None
+
+	def allow_migrate(self, db, app_label, model_name=None, **hints):
+		# Replicas are copies of the primary, never migrated themselves.
+		if db in replica_aliases():
+			return False
+		return None
+
+
+class ReplicaRoutingMiddleware:
+	"""Tracks each request's routing state for ``ReplicaRouter``."""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.is_async = iscoroutinefunction(get_response)
+		if self.is_async:
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if self.is_async:
+			return self.__acall__(request)
+		state = RoutingState(request)
+		token = _current.set(state)
+		try:
+			return self.get_response(request)
+		finally:
+			_current.reset(token)
+			state.finish()
+
+	async def __acall__(self, request):
+		state = RoutingState(request)
+		token = _current.set(state)
+		try:
+			return await self.get_response(request)
+		finally:
+			_current.reset(token)
+			state.finish()
@@ -0,0 +1,107 @@
+import bisect
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .models import Doctor, Appointment
+
+
+def max_duration():
+	return timedelta(minutes=getattr(settings, 'PHR_MAX_APPOINTMENT_MINUTES', 480))
+
+
+def booked_intervals(doctor_ids, start, end, exclude_pks=()):
+	"""
+	Scheduled (start, end) intervals per doctor that overlap ``[start, end)``.
+
+	Appointments last at most ``max_duration()``, so any overlap must start
+	within ``(start - max_duration, end)``: a bounded range scan of the
+	(doctor, appointment_datetime, end_datetime) index rather than the
+	doctor's whole calendar.
+	"""
+	rows = (
+		Appointment.objects
+		.filter(
+			doctor_id__in=doctor_ids,
+			appointment_datetime__gt=start - max_duration(), appointment_datetime__lt=end,
+			end_datetime__gt=start)
+		.exclude(pk__in=exclude_pks)
+		.order_by('doctor_id', 'appointment_datetime')
+		.values_list('doctor_id', 'appointment_datetime', 'end_datetime', 'status')
+	)
+	intervals = defaultdict(list)
+	for doctor_id, interval_start, interval_end, status in rows:
+		# Filtered here rather than in SQL so the planner keeps to the doctor
+		# index instead of the (status, appointment_datetime) one.
+		if status == 'scheduled':
+			intervals[doctor_id].append((interval_start, interval_end))
+	return intervals
+
+
+def lock_doctors(doctor_ids):
+	"""
+	Serialize bookings for these doctors until the surrounding transaction ends.
+
+	Uses SELECT ... FOR UPDATE where supported. SQLite has no row locks, so a
+	no-op UPDATE takes the database write lock up front instead, unless
+	transactions already begin with it (``transaction_mode`` IMMEDIATE);
+	without it two deferred transactions could both pass the overlap check.
+	"""
+	doctor_ids = sorted(set(doctor_ids))
+	queryset = Doctor.objects.filter(pk__in=doctor_ids)
+	if connection.features.has_select_for_update:
+		list(queryset.select_for_update().values_list('pk', flat=True))
+	elif getattr(connection, 'transaction_mode', None) in ('IMMEDIATE', 'EXCLUSIVE'):
+		# BEGIN IMMEDIATE already took the write lock.
+		return
+	else:
+		queryset.update(email=F('email'))
+
+
+def find_conflicts(candidates):
+	"""
+	Given ``Appointment`` instances about to be written, return a list of
+	booleans marking those that overlap an existing scheduled appointment of
+	the same doctor or an earlier candidate in the list. One query in total.
+	"""
+	active = [candidate for candidate in candidates if candidate.status == 'scheduled']
+	if not active:
+		return [False] * len(candidates)
+	booked = booked_intervals(
+		{candidate.doctor_id for candidate in active},
+		min(candidate.appointment_datetime for candidate in active),
+		max(candidate.end_datetime for candidate in active),
+		exclude_pks=[candidate.pk for candidate in candidates if candidate.pk is not None],
+	)
+	longest = max_duration()
+	conflicts = []
+	for candidate in candidates:
+		if candidate.status != 'scheduled':
+			conflicts.append(False)
+			continue
+		intervals = booked[candidate.doctor_id]
+		start, end = candidate.appointment_datetime, candidate.end_datetime
+		# Intervals are sorted by start and last at most max_duration().
+		low = bisect.bisect_right(intervals, (start - longest,))
+		high = bisect.bisect_left(intervals, (end,))
+		clash = any(other_end > start for _, other_end in intervals[low:high])
+		conflicts.append(clash)
+		if not clash:
+			bisect.insort(intervals, (start, end))
+	return conflicts
+
+
+def free_intervals(doctor_id, start, end, min_minutes):
+	"""Gaps of at least ``min_minutes`` in the doctor's schedule within ``[start, end)``."""
+	free, cursor = [], start
+	for interval_start, interval_end in booked_intervals([doctor_id], start, end)[doctor_id]:
+		if interval_start > cursor:
+			free.append((cursor, min(interval_start, end)))
+		cursor = max(cursor, interval_end)
+	if cursor < end:
+		free.append((cursor, end))
+	minimum = timedelta(minutes=min_minutes)
+	return [(gap_start, gap_end) for gap_start, gap_end in free if gap_end - gap_start >= minimum]
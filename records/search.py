@@ -0,0 +1,136 @@
+import re
+
+from django.db import connection, connections, router
+from django.db.models import Q
+
+from .models import HealthRecord, HealthRecordWithArchive
+
+FTS_TABLE = 'records_healthrecord_fts'
+ARCHIVE_FTS_TABLE = 'records_archivedhealthrecord_fts'
+SNIPPET_TOKENS = 12
+# bm25 column weights: a match in the diagnosis counts double one in the treatment.
+RANK_WEIGHTS = (2.0, 1.0)
+
+
+def _fts_sql(fts_table, content_table):
+	"""
+	External-content FTS5 index over diagnosis/treatment of ``content_table``.
+	The triggers keep it in sync for every write path, including bulk_create
+	and QuerySet.update(). Statements are idempotent so they can be re-applied
+	after migrations that rebuild the table (which drops its triggers).
+	"""
+	return [
+		f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+			diagnosis, treatment,
+			content='{content_table}', content_rowid='id',
+			tokenize='porter unicode61 remove_diacritics 2'
+		)""",
+		f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN
+			INSERT INTO {fts_table}(rowid, diagnosis, treatment) VALUES (new.id, new.diagnosis, new.treatment);
+		END""",
+		f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN
+			INSERT INTO {fts_table}({fts_table}, rowid, diagnosis, treatment)
+			VALUES ('delete', old.id, old.diagnosis, old.treatment);
+		END""",
+		f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF diagnosis, treatment ON {content_table} BEGIN
+			INSERT INTO {fts_table}({fts_table}, rowid, diagnosis, treatment)
+			VALUES ('delete', old.id, old.diagnosis, old.treatment);
+			INSERT INTO {fts_table}(rowid, diagnosis, treatment) VALUES (new.id, new.diagnosis, new.treatment);
+		END""",
+	]
+
+
+FTS_SQL = _fts_sql(FTS_TABLE, 'records_healthrecord')
+# Archived records get an index of their own, searched with ?include_archived=.
+ARCHIVE_FTS_SQL = _fts_sql(ARCHIVE_FTS_TABLE, 'records_archivedhealthrecord')
+
+
+def fts_supported(conn=None):
+	return (conn or connection).vendor == 'sqlite'
+
+
+def _install(conn, fts_table, statements, rebuild):
+	if not fts_supported(conn):
+		return
+	with conn.cursor() as cursor:
+		for statement in statements:
+			cursor.execute(statement)
+		if rebuild:
+			cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def _drop(conn, fts_table):
+	if not fts_supported(conn):
+		return
+	with conn.cursor() as cursor:
+		for suffix in ('ai', 'ad', 'au'):
+			cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+		cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+def install_fts_index(conn, rebuild=False):
+	"""Create the FTS5 table and sync triggers if missing; optionally re-index all rows."""
+	_install(conn, FTS_TABLE, FTS_SQL, rebuild)
+
+
+def install_archive_fts_index(conn, rebuild=False):
+	"""Same for the archived health records."""
+	_install(conn, ARCHIVE_FTS_TABLE, ARCHIVE_FTS_SQL, rebuild)
+
+
+def drop_fts_index(conn):
+	_drop(conn, FTS_TABLE)
+
+
+_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def build_match_expression(query):
+	"""
+	Translate user input into a safe FTS5 MATCH expression: quoted text is a
+	phrase, a trailing ``*`` makes a prefix query, and all terms must match.
+	FTS5 operators and punctuation in the input are treated as plain text.
+	"""
+	parts = []
+	for phrase, word in _TERM_RE.findall(query):
+		text, prefix = (phrase, False) if phrase else (word.rstrip('*'), word.endswith('*'))
+		tokens = re.findall(r'\w+', text)
+		if not tokens:
+			continue
+		parts.append('"{}"{}'.format(' '.join(tokens), '*' if prefix else ''))
+	return ' AND '.join(parts)
+
+
+def _match_sql(fts_table):
+	return f"""
+		SELECT rowid, bm25({fts_table}, {RANK_WEIGHTS[0]}, {RANK_WEIGHTS[1]}) AS rank,
+			snippet({fts_table}, -1, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet
+		FROM {fts_table}
+		WHERE {fts_table} MATCH %s
+	"""
+
+
+def search_health_records(query, limit, include_archived=False):
+	"""
+	Return ``[(health record id, rank, snippet)]`` for the best ``limit``
+	matches, best first. Lower ranks are better (FTS5 bm25). With
+	``include_archived`` archived records are searched too; each index ranks
+	against its own rows. On databases without FTS5 this falls back to an
+	unranked substring search.
+	"""
+	expression = build_match_expression(query)
+	if not expression:
+		return []
+	if not fts_supported():
+		text = query.replace('"', '').replace('*', '').strip()
+		model = HealthRecordWithArchive if include_archived else HealthRecord
+		ids = model.objects.filter(
+			Q(diagnosis__icontains=text) | Q(treatment__icontains=text)
+		).order_by('-record_date', '-id').values_list('id', flat=True)[:limit]
+		return [(pk, None, None) for pk in ids]
+
+	tables = [FTS_TABLE, ARCHIVE_FTS_TABLE] if include_archived else [FTS_TABLE]
+	sql = ' UNION ALL '.join(_match_sql(table) for table in tables) + ' ORDER BY rank LIMIT %s'
+	with connections[router.db_for_read(HealthRecord)].cursor() as cursor:
+		cursor.execute(sql, [expression] * len(tables) + [limit])
+		return cursor.fetchall()
@@ -0,0 +1,254 @@
+import contextlib
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Max
+
+from .caching import invalidate_tags, list_tag
+from .models import UserProfile, Patient, Doctor, Appointment, Prescription, HealthRecord
+from .search import drop_fts_index, fts_supported, install_fts_index
+from .stats import drop_stats_triggers, install_archive_stats_triggers, install_stats_triggers, rebuild_stats, stats_supported
+
+FIRST_NAMES = ['Ada', 'Ben', 'Chloe', 'David', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kemi', 'Liam', 'Maya', 'Noah', 'Olga', 'Priya']
+LAST_NAMES = ['Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ivanova', 'Jones', 'Kim', 'Lopez', 'Moreau', 'Nakamura', 'Okafor', 'Patel']
+SPECIALTIES = ['Cardiology', 'Dermatology', 'General Practice', 'Neurology', 'Oncology', 'Pediatrics', 'Psychiatry', 'Radiology']
+MEDICATIONS = ['Amoxicillin', 'Atorvastatin', 'Ibuprofen', 'Lisinopril', 'Metformin', 'Omeprazole', 'Salbutamol', 'Sertraline']
+DOSAGES = ['5mg', '10mg', '20mg', '50mg', '100mg', '250mg', '500mg']
+DIAGNOSES = [
+	'Seasonal influenza', 'Essential hypertension', 'Type 2 diabetes mellitus', 'Acute bronchitis', 'Migraine without aura',
+	'Iron deficiency anemia', 'Allergic rhinitis', 'Lower back pain', 'Generalized anxiety disorder', 'Asthma exacerbation',
+]
+TREATMENTS = [
+	'Rest and fluids', 'Lifestyle changes and follow-up in three months', 'Adjusted medication dosage', 'Physiotherapy twice weekly',
+	'Inhaler as needed', 'Dietary iron supplements', 'Referral to specialist', 'Cognitive behavioural therapy',
+]
+APPOINTMENT_STATUSES = ['scheduled'] * 3 + ['completed'] * 6 + ['cancelled']
+
+# Every generated timestamp is relative to this, so a seed always yields the same rows.
+EPOCH = datetime(2020, 1, 1, 8, tzinfo=timezone.utc)
+SLOT_MINUTES = 30
+# Values every database driver stores without conversion.
+_NATIVE_TYPES = (int, str, bool, float, type(None))
+
+
+def _pick(plan, name, rng):
+	return plan['first'][name] + rng.randrange(plan['counts'][name])
+
+
+def _patient(plan, rng, pk, index):
+	return {
+		'id': pk, 'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+		'date_of_birth': date(1930, 1, 1) + timedelta(days=rng.randrange(30000)),
+		'email': f'patient{pk}@example.com', 'phone': f'555-{rng.randrange(10000):04d}',
+	}
+
+
+def _doctor(plan, rng, pk, index):
+	return {
+		'id': pk, 'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+		'specialty': rng.choice(SPECIALTIES), 'email': f'doctor{pk}@example.com', 'phone': f'555-{rng.randrange(10000):04d}',
+	}
+
+
+def _user(plan, rng, pk, index):
+	# One login per seeded patient, then one per seeded doctor.
+	patients = plan['counts']['patients']
+	if index < patients:
+		role, number = 'patient', plan['first']['patients'] + index
+	else:
+		role, number = 'doctor', plan['first']['doctors'] + index - patients
+	return {
+		'id': pk, 'username': f'{role}-{number}', 'password': plan['password'], 'email': f'{role}{number}@example.com',
+		'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES), 'date_joined': EPOCH,
+	}
+
+
+def _profile(plan, rng, pk, index):
+	role = 'patient' if index < plan['counts']['patients'] else 'doctor'
+	return {'id': pk, 'user_id': plan['first']['users'] + index, 'role': role}
+
+
+def _appointment(plan, rng, pk, index):
+	# Each doctor's appointments are consecutive slots, so none overlap.
+	doctors = plan['counts']['doctors']
+	start = EPOCH + timedelta(minutes=SLOT_MINUTES * (index // doctors))
+	return {
+		'id': pk, 'patient_id': _pick(plan, 'patients', rng), 'doctor_id': plan['first']['doctors'] + index % doctors,
+		'appointment_datetime': start, 'duration_minutes': SLOT_MINUTES,
+		'end_datetime': start + timedelta(minutes=SLOT_MINUTES), 'status': rng.choice(APPOINTMENT_STATUSES),
+	}
+
+
+def _prescription(plan, rng, pk, index):
+	return {
+		'id': pk, 'appointment_id': _pick(plan, 'appointments', rng), 'medication': rng.choice(MEDICATIONS),
+		'dosage': rng.choice(DOSAGES), 'instructions': f'Take {rng.randint(1, 3)} times daily',
+	}
+
+
+def _health_record(plan, rng, pk, index):
+	return {
+		'id': pk, 'patient_id': _pick(plan, 'patients', rng),
+		'doctor_id': _pick(plan, 'doctors', rng) if rng.random() < 0.95 else None,
+		'record_date': (EPOCH + timedelta(days=rng.randrange(2000))).date(),
+		'diagnosis': rng.choice(DIAGNOSES), 'treatment': rng.choice(TREATMENTS),
+	}
+
+
+# In insert order, so foreign keys always point at rows already written.
+TABLES = {
+	'patients': (Patient, _patient),
+	'doctors': (Doctor, _doctor),
+	'users': (User, _user),
+	'profiles': (UserProfile, _profile),
+	'appointments': (Appointment, _appointment),
+	'prescriptions': (Prescription, _prescription),
+	'health_records': (HealthRecord, _health_record),
+}
+
+
+def _column_defaults(model):
+	"""Values for columns a builder leaves out: field defaults, and ``EPOCH`` for auto timestamps."""
+	defaults = []
+	for field in model._meta.concrete_fields:
+		if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+			defaults.append(EPOCH)
+		else:
+			defaults.append(field.get_default())
+	return defaults
+
+
+def generate_chunk(name, chunk, plan):
+	"""
+	Build rows ``chunk * chunk_size`` onward of table ``name`` as tuples of
+	database values. Each chunk draws from its own random stream derived
+	from the seed, so the output does not depend on how chunks are spread
+	over worker processes. Builders return plain dicts rather than model
+	instances, and only values the driver cannot store as-is (dates,
+	datetimes) go through the field's ``get_db_prep_save``: instantiating
+	and preparing models cost several times the insert itself.
+	"""
+	model, build = TABLES[name]
+	conn = connections[DEFAULT_DB_ALIAS]
+	rng = random.Random(f"{plan['seed']}:{name}:{chunk}")
+	# Timestamps and dates repeat a lot (e.g. updated_at), so each column
+	# converts every distinct value once.
+	columns = [
+		(field, default, {}) for field, default in zip(model._meta.concrete_fields, _column_defaults(model))]
+	start = chunk * plan['chunk_size']
+	rows = []
+	for index in range(start, min(plan['counts'][name], start + plan['chunk_size'])):
+		values = build(plan, rng, plan['first'][name] + index, index)
+		row = []
+		for field, default, prepared in columns:
+			value = values.get(field.attname, default)
+			if type(value) not in _NATIVE_TYPES:
+				if value not in prepared:
+					prepared[value] = field.get_db_prep_save(value, conn)
+				value = prepared[value]
+			row.append(value)
+		rows.append(tuple(row))
+	return name, rows
+
+
+def _init_worker():
+	# Needed under the 'spawn' start method; a no-op once apps are loaded.
+	django.setup()
+
+
+def _generated_chunks(tasks, pool, window):
+	"""Yield ``generate_chunk`` results in task order, with at most ``window`` chunks in flight."""
+	if pool is None:
+		for task in tasks:
+			yield generate_chunk(*task)
+		return
+	pending = deque()
+	for task in tasks:
+		pending.append(pool.submit(generate_chunk, *task))
+		if len(pending) >= window:
+			yield pending.popleft().result()
+	while pending:
+		yield pending.popleft().result()
+
+
+def _insert(cursor, model, rows):
+	quote = connection.ops.quote_name
+	columns = [field.column for field in model._meta.concrete_fields]
+	cursor.executemany(
+		f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(map(quote, columns))}) "
+		f"VALUES ({', '.join(['%s'] * len(columns))})", rows)
+
+
+def seed_dataset(patients=1000, doctors=20, appointments=10000, prescriptions=30000, health_records=10000,
+		users=False, password='pass123', seed=0, chunk_size=10000, workers=1, log=None):
+	"""
+	Add a synthetic, referentially consistent dataset with the given row
+	counts, plus a ``User`` and ``UserProfile`` per patient and doctor when
+	``users`` is set (``patient-<id>``/``doctor-<id>``, all sharing
+	``password``). The same ``seed`` and counts always produce the same rows
+	on an empty database, whatever the number of ``workers`` generating
+	them. Chunks are written with one batched INSERT each inside a single
+	transaction, so no model signals fire; the search index and summary
+	tables are rebuilt and cached list pages are evicted afterwards. Returns
+	the primary key range created for each table.
+	"""
+	counts = {
+		'patients': patients, 'doctors': doctors, 'users': (patients + doctors) if users else 0,
+		'appointments': appointments if patients and doctors else 0,
+		'prescriptions': prescriptions if patients and doctors and appointments else 0,
+		'health_records': health_records if patients and doctors else 0,
+	}
+	counts['profiles'] = counts['users']
+	plan = {
+		'seed': seed, 'chunk_size': chunk_size, 'counts': counts,
+		'first': {name: (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1 for name, (model, _) in TABLES.items()},
+		# Hashed once, with a salt from the seed: hashing per user would dominate
+		# the run, and a random salt would make runs differ.
+		'password': make_password(password, salt=f'phrseed{seed}') if users else '',
+	}
+	tasks = [
+		(name, chunk, plan) for name in TABLES
+		for chunk in range((counts[name] + chunk_size - 1) // chunk_size)
+	]
+	written = dict.fromkeys(TABLES, 0)
+
+	with contextlib.ExitStack() as stack:
+		pool = None
+		if workers > 1:
+			# Start the workers before the transaction opens, so none
+			# inherits an open connection.
+			connections.close_all()
+			pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers, initializer=_init_worker))
+			pool.submit(_init_worker).result()
+
+		with transaction.atomic():
+			# The FTS triggers index row by row; one rebuild at the end is faster.
+			reindex = counts['health_records'] and fts_supported(connection)
+			if reindex:
+				drop_fts_index(connection)
+			# Likewise the summary triggers upsert per row; rebuild once instead.
+			restat = (counts['appointments'] or counts['prescriptions']) and stats_supported(connection)
+			if restat:
+				drop_stats_triggers(connection)
+			with connection.cursor() as cursor:
+				for name, rows in _generated_chunks(tasks, pool, workers * 2):
+					_insert(cursor, TABLES[name][0], rows)
+					written[name] += len(rows)
+					if log:
+						log(f'{name}: {written[name]}/{counts[name]}')
+			if reindex:
+				install_fts_index(connection, rebuild=True)
+			if restat:
+				install_stats_triggers(connection)
+				install_archive_stats_triggers(connection)
+				rebuild_stats(chunk_size)
+			# No post_save signals fired, so evict cached list pages here.
+			invalidate_tags([list_tag(model) for model, _ in TABLES.values() if model is not User])
+
+	return {name: range(plan['first'][name], plan['first'][name] + counts[name]) for name in TABLES}
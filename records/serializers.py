@@ -1,42 +1,292 @@
 
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from rest_framework import serializers
-from .models import Patient, Doctor, Appointment, Prescription, HealthRecord
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import PreciseRefreshToken, check_not_revoked, stamp_issued_at
+from .instrumentation import timed
+from .models import UserProfile, Patient, Doctor, Appointment, Prescription, HealthRecord, DoctorDayStats, AuditEvent
+
+
+def _split_param(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets and opt-in nesting for model serializers.
+
+    Related objects are rendered as flat ``<name>_id`` keys unless the client
+    asks for them with ``?expand=patient,doctor``; dotted paths such as
+    ``?expand=appointment.patient`` expand through nested serializers.
+    ``?fields=id,status`` keeps only the listed top-level keys on reads.
+    The nested serializers are declared in ``Meta.expandable_fields``.
+    """
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if expand is None and request is not None:
+            expand = _split_param(request.query_params.get('expand'))
+            if request.method in SAFE_METHODS:
+                fields = _split_param(request.query_params.get('fields'))
+
+        expand = expand or []
+        for name, serializer_class in getattr(self.Meta, 'expandable_fields', {}).items():
+            if any(path == name or path.startswith(name + '.') for path in expand):
+                nested = [path[len(name) + 1:] for path in expand if path.startswith(name + '.')]
+                self.fields[name] = serializer_class(read_only=True, expand=nested)
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """List serializer reporting its rendering as the ``serialize`` phase."""
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
 
 
-class PatientSerializer(serializers.ModelSerializer):
+def optimize_queryset(queryset, serializer, extra_fields=()):
+    """
+    Narrow ``queryset`` to what ``serializer`` will render: join only the
+    expanded relations and load only the selected columns. ``extra_fields``
+    are columns needed besides the rendered ones (e.g. the ordering key).
+    """
+    related, columns = set(), set(extra_fields)
+    trim = _collect_query_plan(serializer, '', related, columns)
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    if trim:
+        queryset = queryset.only(*sorted(columns))
+    return queryset
+
+
+def _collect_query_plan(serializer, prefix, related, columns):
+    model = serializer.Meta.model
+    columns.add(prefix + model._meta.pk.name)
+    trim = True
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        try:
+            model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            # Properties and methods may read any column; load them all.
+            trim = False
+            continue
+        path = prefix + field.source
+        columns.add(path)
+        if isinstance(field, serializers.BaseSerializer):
+            related.add(path)
+            trim = _collect_query_plan(field, path + '__', related, columns) and trim
+    return trim
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that resolves ids from ``context['related_objects']``
+    (a ``{model: {pk: instance}}`` map) when the caller has preloaded them,
+    instead of issuing one SELECT per value. Falls back to the queryset.
+    """
+    def to_internal_value(self, data):
+        preloaded = self.context.get('related_objects', {}).get(self.queryset.model)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.queryset.model._meta.pk.to_python(data)
+        except ValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in preloaded:
+            self.fail('does_not_exist', pk_value=data)
+        return preloaded[pk]
+
+
+def preload_related_objects(serializer, items):
+    """
+    Fetch every object referenced by ``items`` through the serializer's
+    ``PreloadedPrimaryKeyRelatedField`` fields, one ``IN`` query per model.
+    """
+    ids = {}
+    for name, field in serializer.fields.items():
+        if isinstance(field, PreloadedPrimaryKeyRelatedField) and not field.read_only:
+            model = field.queryset.model
+            for item in items:
+                try:
+                    value = model._meta.pk.to_python(item.get(name))
+                except (AttributeError, ValidationError):
+                    continue
+                if value is not None:
+                    ids.setdefault(model, (field.queryset, set()))[1].add(value)
+    return {model: queryset.in_bulk(values) for model, (queryset, values) in ids.items()}
+
+
+class PatientSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Patient
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Doctor
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
 
-class AppointmentSerializer(serializers.ModelSerializer):
-    patient = PatientSerializer(read_only=True)
-    doctor = DoctorSerializer(read_only=True)
-    patient_id = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all(), source='patient', write_only=True)
-    doctor_id = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), source='doctor', write_only=True)
+class AppointmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    patient_id = PreloadedPrimaryKeyRelatedField(queryset=Patient.objects.all(), source='patient')
+    doctor_id = PreloadedPrimaryKeyRelatedField(queryset=Doctor.objects.all(), source='doctor')
 
     class Meta:
         model = Appointment
-        fields = ['id', 'patient', 'doctor', 'patient_id', 'doctor_id', 'appointment_datetime', 'status']
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'patient_id', 'doctor_id', 'appointment_datetime', 'duration_minutes', 'end_datetime', 'status', 'version', 'updated_at']
+        extra_kwargs = {'duration_minutes': {'min_value': 1}}
+        expandable_fields = {'patient': PatientSerializer, 'doctor': DoctorSerializer}
+
+    def validate(self, attrs):
+        start = attrs.get('appointment_datetime', getattr(self.instance, 'appointment_datetime', None))
+        duration = attrs.get('duration_minutes', getattr(
+            self.instance, 'duration_minutes', Appointment._meta.get_field('duration_minutes').default))
+        max_minutes = getattr(settings, 'PHR_MAX_APPOINTMENT_MINUTES', 480)
+        if duration > max_minutes:
+            raise serializers.ValidationError({'duration_minutes': [f'Ensure this value is less than or equal to {max_minutes}.']})
+        attrs['end_datetime'] = start + timedelta(minutes=duration)
+        return attrs
 
-class PrescriptionSerializer(serializers.ModelSerializer):
-    appointment = AppointmentSerializer(read_only=True)
-    appointment_id = serializers.PrimaryKeyRelatedField(queryset=Appointment.objects.all(), source='appointment', write_only=True)
+class PrescriptionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    appointment_id = PreloadedPrimaryKeyRelatedField(queryset=Appointment.objects.all(), source='appointment')
 
     class Meta:
         model = Prescription
-        fields = ['id', 'appointment', 'appointment_id', 'medication', 'dosage', 'instructions']
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'appointment_id', 'medication', 'dosage', 'instructions', 'version', 'updated_at']
+        expandable_fields = {'appointment': AppointmentSerializer}
 
-class HealthRecordSerializer(serializers.ModelSerializer):
-    patient = PatientSerializer(read_only=True)
-    doctor = DoctorSerializer(read_only=True)
-    patient_id = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all(), source='patient', write_only=True)
-    doctor_id = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), source='doctor', write_only=True, allow_null=True)
+class HealthRecordSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    patient_id = PreloadedPrimaryKeyRelatedField(queryset=Patient.objects.all(), source='patient')
+    doctor_id = PreloadedPrimaryKeyRelatedField(queryset=Doctor.objects.all(), source='doctor', allow_null=True)
 
     class Meta:
         model = HealthRecord
-        fields = ['id', 'patient', 'doctor', 'patient_id', 'doctor_id', 'record_date', 'diagnosis', 'treatment']
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'patient_id', 'doctor_id', 'record_date', 'diagnosis', 'treatment', 'version', 'updated_at']
+        expandable_fields = {'patient': PatientSerializer, 'doctor': DoctorSerializer}
+
+
+class DoctorDayStatsSerializer(serializers.ModelSerializer):
+    doctor_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = DoctorDayStats
+        list_serializer_class = TimedListSerializer
+        fields = ['doctor_id', 'day', 'total', 'scheduled', 'completed', 'cancelled']
+
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditEvent
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'user_id', 'role', 'action', 'model', 'object_id', 'timestamp']
+
+
+class TopMedicationsQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    """Query parameters for a doctor's free-slot search."""
+    duration = serializers.IntegerField(min_value=1, default=30)
+
+    def get_fields(self):
+        # 'from' is a Python keyword, so these cannot be declared as attributes.
+        fields = super().get_fields()
+        fields['from'] = serializers.DateTimeField()
+        fields['to'] = serializers.DateTimeField()
+        return fields
+
+    def validate(self, attrs):
+        if attrs['to'] <= attrs['from']:
+            raise serializers.ValidationError({'to': ['Must be after from.']})
+        if attrs['to'] - attrs['from'] > timedelta(days=getattr(settings, 'PHR_MAX_AVAILABILITY_DAYS', 31)):
+            raise serializers.ValidationError({'to': ['Range is too long.']})
+        return attrs
+
+
+class UserProvisionSerializer(serializers.Serializer):
+    """
+    One user of a bulk provisioning batch (records/provisioning.py). Users are
+    matched by username; a password is only required for new users, and an
+    empty role leaves the user without one (e.g. for staff accounts).
+    """
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    password = serializers.CharField(required=False, write_only=True, trim_whitespace=False)
+    email = serializers.EmailField(required=False, allow_blank=True)
+    first_name = serializers.CharField(required=False, allow_blank=True, max_length=150)
+    last_name = serializers.CharField(required=False, allow_blank=True, max_length=150)
+    role = serializers.ChoiceField(choices=UserProfile.ROLE_CHOICES, allow_blank=True, required=False)
+    is_staff = serializers.BooleanField(required=False)
+
+
+def set_user_claims(token, user):
+    """Write ``user``'s current role, username and staff flag into ``token``."""
+    profile = getattr(user, 'profile', None)
+    token['role'] = getattr(profile, 'role', '')
+    token['username'] = user.get_username()
+    token['is_staff'] = user.is_staff
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Adds the user's role and staff flag to the token claims, next to the user id."""
+    token_class = PreciseRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        set_user_claims(token, user)
+        return token
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refuses to refresh revoked tokens and tokens of inactive or deleted
+    users. The new access token is issued now, with the user's current role
+    and staff flag rather than the claims of the refresh token.
+    """
+    token_class = PreciseRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        check_not_revoked(refresh, fresh=True)
+        user = User.objects.select_related('profile').filter(
+            **{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        access = refresh.access_token
+        set_user_claims(access, user)
+        data = {'access': str(access)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            stamp_issued_at(refresh)
+            set_user_claims(refresh, user)
+            data['refresh'] = str(refresh)
+        return data
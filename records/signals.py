@@ -1,7 +1,18 @@
-from django.db.models.signals import post_save
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_migrate, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from django.utils import timezone
+from .archive import drop_union_views, install_union_views
+from .authentication import revocations
+from .caching import invalidate_instances
+from .instrumentation import install_query_recorder
+from .models import UserProfile, Patient, Doctor, Appointment, Prescription, HealthRecord
+from .search import install_archive_fts_index, install_fts_index
+from .stats import install_archive_stats_triggers, install_stats_triggers
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -11,5 +22,90 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+    # Only a profile already loaded through user.profile can have been changed
+    # (hasattr() would fetch it), and only a changed one needs writing.
+    profile = User.profile.related.get_cached_value(instance, None)
+    if profile is not None and profile.has_changed():
+        profile.save()
+
+@receiver(pre_save, sender=UserProfile)
+def revoke_tokens_on_role_change(sender, instance, **kwargs):
+    # Tokens carry the role as a claim, so reject the ones issued under the old role.
+    if instance.pk is None:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if 'role' in loaded:
+        previous = loaded['role']
+    else:
+        previous = UserProfile.objects.filter(pk=instance.pk).values_list('role', flat=True).first()
+    if previous is not None and previous != instance.role:
+        revocations.revoke_user(instance.user_id)
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_deactivation(sender, instance, **kwargs):
+    if not instance.is_active:
+        revocations.revoke_user(instance.pk)
+
+@receiver(pre_delete, sender=Doctor)
+def touch_doctor_health_records(sender, instance, **kwargs):
+    # on_delete=SET_NULL rewrites doctor_id with a plain UPDATE, so bump the
+    # affected rows' versions to change their ETags.
+    HealthRecord.objects.filter(doctor=instance).update(version=F('version') + 1, updated_at=timezone.now())
+
+@receiver(post_migrate)
+def ensure_fts_index(sender, using, **kwargs):
+    # SQLite rebuilds a table to alter it, which drops its triggers; put the
+    # health record search triggers back once their index migrations are applied.
+    if sender.name != 'records':
+        return
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ('records', '0005_healthrecord_fts') in applied:
+        install_fts_index(connection)
+    if ('records', '0012_archivedhealthrecord_fts') in applied:
+        install_archive_fts_index(connection)
+
+@receiver(post_migrate)
+def ensure_stats_triggers(sender, using, **kwargs):
+    # Same for the triggers maintaining the summary tables.
+    if sender.name != 'records':
+        return
+    connection = connections[using]
+    if ('records', '0008_summary_stats') in MigrationRecorder(connection).applied_migrations():
+        install_stats_triggers(connection)
+
+@receiver(pre_migrate)
+def drop_archive_views(sender, using, **kwargs):
+    # SQLite refuses to rename a rebuilt table back while a view references
+    # it, so take the union views down for the migration run; the receiver
+    # below puts them back.
+    if sender.name != 'records':
+        return
+    drop_union_views(connections[using])
+
+@receiver(post_migrate)
+def ensure_archive_views(sender, using, **kwargs):
+    # And for the archive tables' triggers; the union views are recreated
+    # so they pick up columns added to the hot tables since.
+    if sender.name != 'records':
+        return
+    connection = connections[using]
+    if ('records', '0011_archive') in MigrationRecorder(connection).applied_migrations():
+        install_archive_stats_triggers(connection)
+        install_union_views(connection)
+
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    # Count and time queries of sampled requests on every new connection.
+    install_query_recorder(connection)
+
+def evict_cached_responses(sender, instance, **kwargs):
+    # Drops cached list pages of the model and every cached response that
+    # renders or references this object, e.g. a patient's detail and the
+    # appointment pages that embed it. Bulk writes call invalidate_instances
+    # themselves since they bypass these signals.
+    invalidate_instances(sender, [instance.pk])
+
+for model in (Patient, Doctor, Appointment, Prescription, HealthRecord):
+    post_save.connect(evict_cached_responses, sender=model, dispatch_uid=f'evict_cached_{model.__name__}_save')
+    post_delete.connect(evict_cached_responses, sender=model, dispatch_uid=f'evict_cached_{model.__name__}_delete')
@@ -0,0 +1,219 @@
+from datetime import timezone
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+from .models import (
+	Appointment, Prescription, ArchivedAppointment, ArchivedPrescription, DoctorDayStats, AppointmentStatusStats,
+	MedicationStats,
+)
+
+STATUSES = [status for status, _ in Appointment.STATUS_CHOICES]
+DAILY_TABLE = DoctorDayStats._meta.db_table
+STATUS_TABLE = AppointmentStatusStats._meta.db_table
+MEDICATION_TABLE = MedicationStats._meta.db_table
+TRIGGER_PREFIX = 'records_stats'
+TRIGGER_SUFFIXES = ('appointment_ai', 'appointment_ad', 'appointment_au', 'prescription_ai', 'prescription_ad', 'prescription_au')
+ARCHIVE_TRIGGER_SUFFIXES = ('archivedappointment_ai', 'archivedappointment_ad', 'archivedprescription_ai', 'archivedprescription_ad')
+
+
+def _count_appointment(row, sign):
+	"""Statements adding ``sign`` (1 or -1) appointments ``row`` ('new' or 'old') to the summaries."""
+	day = f'date({row}.appointment_datetime)'
+	flags = ', '.join(f"{sign} * ({row}.status = '{status}')" for status in STATUSES)
+	updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in ['total', *STATUSES])
+	return f"""
+		INSERT INTO {DAILY_TABLE} (doctor_id, day, total, {', '.join(STATUSES)})
+		VALUES ({row}.doctor_id, {day}, {sign}, {flags})
+		ON CONFLICT (doctor_id, day) DO UPDATE SET {updates};
+		DELETE FROM {DAILY_TABLE} WHERE doctor_id = {row}.doctor_id AND day = {day} AND total = 0;
+		INSERT INTO {STATUS_TABLE} (status, appointments) VALUES ({row}.status, {sign})
+		ON CONFLICT (status) DO UPDATE SET appointments = appointments + excluded.appointments;
+	"""
+
+
+def _count_prescription(row, sign):
+	return f"""
+		INSERT INTO {MEDICATION_TABLE} (medication, prescriptions) VALUES ({row}.medication, {sign})
+		ON CONFLICT (medication) DO UPDATE SET prescriptions = prescriptions + excluded.prescriptions;
+		DELETE FROM {MEDICATION_TABLE} WHERE medication = {row}.medication AND prescriptions = 0;
+	"""
+
+
+# Like the search index triggers, these keep the summaries in step with
+# every write path (save, delete and its cascades, bulk_create, bulk_update,
+# QuerySet.update() and raw SQL) in the writing transaction, at a few indexed
+# upserts per row. Statements are idempotent so they can be re-applied after
+# migrations that rebuild the source tables.
+STATS_SQL = [
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_appointment_ai AFTER INSERT ON records_appointment BEGIN
+		{_count_appointment('new', 1)}
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_appointment_ad AFTER DELETE ON records_appointment BEGIN
+		{_count_appointment('old', -1)}
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_appointment_au
+		AFTER UPDATE OF doctor_id, appointment_datetime, status ON records_appointment
+		WHEN old.doctor_id IS NOT new.doctor_id OR old.status IS NOT new.status
+			OR date(old.appointment_datetime) IS NOT date(new.appointment_datetime)
+		BEGIN
+		{_count_appointment('old', -1)}
+		{_count_appointment('new', 1)}
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_prescription_ai AFTER INSERT ON records_prescription BEGIN
+		{_count_prescription('new', 1)}
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_prescription_ad AFTER DELETE ON records_prescription BEGIN
+		{_count_prescription('old', -1)}
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_prescription_au AFTER UPDATE OF medication ON records_prescription
+		WHEN old.medication IS NOT new.medication
+		BEGIN
+		{_count_prescription('old', -1)}
+		{_count_prescription('new', 1)}
+	END""",
+]
+
+
+# Archived rows keep counting: records/archive.py moves a row by inserting it
+# into its archive table (+1) and deleting it from the hot one (-1), which
+# leaves the summaries unchanged. Archived rows are never updated.
+ARCHIVE_STATS_SQL = [
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_archivedappointment_ai AFTER INSERT ON records_archivedappointment BEGIN
+		{_count_appointment('new', 1)}
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_archivedappointment_ad AFTER DELETE ON records_archivedappointment BEGIN
+		{_count_appointment('old', -1)}
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_archivedprescription_ai AFTER INSERT ON records_archivedprescription BEGIN
+		{_count_prescription('new', 1)}
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_archivedprescription_ad AFTER DELETE ON records_archivedprescription BEGIN
+		{_count_prescription('old', -1)}
+	END""",
+]
+
+
+def stats_supported(conn=None):
+	return (conn or connection).vendor == 'sqlite'
+
+
+def install_stats_triggers(conn):
+	"""Create the summary maintenance triggers if missing. Other databases rely on ``rebuild_stats``."""
+	if not stats_supported(conn):
+		return
+	with conn.cursor() as cursor:
+		for statement in STATS_SQL:
+			cursor.execute(statement)
+
+
+def install_archive_stats_triggers(conn):
+	"""Create the triggers counting archived rows in the summaries, once the archive tables exist."""
+	if not stats_supported(conn):
+		return
+	with conn.cursor() as cursor:
+		for statement in ARCHIVE_STATS_SQL:
+			cursor.execute(statement)
+
+
+def drop_stats_triggers(conn):
+	if not stats_supported(conn):
+		return
+	with conn.cursor() as cursor:
+		for suffix in TRIGGER_SUFFIXES + ARCHIVE_TRIGGER_SUFFIXES:
+			cursor.execute(f'DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_{suffix}')
+
+
+def _appointment_days(queryset):
+	return queryset.annotate(day=TruncDate('appointment_datetime', tzinfo=timezone.utc))
+
+
+def _chunks(queryset, chunk_size):
+	"""Consecutive primary key slices of ``queryset`` with up to ``chunk_size`` rows each."""
+	last = 0
+	while True:
+		bounds = list(queryset.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[chunk_size - 1:chunk_size])
+		if not bounds:
+			yield queryset.filter(pk__gt=last)
+			return
+		yield queryset.filter(pk__gt=last, pk__lte=bounds[0])
+		last = bounds[0]
+
+
+def rebuild_stats(chunk_size=10000, log=None):
+	"""
+	Recompute every summary table from scratch: appointments and
+	prescriptions, hot and archived, are aggregated one primary key chunk at
+	a time, so memory grows with the summaries, not the source tables. Runs in one transaction
+	so concurrent writes wait rather than being counted twice or lost.
+	"""
+	daily, statuses, medications = {}, dict.fromkeys(STATUSES, 0), {}
+	with transaction.atomic():
+		for name, model in (('appointments', Appointment), ('archived appointments', ArchivedAppointment)):
+			for index, chunk in enumerate(_chunks(model.objects.all(), chunk_size)):
+				rows = _appointment_days(chunk).values('doctor_id', 'day', 'status').annotate(appointments=Count('pk')).order_by()
+				for row in rows:
+					counts = daily.setdefault((row['doctor_id'], row['day']), dict.fromkeys(['total', *STATUSES], 0))
+					counts['total'] += row['appointments']
+					counts[row['status']] = counts.get(row['status'], 0) + row['appointments']
+					statuses[row['status']] = statuses.get(row['status'], 0) + row['appointments']
+				if log:
+					log(f'{name}: chunk {index + 1}')
+		for name, model in (('prescriptions', Prescription), ('archived prescriptions', ArchivedPrescription)):
+			for index, chunk in enumerate(_chunks(model.objects.all(), chunk_size)):
+				for row in chunk.values('medication').annotate(prescriptions=Count('pk')).order_by():
+					medications[row['medication']] = medications.get(row['medication'], 0) + row['prescriptions']
+				if log:
+					log(f'{name}: chunk {index + 1}')
+
+		for model in (DoctorDayStats, AppointmentStatusStats, MedicationStats):
+			model.objects.all().delete()
+		DoctorDayStats.objects.bulk_create(
+			[DoctorDayStats(doctor_id=doctor_id, day=day, **{
+				column: count for column, count in counts.items() if column in ('total', *STATUSES)})
+				for (doctor_id, day), counts in daily.items()],
+			batch_size=chunk_size)
+		AppointmentStatusStats.objects.bulk_create(
+			[AppointmentStatusStats(status=status, appointments=count) for status, count in statuses.items()])
+		MedicationStats.objects.bulk_create(
+			[MedicationStats(medication=medication, prescriptions=count) for medication, count in medications.items()],
+			batch_size=chunk_size)
+	return {'doctor_days': len(daily), 'statuses': len(statuses), 'medications': len(medications)}
+
+
+def stats_differences(limit=20):
+	"""
+	Compare the summary tables with a full ``GROUP BY`` over the source
+	tables, hot and archived, and describe up to ``limit`` mismatches (empty
+	when consistent).
+	"""
+	expected, actual = {}, {}
+	for model in (Appointment, ArchivedAppointment):
+		daily = _appointment_days(model.objects.all()).values('doctor_id', 'day').annotate(
+			total=Count('pk'), **{status: Count('pk', filter=Q(status=status)) for status in STATUSES}).order_by()
+		for row in daily:
+			key = ('doctor_day', row.pop('doctor_id'), row.pop('day'))
+			expected[key] = {column: count + expected.get(key, {}).get(column, 0) for column, count in row.items()}
+	for row in DoctorDayStats.objects.values('doctor_id', 'day', 'total', *STATUSES):
+		actual[('doctor_day', row.pop('doctor_id'), row.pop('day'))] = row
+	for model in (Appointment, ArchivedAppointment):
+		for row in model.objects.values('status').annotate(appointments=Count('pk')).order_by():
+			expected[('status', row['status'])] = expected.get(('status', row['status']), 0) + row['appointments']
+	for status, count in AppointmentStatusStats.objects.values_list('status', 'appointments'):
+		# Statuses nobody has any more keep a zero row.
+		if count:
+			actual[('status', status)] = count
+	for model in (Prescription, ArchivedPrescription):
+		for row in model.objects.values('medication').annotate(prescriptions=Count('pk')).order_by():
+			expected[('medication', row['medication'])] = expected.get(('medication', row['medication']), 0) + row['prescriptions']
+	for medication, count in MedicationStats.objects.values_list('medication', 'prescriptions'):
+		actual[('medication', medication)] = count
+
+	differences = []
+	for key in sorted(expected.keys() | actual.keys(), key=str):
+		if expected.get(key) != actual.get(key):
+			differences.append(f"{' '.join(map(str, key))}: expected {expected.get(key)}, found {actual.get(key)}")
+			if len(differences) >= limit:
+				break
+	return differences
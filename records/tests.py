@@ -1,10 +1,52 @@
 
 
-from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+import csv
+import io
+import json
+import queue
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from rest_framework import status
 from django.contrib.auth.models import User
-from .models import Patient, Doctor, Appointment, Prescription, HealthRecord, UserProfile
+from . import routing, urls, views
+from .archive import archive_records
+from .async_views import AsyncReadView
+from .audit import AuditLog, audit_log
+from .caching import get_cached, set_cached
+from .idempotency import purge_expired_keys
+from .authentication import RevocationList, revocations
+from .conditional import PreconditionFailed
+from .instrumentation import InstrumentationMiddleware, LatencyHistogram
+from .models import (
+	Patient, Doctor, Appointment, Prescription, HealthRecord, UserProfile, DoctorDayStats, MedicationStats, AuditEvent,
+	IdempotencyKey, ArchivedAppointment, ArchivedPrescription, ArchivedHealthRecord, TokenRevocation
+)
+from .fastpath import ValuesReader
+from .pagination import KeysetPagination
+from .routing import ReplicaRouter, ReplicaRoutingMiddleware
+from .scheduling import lock_doctors
+from .seeding import seed_dataset
+from .stats import stats_differences
+from .serializers import AppointmentSerializer, HealthRecordSerializer
 
 
 class AuthRoleTestCase(APITestCase):
@@ -320,3 +362,2027 @@ class HealthRecordAPITestCase(APITestCase):
 		url = reverse('healthrecord-detail', args=[self.healthrecord.id])
 		response = self.client.delete(url)
 		self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class KeysetPaginationTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient5', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_token("patient5", "pass123")}')
+		self.patient = Patient.objects.create(
+			first_name='Kim', last_name='Park', date_of_birth='1992-05-05', email='kim@example.com', phone='1112223333')
+		self.doctor = Doctor.objects.create(
+			first_name='Lee', last_name='Chan', specialty='General', email='lee@example.com', phone='2223334444')
+		# Several appointments share a timestamp so the id tie-breaker matters.
+		for hour in (9, 9, 9, 10, 8, 11, 9):
+			Appointment.objects.create(
+				patient=self.patient, doctor=self.doctor,
+				appointment_datetime=f'2025-10-01T{hour:02d}:00:00Z', status='scheduled')
+		self.expected_ids = list(
+			Appointment.objects.order_by('appointment_datetime', 'id').values_list('id', flat=True))
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def test_walk_forward_and_back(self):
+		url = reverse('appointment-list-create') + '?page_size=2'
+		seen, pages = [], []
+		while url:
+			response = self.client.get(url)
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			pages.append(response.data)
+			seen.extend(item['id'] for item in response.data['results'])
+			url = response.data['next']
+		self.assertEqual(seen, self.expected_ids)
+		self.assertIsNone(pages[0]['previous'])
+
+		response = self.client.get(pages[-1]['previous'])
+		self.assertEqual(
+			[item['id'] for item in response.data['results']],
+			[item['id'] for item in pages[-2]['results']])
+
+	def test_page_size_is_capped(self):
+		url = reverse('appointment-list-create')
+		with mock.patch.object(KeysetPagination, 'max_page_size', 3):
+			response = self.client.get(url, {'page_size': 100})
+		self.assertEqual(len(response.data['results']), 3)
+
+	def test_no_count_query(self):
+		with CaptureQueriesContext(connection) as ctx:
+			self.client.get(reverse('appointment-list-create'), {'page_size': 2})
+		self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+
+	def test_invalid_cursor(self):
+		response = self.client.get(reverse('appointment-list-create'), {'cursor': 'not-a-cursor'})
+		self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class QueryBudgetMixin:
+	"""
+	Assert that an endpoint's query count does not grow with the number of rows.
+
+	``add_rows`` is called before each measurement to grow the dataset; the
+	query count of every request must match the first one and, when given,
+	stay within ``max_queries``.
+	"""
+	def assertConstantQueries(self, client, url, add_rows, rounds=3, max_queries=None):
+		counts = []
+		for _ in range(rounds):
+			add_rows()
+			with CaptureQueriesContext(connection) as ctx:
+				response = client.get(url)
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			counts.append(len(ctx.captured_queries))
+		self.assertEqual(
+			len(set(counts)), 1,
+			f'{url} query count grows with rows: {counts}\n' +
+			'\n'.join(q['sql'] for q in ctx.captured_queries))
+		if max_queries is not None:
+			self.assertLessEqual(counts[0], max_queries, f'{url} exceeded its query budget')
+
+
+class ListQueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+	def setUp(self):
+		self.doctor_user = User.objects.create_user(username='doctor6', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.patient_user = User.objects.create_user(username='patient6', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.doctor_client = self._auth_client(self._get_token('doctor6', 'pass123'))
+		self.patient_client = self._auth_client(self._get_token('patient6', 'pass123'))
+		self.counter = 0
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _auth_client(self, token):
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _add_rows(self, count=3):
+		for _ in range(count):
+			self.counter += 1
+			n = self.counter
+			patient = Patient.objects.create(
+				first_name='P', last_name=str(n), date_of_birth='1990-01-01', email=f'p{n}@example.com')
+			doctor = Doctor.objects.create(
+				first_name='D', last_name=str(n), specialty='General', email=f'd{n}@example.com')
+			appointment = Appointment.objects.create(
+				patient=patient, doctor=doctor, appointment_datetime='2025-10-01T10:00:00Z')
+			Prescription.objects.create(appointment=appointment, medication='Ibuprofen', dosage='200mg')
+			HealthRecord.objects.create(patient=patient, doctor=doctor, record_date='2025-09-01', diagnosis='Flu')
+
+	# Authentication reads the role from the token claims, so the page is the only query.
+	def test_patient_list(self):
+		self.assertConstantQueries(self.patient_client, reverse('patient-list-create'), self._add_rows, max_queries=1)
+
+	def test_doctor_list(self):
+		self.assertConstantQueries(self.doctor_client, reverse('doctor-list-create'), self._add_rows, max_queries=1)
+
+	def test_appointment_list(self):
+		url = reverse('appointment-list-create') + '?expand=patient,doctor'
+		self.assertConstantQueries(self.patient_client, url, self._add_rows, max_queries=1)
+
+	def test_prescription_list(self):
+		url = reverse('prescription-list-create') + '?expand=appointment.patient,appointment.doctor'
+		self.assertConstantQueries(self.doctor_client, url, self._add_rows, max_queries=1)
+
+	def test_healthrecord_list(self):
+		url = reverse('healthrecord-list-create') + '?expand=patient,doctor'
+		self.assertConstantQueries(self.doctor_client, url, self._add_rows, max_queries=1)
+
+
+class SparseFieldsTestCase(APITestCase):
+	def setUp(self):
+		self.doctor_user = User.objects.create_user(username='doctor7', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_token("doctor7", "pass123")}')
+		self.patient = Patient.objects.create(
+			first_name='Ray', last_name='Stone', date_of_birth='1970-07-07', email='ray@example.com', phone='1231231234')
+		self.doctor = Doctor.objects.create(
+			first_name='Ida', last_name='Wells', specialty='Oncology', email='ida@example.com', phone='3213214321')
+		self.appointment = Appointment.objects.create(
+			patient=self.patient, doctor=self.doctor, appointment_datetime='2025-10-05T09:00:00Z', status='scheduled')
+		self.prescription = Prescription.objects.create(
+			appointment=self.appointment, medication='Aspirin', dosage='81mg', instructions='Daily')
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _page_query(self, url, **params):
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url, params)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		return response, ctx.captured_queries[-1]['sql']
+
+	def test_flat_by_default(self):
+		response, sql = self._page_query(reverse('prescription-list-create'))
+		item = response.data['results'][0]
+		self.assertEqual(item['appointment_id'], self.appointment.id)
+		self.assertNotIn('appointment', item)
+		self.assertNotIn('JOIN', sql)
+
+	def test_expand_nested_path(self):
+		response, sql = self._page_query(reverse('prescription-list-create'), expand='appointment.doctor')
+		appointment = response.data['results'][0]['appointment']
+		self.assertEqual(appointment['doctor']['email'], self.doctor.email)
+		self.assertEqual(appointment['patient_id'], self.patient.id)
+		self.assertNotIn('patient', appointment)
+		self.assertEqual(sql.count('JOIN'), 2)
+
+	def test_fields_selects_columns(self):
+		response, sql = self._page_query(reverse('prescription-list-create'), fields='id,medication')
+		self.assertEqual(response.data['results'][0], {'id': self.prescription.id, 'medication': 'Aspirin'})
+		self.assertNotIn('"instructions"', sql)
+		self.assertNotIn('"dosage"', sql)
+
+	def test_fields_ignored_on_write(self):
+		url = reverse('prescription-list-create') + '?fields=id'
+		data = {'appointment_id': self.appointment.id, 'medication': 'Paracetamol', 'dosage': '500mg'}
+		response = self.client.post(url, data)
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(response.data['medication'], 'Paracetamol')
+
+
+class FastListParityTestCase(APITestCase):
+	def setUp(self):
+		self.doctor_user = User.objects.create_user(username='doctor8', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.patient_user = User.objects.create_user(username='patient8', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.doctor_client = self._auth_client(self._get_token('doctor8', 'pass123'))
+		self.patient_client = self._auth_client(self._get_token('patient8', 'pass123'))
+		patients = [
+			Patient.objects.create(
+				first_name=f'Pat{i}', last_name='Q', date_of_birth='1985-01-0%d' % (i + 1), email=f'pat{i}@example.com')
+			for i in range(2)
+		]
+		doctor = Doctor.objects.create(first_name='Doc', last_name='Z', email='docz@example.com')
+		for i in range(4):
+			Appointment.objects.create(
+				patient=patients[i % 2], doctor=doctor,
+				appointment_datetime=f'2025-10-0{i + 1}T10:15:30.123456Z', status='completed')
+			HealthRecord.objects.create(
+				patient=patients[i % 2], doctor=doctor if i % 2 else None,
+				record_date=f'2025-09-0{i + 1}', diagnosis=f'Diagnosis {i}', treatment='')
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _auth_client(self, token):
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _assert_parity(self, serializer_class, queryset, **kwargs):
+		expected = JSONRenderer().render(serializer_class(queryset, many=True, **kwargs).data)
+		reader = ValuesReader.for_serializer(serializer_class(**kwargs))
+		actual = JSONRenderer().render(reader.render(reader.values(queryset)))
+		self.assertEqual(actual, expected)
+
+	def test_appointment_serializer_parity(self):
+		queryset = Appointment.objects.order_by('id')
+		for kwargs in ({}, {'expand': ['patient']}, {'expand': ['patient', 'doctor']}, {'fields': ['id', 'status']}):
+			self._assert_parity(AppointmentSerializer, queryset, **kwargs)
+
+	def test_healthrecord_serializer_parity(self):
+		queryset = HealthRecord.objects.order_by('id')
+		for kwargs in ({}, {'expand': ['doctor']}, {'expand': ['patient', 'doctor']}):
+			self._assert_parity(HealthRecordSerializer, queryset, **kwargs)
+
+	def test_nested_objects_are_shared(self):
+		reader = ValuesReader.for_serializer(AppointmentSerializer(expand=['patient']))
+		rows = reader.render(reader.values(Appointment.objects.order_by('id')))
+		self.assertIs(rows[0]['patient'], rows[2]['patient'])
+
+	def test_endpoints_byte_identical(self):
+		cases = [
+			(self.patient_client, reverse('appointment-list-create') + '?expand=patient,doctor&page_size=3'),
+			(self.doctor_client, reverse('healthrecord-list-create') + '?expand=patient,doctor&page_size=3'),
+		]
+		for client, url in cases:
+			slow = client.get(url)
+			with self.settings(PHR_FAST_LIST_SERIALIZATION=True):
+				fast = client.get(url)
+				next_fast = client.get(fast.data['next'])
+			self.assertEqual(fast.status_code, status.HTTP_200_OK)
+			self.assertEqual(fast.content, slow.content)
+			self.assertEqual(next_fast.content, client.get(slow.data['next']).content)
+
+
+class MultiGetTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient22', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.doctor_user = User.objects.create_user(username='doctor19', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.patient_client = self._client('patient22')
+		self.doctor_client = self._client('doctor19')
+		self.patient = Patient.objects.create(
+			first_name='Multi', last_name='Get', date_of_birth='1980-01-01', email='multiget@example.com')
+		self.doctor = Doctor.objects.create(first_name='Multi', last_name='Doc', email='multidoc@example.com')
+		self.appointments = [
+			Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_datetime=f'2025-12-0{day}T10:00:00Z')
+			for day in range(1, 6)
+		]
+
+	def _client(self, username):
+		token = APIClient().post(reverse('token_obtain_pair'), {'username': username, 'password': 'pass123'}).data['access']
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _ids(self, *objects):
+		return ','.join(str(getattr(obj, 'pk', obj)) for obj in objects)
+
+	def test_order_missing_and_constant_queries(self):
+		a1, a2, a3, a4, a5 = self.appointments
+		url = reverse('appointment-list-create')
+		with CaptureQueriesContext(connection) as queries:
+			response = self.patient_client.get(url, {'ids': self._ids(a3, 99999, a1, a3), 'expand': 'patient,doctor'})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual([item['id'] for item in response.data['results']], [a3.pk, a1.pk])
+		self.assertEqual(response.data['results'][0]['patient']['email'], 'multiget@example.com')
+		self.assertEqual(response.data['missing'], [99999])
+		self.assertEqual(len(queries), 1)
+
+		with CaptureQueriesContext(connection) as queries:
+			response = self.patient_client.get(url, {'ids': self._ids(a5, a4, a3, a2, a1), 'expand': 'patient,doctor'})
+		self.assertEqual(len(queries), 1)
+		# Other filters apply; excluded ids are reported missing.
+		Appointment.objects.filter(pk=a2.pk).update(status='cancelled')
+		response = self.patient_client.get(url, {'ids': self._ids(a2, a1), 'status': 'scheduled'})
+		self.assertEqual(response.data['missing'], [a2.pk])
+
+		with self.settings(PHR_MULTI_GET_BATCH_SIZE=2), CaptureQueriesContext(connection) as queries:
+			response = self.patient_client.get(url, {'ids': self._ids(a5, a4, a3, a2, a1), 'page_size': 1})
+		self.assertEqual([item['id'] for item in response.data['results']], [a5.pk, a4.pk, a3.pk, a2.pk, a1.pk])
+		self.assertEqual(len(queries), 3)
+
+	def test_every_resource(self):
+		prescription = Prescription.objects.create(appointment=self.appointments[0], medication='Ibuprofen', dosage='5mg')
+		record = HealthRecord.objects.create(patient=self.patient, doctor=self.doctor, record_date='2025-01-01', diagnosis='Flu')
+		cases = [
+			('patient-list-create', self.patient_client, self.patient),
+			('doctor-list-create', self.doctor_client, self.doctor),
+			('appointment-list-create', self.patient_client, self.appointments[1]),
+			('prescription-list-create', self.doctor_client, prescription),
+			('healthrecord-list-create', self.doctor_client, record),
+		]
+		for name, client, obj in cases:
+			response = client.get(reverse(name), {'ids': self._ids(obj, 424242)})
+			self.assertEqual(response.status_code, status.HTTP_200_OK, name)
+			self.assertEqual([item['id'] for item in response.data['results']], [obj.pk], name)
+			self.assertEqual(response.data['missing'], [424242], name)
+
+	def test_validation_and_permissions(self):
+		url = reverse('patient-list-create')
+		self.assertEqual(self.patient_client.get(url, {'ids': '1,x'}).status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self.patient_client.get(url, {'ids': ''}).status_code, status.HTTP_400_BAD_REQUEST)
+		with self.settings(PHR_MAX_MULTI_GET_IDS=2):
+			self.assertEqual(self.patient_client.get(url, {'ids': '1,2,3'}).status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self.doctor_client.get(url, {'ids': self._ids(self.patient)}).status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_conditional_and_cached(self):
+		url = reverse('appointment-list-create')
+		params = {'ids': self._ids(*self.appointments[:3])}
+		first = self.patient_client.get(url, params)
+		self.assertEqual(first['X-Cache'], 'MISS')
+		response = self.patient_client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+		self.assertEqual(self.patient_client.get(url, params)['X-Cache'], 'HIT')
+
+		self.appointments[1].status = 'completed'
+		self.appointments[1].save()
+		response = self.patient_client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['results'][1]['status'], 'completed')
+		self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+class BulkAPITestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient9', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_token("patient9", "pass123")}')
+		self.patients = [
+			Patient.objects.create(
+				first_name='Bulk', last_name=str(i), date_of_birth='1990-01-01', email=f'bulk{i}@example.com')
+			for i in range(3)
+		]
+		self.doctor = Doctor.objects.create(first_name='Bulk', last_name='Doc', email='bulkdoc@example.com')
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _items(self, count, day=1):
+		return [
+			{
+				'patient_id': self.patients[i % 3].id,
+				'doctor_id': self.doctor.id,
+				'appointment_datetime': f'2025-11-{day:02d}T{i:02d}:00:00Z',
+			}
+			for i in range(count)
+		]
+
+	def test_bulk_create(self):
+		url = reverse('appointment-bulk')
+		response = self.client.post(url, self._items(5), format='json')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(len(response.data), 5)
+		self.assertTrue(all(item['id'] for item in response.data))
+		self.assertEqual(Appointment.objects.count(), 5)
+
+	def test_bulk_create_query_count_is_constant(self):
+		url = reverse('appointment-bulk')
+		counts = []
+		for day, count in ((1, 2), (2, 20)):
+			with CaptureQueriesContext(connection) as ctx:
+				response = self.client.post(url, self._items(count, day), format='json')
+			self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+			counts.append(len(ctx.captured_queries))
+		self.assertEqual(counts[0], counts[1])
+
+	def test_bulk_create_reports_per_item_errors(self):
+		items = self._items(3)
+		items[1]['patient_id'] = 999999
+		del items[2]['appointment_datetime']
+		response = self.client.post(reverse('appointment-bulk'), items, format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		errors = response.data['errors']
+		self.assertEqual(errors[0], {})
+		self.assertIn('patient_id', errors[1])
+		self.assertIn('appointment_datetime', errors[2])
+		self.assertEqual(Appointment.objects.count(), 0)
+
+	def test_bulk_update(self):
+		self.client.post(reverse('appointment-bulk'), self._items(3), format='json')
+		ids = list(Appointment.objects.order_by('id').values_list('id', flat=True))
+		updates = [{'id': ids[0], 'status': 'completed'}, {'id': ids[2], 'patient_id': self.patients[0].id}]
+		response = self.client.patch(reverse('appointment-bulk'), updates, format='json')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(Appointment.objects.get(id=ids[0]).status, 'completed')
+		self.assertEqual(Appointment.objects.get(id=ids[2]).patient_id, self.patients[0].id)
+
+		response = self.client.patch(reverse('appointment-bulk'), [{'id': 999999, 'status': 'completed'}], format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn('id', response.data['errors'][0])
+
+	def test_bulk_update_rejects_duplicate_ids(self):
+		self.client.post(reverse('appointment-bulk'), self._items(2), format='json')
+		ids = list(Appointment.objects.order_by('id').values_list('id', flat=True))
+		updates = [
+			{'id': ids[0], 'status': 'completed'},
+			{'id': ids[1], 'status': 'completed'},
+			{'id': ids[0], 'status': 'cancelled'},
+		]
+		response = self.client.patch(reverse('appointment-bulk'), updates, format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(response.data['errors'][:2], [{}, {}])
+		self.assertIn('id', response.data['errors'][2])
+		self.assertFalse(Appointment.objects.filter(id__in=ids).exclude(status='scheduled').exists())
+
+	def test_bulk_rejects_non_list(self):
+		response = self.client.post(reverse('appointment-bulk'), self._items(1)[0], format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PatientExportTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient10', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_token("patient10", "pass123")}')
+		self.patient = Patient.objects.create(
+			first_name='Exp', last_name='Ort', date_of_birth='1960-06-06', email='export@example.com')
+		other = Patient.objects.create(
+			first_name='Not', last_name='Me', date_of_birth='1961-06-06', email='other@example.com')
+		doctor = Doctor.objects.create(first_name='Doc', last_name='Exp', email='docexp@example.com')
+		for i in range(3):
+			appointment = Appointment.objects.create(
+				patient=self.patient, doctor=doctor, appointment_datetime=f'2025-10-0{i + 1}T09:00:00Z')
+			Prescription.objects.create(appointment=appointment, medication=f'Med {i}', dosage='1mg')
+			HealthRecord.objects.create(
+				patient=self.patient, doctor=doctor, record_date=f'2025-09-0{i + 1}', diagnosis='Note, "quoted"')
+		Appointment.objects.create(patient=other, doctor=doctor, appointment_datetime='2025-10-01T09:00:00Z')
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def test_ndjson_export(self):
+		response = self.client.get(reverse('patient-export', args=[self.patient.id]))
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertTrue(response.streaming)
+		lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+		self.assertEqual([line['type'] for line in lines].count('appointment'), 3)
+		self.assertEqual([line['type'] for line in lines].count('prescription'), 3)
+		self.assertEqual(lines[0]['email'], 'export@example.com')
+		self.assertEqual(len(lines), 10)
+
+	def test_csv_export(self):
+		response = self.client.get(reverse('patient-export', args=[self.patient.id]), {'output': 'csv'})
+		self.assertEqual(response['Content-Type'], 'text/csv')
+		rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+		self.assertEqual(len(rows), 10)
+		self.assertEqual([row['diagnosis'] for row in rows if row['type'] == 'health_record'], ['Note, "quoted"'] * 3)
+
+	def test_export_errors(self):
+		self.assertEqual(self.client.get(reverse('patient-export', args=[999999])).status_code, status.HTTP_404_NOT_FOUND)
+		response = self.client.get(reverse('patient-export', args=[self.patient.id]), {'output': 'xml'})
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_export_command(self):
+		with tempfile.TemporaryDirectory() as output_dir:
+			call_command('export_patients', '--output-dir', output_dir, stdout=io.StringIO())
+			files = sorted(path.name for path in Path(output_dir).iterdir())
+			self.assertEqual(files, [f'patient-{pk}.ndjson' for pk in sorted(Patient.objects.values_list('pk', flat=True))])
+			lines = (Path(output_dir) / f'patient-{self.patient.id}.ndjson').read_text().splitlines()
+			self.assertEqual(len(lines), 10)
+
+
+class PatientTimelineTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient11', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_token("patient11", "pass123")}')
+		self.patient = Patient.objects.create(
+			first_name='Time', last_name='Line', date_of_birth='1950-01-01', email='timeline@example.com')
+		other = Patient.objects.create(
+			first_name='Other', last_name='Line', date_of_birth='1950-01-01', email='other-tl@example.com')
+		doctor = Doctor.objects.create(first_name='Doc', last_name='Time', email='doctime@example.com')
+		for day, hour in ((3, 9), (1, 0), (2, 15)):
+			appointment = Appointment.objects.create(
+				patient=self.patient, doctor=doctor, appointment_datetime=f'2025-10-0{day}T{hour:02d}:00:00Z')
+			Prescription.objects.create(appointment=appointment, medication=f'Med {day}', dosage='1mg')
+		for day in (1, 2, 4):
+			HealthRecord.objects.create(patient=self.patient, doctor=doctor, record_date=f'2025-10-0{day}', diagnosis='x')
+		Appointment.objects.create(patient=other, doctor=doctor, appointment_datetime='2025-10-01T12:00:00Z')
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _walk(self, page_size):
+		url = reverse('patient-timeline', args=[self.patient.id]) + f'?page_size={page_size}'
+		events = []
+		while url:
+			response = self.client.get(url)
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			events.extend(response.data['results'])
+			url = response.data['next']
+		return events
+
+	def test_events_are_merged_in_order(self):
+		events = self._walk(50)
+		self.assertEqual([(event['timestamp'][:13], event['type']) for event in events], [
+			('2025-10-01T00', 'appointment'),
+			('2025-10-01T00', 'health_record'),
+			('2025-10-01T00', 'prescription'),
+			('2025-10-02T00', 'health_record'),
+			('2025-10-02T15', 'appointment'),
+			('2025-10-02T15', 'prescription'),
+			('2025-10-03T09', 'appointment'),
+			('2025-10-03T09', 'prescription'),
+			('2025-10-04T00', 'health_record'),
+		])
+		self.assertEqual(events[2]['data']['medication'], 'Med 1')
+
+	def test_cursor_pages_match_single_page(self):
+		expected = self._walk(50)
+		for page_size in (1, 2, 4):
+			self.assertEqual(self._walk(page_size), expected)
+
+	def test_invalid_cursor_and_unknown_patient(self):
+		url = reverse('patient-timeline', args=[self.patient.id])
+		self.assertEqual(self.client.get(url, {'cursor': 'bogus'}).status_code, status.HTTP_404_NOT_FOUND)
+		url = reverse('patient-timeline', args=[999999])
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AppointmentSchedulingTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient12', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_token("patient12", "pass123")}')
+		self.patient = Patient.objects.create(
+			first_name='Book', last_name='Er', date_of_birth='1980-01-01', email='booker@example.com')
+		self.doctor = Doctor.objects.create(first_name='Busy', last_name='Doc', email='busy@example.com')
+		self.other_doctor = Doctor.objects.create(first_name='Free', last_name='Doc', email='free@example.com')
+		self.appointment = Appointment.objects.create(
+			patient=self.patient, doctor=self.doctor, appointment_datetime='2025-12-01T10:00:00Z', duration_minutes=60)
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _book(self, start, doctor=None, **extra):
+		data = {
+			'patient_id': self.patient.id, 'doctor_id': (doctor or self.doctor).id,
+			'appointment_datetime': start, **extra,
+		}
+		return self.client.post(reverse('appointment-list-create'), data)
+
+	def test_end_datetime_is_derived(self):
+		self.assertEqual(self.appointment.end_datetime.isoformat(), '2025-12-01T11:00:00+00:00')
+		response = self._book('2025-12-01T12:00:00Z', duration_minutes=45)
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(response.data['end_datetime'], '2025-12-01T12:45:00Z')
+
+	def test_overlap_is_rejected(self):
+		self.assertEqual(self._book('2025-12-01T10:30:00Z').status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self._book('2025-12-01T09:45:00Z').status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self._book('2025-12-01T09:30:00Z').status_code, status.HTTP_201_CREATED)
+		self.assertEqual(self._book('2025-12-01T11:00:00Z').status_code, status.HTTP_201_CREATED)
+		self.assertEqual(self._book('2025-12-01T10:30:00Z', doctor=self.other_doctor).status_code, status.HTTP_201_CREATED)
+
+	def test_cancelled_appointments_do_not_block(self):
+		self.assertEqual(self._book('2025-12-01T10:15:00Z', status='cancelled').status_code, status.HTTP_201_CREATED)
+		self.appointment.status = 'cancelled'
+		self.appointment.save()
+		self.assertEqual(self._book('2025-12-01T10:15:00Z').status_code, status.HTTP_201_CREATED)
+
+	def test_update_checks_conflicts_but_not_itself(self):
+		url = reverse('appointment-detail', args=[self.appointment.id])
+		self.assertEqual(self.client.patch(url, {'duration_minutes': 90}).status_code, status.HTTP_200_OK)
+		self._book('2025-12-01T12:00:00Z')
+		self.assertEqual(self.client.patch(url, {'duration_minutes': 150}).status_code, status.HTTP_400_BAD_REQUEST)
+		self.appointment.refresh_from_db()
+		self.assertEqual(self.appointment.end_datetime.isoformat(), '2025-12-01T11:30:00+00:00')
+
+	def test_bulk_rejects_overlaps_within_batch(self):
+		items = [
+			{'patient_id': self.patient.id, 'doctor_id': self.doctor.id, 'appointment_datetime': '2025-12-02T10:00:00Z'},
+			{'patient_id': self.patient.id, 'doctor_id': self.doctor.id, 'appointment_datetime': '2025-12-02T10:20:00Z'},
+			{'patient_id': self.patient.id, 'doctor_id': self.doctor.id, 'appointment_datetime': '2025-12-01T10:20:00Z'},
+		]
+		response = self.client.post(reverse('appointment-bulk'), items, format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(response.data['errors'][0], {})
+		self.assertIn('appointment_datetime', response.data['errors'][1])
+		self.assertIn('appointment_datetime', response.data['errors'][2])
+		self.assertEqual(Appointment.objects.count(), 1)
+
+	def test_availability(self):
+		self._book('2025-12-01T13:00:00Z', duration_minutes=30)
+		url = reverse('doctor-availability', args=[self.doctor.id])
+		response = self.client.get(url, {'from': '2025-12-01T09:00:00Z', 'to': '2025-12-01T14:00:00Z', 'duration': 60})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['free'], [
+			{'start': '2025-12-01T09:00:00Z', 'end': '2025-12-01T10:00:00Z'},
+			{'start': '2025-12-01T11:00:00Z', 'end': '2025-12-01T13:00:00Z'},
+		])
+		response = self.client.get(url, {'from': '2025-12-01T14:00:00Z', 'to': '2025-12-01T09:00:00Z'})
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_overlap_query_uses_index(self):
+		with CaptureQueriesContext(connection) as ctx:
+			self._book('2025-12-01T15:00:00Z')
+		overlap_sql = next(q['sql'] for q in ctx.captured_queries if '"end_datetime" >' in q['sql'])
+		with connection.cursor() as cursor:
+			cursor.execute('EXPLAIN QUERY PLAN ' + overlap_sql)
+			plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+		self.assertIn('appointment_doctor_span_idx', plan)
+
+
+class IndexedFilterTestCase(APITestCase):
+	def setUp(self):
+		self.doctor_user = User.objects.create_user(username='doctor13', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.patient_user = User.objects.create_user(username='patient13', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.doctor_client = self._auth_client(self._get_token('doctor13', 'pass123'))
+		self.patient_client = self._auth_client(self._get_token('patient13', 'pass123'))
+		self.patients = [
+			Patient.objects.create(first_name='F', last_name=str(i), date_of_birth='1990-01-01', email=f'f{i}@example.com')
+			for i in range(2)
+		]
+		self.doctors = [
+			Doctor.objects.create(first_name='D', last_name=str(i), email=f'fd{i}@example.com')
+			for i in range(2)
+		]
+		for i in range(8):
+			Appointment.objects.create(
+				patient=self.patients[i % 2], doctor=self.doctors[i // 4],
+				appointment_datetime=f'2025-10-{i + 1:02d}T10:00:00Z',
+				status='completed' if i % 3 == 0 else 'scheduled')
+			HealthRecord.objects.create(
+				patient=self.patients[i % 2], doctor=self.doctors[i // 4],
+				record_date=f'2025-10-{i + 1:02d}', diagnosis='x')
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _auth_client(self, token):
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _ids(self, client, url, **params):
+		response = client.get(url, params)
+		self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+		return [item['id'] for item in response.data['results']]
+
+	def test_appointment_filters(self):
+		url = reverse('appointment-list-create')
+		ordered = Appointment.objects.order_by('appointment_datetime', 'id')
+		self.assertEqual(
+			self._ids(self.patient_client, url, patient=self.patients[0].id),
+			[a.id for a in ordered.filter(patient=self.patients[0])])
+		self.assertEqual(
+			self._ids(self.patient_client, url, doctor=self.doctors[1].id, status='scheduled'),
+			[a.id for a in ordered.filter(doctor=self.doctors[1], status='scheduled')])
+		self.assertEqual(
+			self._ids(self.patient_client, url, **{'from': '2025-10-02', 'to': '2025-10-03'}),
+			[a.id for a in ordered.filter(appointment_datetime__date__range=('2025-10-02', '2025-10-03'))])
+		self.assertEqual(len(self._ids(self.patient_client, url, **{'from': '2025-10-02T10:00:00Z'})), 7)
+
+	def test_healthrecord_filters(self):
+		url = reverse('healthrecord-list-create')
+		self.assertEqual(
+			self._ids(self.doctor_client, url, doctor=self.doctors[0].id, to='2025-10-02'),
+			list(HealthRecord.objects.filter(doctor=self.doctors[0], record_date__lte='2025-10-02')
+				.order_by('record_date', 'id').values_list('id', flat=True)))
+
+	def test_invalid_filters(self):
+		url = reverse('appointment-list-create')
+		response = self.patient_client.get(url, {'status': 'lost', 'patient': 'abc', 'from': 'yesterday'})
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(set(response.data), {'status', 'patient', 'from'})
+
+	def _plan(self, client, url, params):
+		with CaptureQueriesContext(connection) as ctx:
+			self.assertEqual(client.get(url, params).status_code, status.HTTP_200_OK)
+		with connection.cursor() as cursor:
+			cursor.execute('EXPLAIN QUERY PLAN ' + ctx.captured_queries[-1]['sql'])
+			return [str(row[-1]) for row in cursor.fetchall()]
+
+	def assertUsesIndex(self, client, url, table, params):
+		plan = self._plan(client, url, params)
+		access = [line for line in plan if table in line]
+		self.assertTrue(access, plan)
+		for line in access:
+			self.assertIn('USING', line, f'{params} scans {table} without an index: {plan}')
+		if params:
+			self.assertTrue(any(line.startswith('SEARCH') for line in access), f'{params}: {plan}')
+
+	def test_appointment_filters_use_indexes(self):
+		url = reverse('appointment-list-create')
+		combinations = [
+			{}, {'patient': 1}, {'doctor': 1}, {'status': 'scheduled'}, {'from': '2025-10-02'},
+			{'patient': 1, 'from': '2025-10-02', 'to': '2025-10-05'},
+			{'doctor': 1, 'from': '2025-10-02', 'to': '2025-10-05'},
+			{'status': 'scheduled', 'from': '2025-10-02'},
+			{'patient': 1, 'doctor': 1}, {'doctor': 1, 'status': 'completed'},
+		]
+		for params in combinations:
+			self.assertUsesIndex(self.patient_client, url, 'records_appointment', params)
+
+	def test_doctor_and_status_filters_seek_by_doctor(self):
+		url = reverse('appointment-list-create')
+		for params in [
+			{'doctor': 1, 'status': 'scheduled'},
+			{'doctor': 1, 'status': 'scheduled', 'from': '2025-10-02', 'to': '2025-10-05'},
+		]:
+			plan = ' '.join(self._plan(self.patient_client, url, params))
+			self.assertIn('appointment_doctor_status_idx (doctor_id=? AND status=?', plan, params)
+
+	def test_healthrecord_filters_use_indexes(self):
+		url = reverse('healthrecord-list-create')
+		combinations = [
+			{}, {'patient': 1}, {'doctor': 1}, {'from': '2025-10-02', 'to': '2025-10-05'},
+			{'patient': 1, 'from': '2025-10-02'}, {'doctor': 1, 'to': '2025-10-05'}, {'patient': 1, 'doctor': 1},
+		]
+		for params in combinations:
+			self.assertUsesIndex(self.doctor_client, url, 'records_healthrecord', params)
+
+
+class HealthRecordSearchTestCase(APITestCase):
+	def setUp(self):
+		self.doctor_user = User.objects.create_user(username='doctor14', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_token("doctor14", "pass123")}')
+		self.patient = Patient.objects.create(
+			first_name='Sea', last_name='Rch', date_of_birth='1970-01-01', email='search@example.com')
+		self.diabetes = HealthRecord.objects.create(
+			patient=self.patient, record_date='2025-01-01',
+			diagnosis='Type 2 diabetes mellitus', treatment='Metformin and diet changes')
+		self.mention = HealthRecord.objects.create(
+			patient=self.patient, record_date='2025-01-02',
+			diagnosis='Hypertension', treatment='Monitor for diabetes type 2 symptoms')
+		self.flu = HealthRecord.objects.create(
+			patient=self.patient, record_date='2025-01-03', diagnosis='Influenza', treatment='Rest and fluids')
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _search(self, q, **params):
+		response = self.client.get(reverse('healthrecord-search'), {'q': q, **params})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		return response.data['results']
+
+	def test_ranked_results_with_snippets(self):
+		results = self._search('diabetes')
+		self.assertEqual([r['id'] for r in results], [self.diabetes.id, self.mention.id])
+		self.assertLessEqual(results[0]['rank'], results[1]['rank'])
+		self.assertIn('[diabetes]', results[0]['snippet'])
+		self.assertEqual(results[0]['diagnosis'], 'Type 2 diabetes mellitus')
+
+	def test_phrase_and_prefix_queries(self):
+		self.assertEqual([r['id'] for r in self._search('"type 2 diabetes"')], [self.diabetes.id])
+		self.assertEqual([r['id'] for r in self._search('influ*')], [self.flu.id])
+		self.assertEqual([r['id'] for r in self._search('metformin diet')], [self.diabetes.id])
+
+	def test_index_follows_writes(self):
+		self.flu.diagnosis = 'Bronchitis'
+		self.flu.save()
+		self.assertEqual(self._search('influenza'), [])
+		self.assertEqual([r['id'] for r in self._search('bronchitis')], [self.flu.id])
+		HealthRecord.objects.filter(pk=self.diabetes.pk).delete()
+		self.assertEqual([r['id'] for r in self._search('diabetes')], [self.mention.id])
+		created = HealthRecord.objects.bulk_create([
+			HealthRecord(patient=self.patient, record_date='2025-02-01', diagnosis='Asthma'),
+		])
+		self.assertEqual([r['id'] for r in self._search('asthma')], [created[0].id])
+
+	def test_archived_records_with_include_archived(self):
+		old = HealthRecord.objects.create(
+			patient=self.patient, record_date='2015-01-01', diagnosis='Gestational diabetes', treatment='Diet')
+		self.assertEqual(archive_records(), {'appointments': 0, 'health_records': 1})
+		self.assertEqual([r['id'] for r in self._search('diabetes')], [self.diabetes.id, self.mention.id])
+		results = self._search('diabetes', include_archived='true')
+		self.assertEqual(sorted(r['id'] for r in results), sorted([self.diabetes.id, self.mention.id, old.id]))
+		archived = next(r for r in results if r['id'] == old.id)
+		self.assertEqual(archived['diagnosis'], 'Gestational diabetes')
+		self.assertIn('[diabetes]', archived['snippet'])
+		self.assertEqual([r['id'] for r in self._search('gestational', include_archived='true')], [old.id])
+		self.assertEqual(self._search('gestational'), [])
+
+	def test_query_syntax_is_escaped(self):
+		self.assertEqual(self._search('NOT OR ( "'), [])
+		self.assertEqual([r['id'] for r in self._search('diabetes) OR (flu')], [])
+		response = self.client.get(reverse('healthrecord-search'))
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SummaryStatsTestCase(APITestCase):
+	def setUp(self):
+		self.staff_user = User.objects.create_user(username='staff3', password='pass123', is_staff=True)
+		self.doctor_user = User.objects.create_user(username='doctor18', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.patient = Patient.objects.create(
+			first_name='Stat', last_name='Patient', date_of_birth='1980-01-01', email='stats@example.com')
+		self.doctor = Doctor.objects.create(first_name='Stat', last_name='Doc', email='statsdoc@example.com')
+		self.other_doctor = Doctor.objects.create(first_name='Other', last_name='Doc', email='statsother@example.com')
+
+	def _client(self, username):
+		token = APIClient().post(reverse('token_obtain_pair'), {'username': username, 'password': 'pass123'}).data['access']
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _appointment(self, when, doctor=None, **fields):
+		return Appointment.objects.create(patient=self.patient, doctor=doctor or self.doctor, appointment_datetime=when, **fields)
+
+	def _day(self, doctor, day):
+		return DoctorDayStats.objects.filter(doctor=doctor, day=day).values('total', 'scheduled', 'completed', 'cancelled').first()
+
+	def test_summaries_follow_every_write_path(self):
+		first = self._appointment('2025-03-01T09:00:00Z')
+		second = self._appointment('2025-03-01T23:30:00Z', status='completed')
+		Appointment.objects.bulk_create([Appointment(
+			patient=self.patient, doctor=self.doctor, appointment_datetime=datetime(2025, 3, 2, 9, tzinfo=timezone.utc),
+			end_datetime=datetime(2025, 3, 2, 9, 30, tzinfo=timezone.utc))])
+		self.assertEqual(self._day(self.doctor, '2025-03-01'), {'total': 2, 'scheduled': 1, 'completed': 1, 'cancelled': 0})
+		self.assertEqual(self._day(self.doctor, '2025-03-02')['total'], 1)
+
+		# Status changes through QuerySet.update(), moves through save().
+		Appointment.objects.filter(pk=first.pk).update(status='cancelled')
+		second.doctor, second.appointment_datetime = self.other_doctor, '2025-03-02T10:00:00Z'
+		second.save()
+		self.assertEqual(self._day(self.doctor, '2025-03-01'), {'total': 1, 'scheduled': 0, 'completed': 0, 'cancelled': 1})
+		self.assertEqual(self._day(self.other_doctor, '2025-03-02')['completed'], 1)
+
+		Prescription.objects.create(appointment=first, medication='Ibuprofen', dosage='200mg')
+		Prescription.objects.bulk_create([
+			Prescription(appointment=second, medication=name, dosage='10mg') for name in ('Ibuprofen', 'Metformin')])
+		Prescription.objects.filter(medication='Metformin').update(medication='Atorvastatin')
+		self.assertEqual(dict(MedicationStats.objects.values_list('medication', 'prescriptions')), {'Ibuprofen': 2, 'Atorvastatin': 1})
+
+		# Deletes cascade to prescriptions and remove rows that reach zero.
+		first.delete()
+		self.assertIsNone(self._day(self.doctor, '2025-03-01'))
+		self.assertEqual(dict(MedicationStats.objects.values_list('medication', 'prescriptions')), {'Ibuprofen': 1, 'Atorvastatin': 1})
+		self.other_doctor.delete()
+		self.assertFalse(DoctorDayStats.objects.filter(doctor_id=self.other_doctor.pk).exists())
+		self.assertFalse(MedicationStats.objects.exists())
+		self.assertEqual(stats_differences(), [])
+
+	def test_stats_endpoints(self):
+		self._appointment('2025-03-01T09:00:00Z', status='completed')
+		self._appointment('2025-03-01T10:00:00Z', status='completed')
+		cancelled = self._appointment('2025-03-02T09:00:00Z', status='cancelled')
+		self._appointment('2025-03-01T09:00:00Z', doctor=self.other_doctor)
+		for medication in ('Salbutamol', 'Ibuprofen', 'Ibuprofen'):
+			Prescription.objects.create(appointment=cancelled, medication=medication, dosage='5mg')
+		client = self._client('staff3')
+
+		with CaptureQueriesContext(connection) as queries:
+			response = client.get(reverse('stats-doctor-days'), {'doctor': self.doctor.pk, 'from': '2025-03-01', 'to': '2025-03-01'})
+		self.assertEqual(len(queries), 1)
+		self.assertEqual(response.data['results'], [
+			{'doctor_id': self.doctor.pk, 'day': '2025-03-01', 'total': 2, 'scheduled': 0, 'completed': 2, 'cancelled': 0}])
+		self.assertEqual(len(client.get(reverse('stats-doctor-days')).data['results']), 3)
+
+		response = client.get(reverse('stats-appointment-status'))
+		self.assertEqual(response.data['total'], 4)
+		self.assertEqual(response.data['statuses'], [
+			{'status': 'scheduled', 'appointments': 1, 'rate': 0.25},
+			{'status': 'completed', 'appointments': 2, 'rate': 0.5},
+			{'status': 'cancelled', 'appointments': 1, 'rate': 0.25},
+		])
+
+		response = client.get(reverse('stats-top-medications'), {'limit': 1})
+		self.assertEqual(response.data['results'], [{'medication': 'Ibuprofen', 'prescriptions': 2}])
+		self.assertEqual(client.get(reverse('stats-top-medications'), {'limit': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self._client('doctor18').get(reverse('stats-appointment-status')).status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_rebuild_command(self):
+		appointment = self._appointment('2025-03-01T09:00:00Z')
+		for index in range(5):
+			Prescription.objects.create(appointment=appointment, medication=f'Drug {index % 2}', dosage='5mg')
+		MedicationStats.objects.filter(medication='Drug 0').update(prescriptions=7)
+		DoctorDayStats.objects.all().delete()
+		with self.assertRaisesMessage(CommandError, 'medication Drug 0: expected 3, found 7'):
+			call_command('rebuild_stats', '--check', stdout=io.StringIO())
+
+		output = io.StringIO()
+		call_command('rebuild_stats', '--chunk-size', '2', stdout=output)
+		self.assertIn('Summary tables are consistent.', output.getvalue())
+		self.assertEqual(self._day(self.doctor, '2025-03-01')['total'], 1)
+		self.assertEqual(MedicationStats.objects.get(medication='Drug 0').prescriptions, 3)
+
+
+class ResponseCacheTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient15', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.doctor_user = User.objects.create_user(username='doctor15', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.patient_client = self._auth_client(self._get_token('patient15', 'pass123'))
+		self.doctor_client = self._auth_client(self._get_token('doctor15', 'pass123'))
+		self.patient = Patient.objects.create(
+			first_name='Cache', last_name='Hit', date_of_birth='1980-01-01', email='cache@example.com')
+		self.doctor = Doctor.objects.create(first_name='Cache', last_name='Doc', email='cachedoc@example.com')
+		self.appointment = Appointment.objects.create(
+			patient=self.patient, doctor=self.doctor, appointment_datetime='2025-12-01T10:00:00Z')
+		self.prescription = Prescription.objects.create(
+			appointment=self.appointment, medication='Aspirin', dosage='100mg', instructions='Daily')
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def _auth_client(self, token):
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _get(self, client, url, params=None):
+		response = client.get(url, params or {})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		return response
+
+	def test_repeat_get_is_served_from_cache(self):
+		url = reverse('appointment-list-create')
+		self.assertEqual(self._get(self.patient_client, url)['X-Cache'], 'MISS')
+		with CaptureQueriesContext(connection) as ctx:
+			response = self._get(self.patient_client, url)
+		self.assertEqual(response['X-Cache'], 'HIT')
+		self.assertEqual(response.data['results'][0]['id'], self.appointment.id)
+		self.assertFalse([q for q in ctx.captured_queries if 'records_appointment' in q['sql']])
+
+	def test_key_includes_query_parameters(self):
+		url = reverse('appointment-list-create')
+		self._get(self.patient_client, url)
+		response = self._get(self.patient_client, url, {'fields': 'id'})
+		self.assertEqual(response['X-Cache'], 'MISS')
+		self.assertEqual(list(response.data['results'][0]), ['id'])
+
+	def test_patient_change_evicts_only_dependent_responses(self):
+		detail = reverse('patient-detail', args=[self.patient.id])
+		appointments = reverse('appointment-list-create')
+		prescriptions = reverse('prescription-list-create')
+		self._get(self.patient_client, detail)
+		self._get(self.patient_client, appointments, {'expand': 'patient'})
+		self._get(self.doctor_client, prescriptions, {'expand': 'appointment.patient'})
+		self._get(self.doctor_client, prescriptions)
+
+		response = self.patient_client.patch(detail, {'first_name': 'Changed'}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+		response = self._get(self.patient_client, detail)
+		self.assertEqual((response['X-Cache'], response.data['first_name']), ('MISS', 'Changed'))
+		response = self._get(self.patient_client, appointments, {'expand': 'patient'})
+		self.assertEqual(response['X-Cache'], 'MISS')
+		self.assertEqual(response.data['results'][0]['patient']['first_name'], 'Changed')
+		response = self._get(self.doctor_client, prescriptions, {'expand': 'appointment.patient'})
+		self.assertEqual(response['X-Cache'], 'MISS')
+		self.assertEqual(response.data['results'][0]['appointment']['patient']['first_name'], 'Changed')
+		# Flat prescription rows do not reference the patient.
+		self.assertEqual(self._get(self.doctor_client, prescriptions)['X-Cache'], 'HIT')
+
+	def test_writes_evict_list_pages(self):
+		url = reverse('appointment-list-create')
+		self._get(self.patient_client, url)
+		self.appointment.delete()
+		self.assertEqual(self._get(self.patient_client, url).data['results'], [])
+
+		response = self.patient_client.post(reverse('appointment-bulk'), [{
+			'patient_id': self.patient.id, 'doctor_id': self.doctor.id,
+			'appointment_datetime': '2025-12-02T10:00:00Z',
+		}], format='json')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		response = self._get(self.patient_client, url)
+		self.assertEqual(response['X-Cache'], 'MISS')
+		self.assertEqual(len(response.data['results']), 1)
+
+	def test_stats_endpoint(self):
+		url = reverse('doctor-list-create')
+		self._get(self.doctor_client, url)
+		self._get(self.doctor_client, url)
+		response = self.doctor_client.get(reverse('cache-stats'))
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+		User.objects.create_user(username='staff1', password='pass123', is_staff=True)
+		response = self._auth_client(self._get_token('staff1', 'pass123')).get(reverse('cache-stats'))
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual((response.data['hits'], response.data['misses']), (1, 1))
+		self.assertEqual(response.data['hit_rate'], 0.5)
+
+
+class ConditionalRequestTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient16', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_token("patient16", "pass123")}')
+		self.patient = Patient.objects.create(
+			first_name='Etag', last_name='Test', date_of_birth='1985-01-01', email='etag@example.com')
+		self.doctor = Doctor.objects.create(first_name='Etag', last_name='Doc', email='etagdoc@example.com')
+		self.appointments = [
+			Appointment.objects.create(
+				patient=self.patient, doctor=self.doctor, appointment_datetime=f'2025-12-0{day}T10:00:00Z')
+			for day in (1, 2, 3)
+		]
+
+	def _get_token(self, username, password):
+		url = reverse('token_obtain_pair')
+		client = APIClient()
+		response = client.post(url, {'username': username, 'password': password})
+		return response.data['access']
+
+	def test_versions_track_writes(self):
+		self.assertEqual(self.patient.version, 1)
+		self.patient.phone = '555'
+		self.patient.save(update_fields=['phone'])
+		self.patient.refresh_from_db()
+		self.assertEqual(self.patient.version, 2)
+		response = self.client.patch(reverse('appointment-bulk'), [{'id': self.appointments[0].id, 'status': 'completed'}], format='json')
+		self.assertEqual(response.data[0]['version'], 2)
+		self.assertEqual(Appointment.objects.get(pk=self.appointments[0].id).version, 2)
+
+	def test_detail_if_none_match(self):
+		url = reverse('patient-detail', args=[self.patient.id])
+		response = self.client.get(url)
+		etag = response['ETag']
+		self.assertIn('Last-Modified', response)
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+		self.assertEqual(response.content, b'')
+		self.assertEqual(len([q for q in ctx.captured_queries if 'records_patient' in q['sql']]), 1)
+
+		response = self.client.patch(url, {'phone': '123'}, format='json')
+		new_etag = response['ETag']
+		self.assertNotEqual(new_etag, etag)
+		response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response['ETag'], new_etag)
+		response = self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=new_etag)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+	def test_list_etag_follows_rows_and_expansions(self):
+		url = reverse('appointment-list-create')
+		etag = self.client.get(url)['ETag']
+		expanded_etag = self.client.get(url, {'expand': 'patient'})['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+		Patient.objects.get(pk=self.patient.pk).save()
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+		response = self.client.get(url, {'expand': 'patient'}, HTTP_IF_NONE_MATCH=expanded_etag)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+		self.appointments[0].status = 'completed'
+		self.appointments[0].save()
+		response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response['ETag'], self.client.get(url)['ETag'])
+
+	def test_if_modified_since(self):
+		url = reverse('patient-detail', args=[self.patient.id])
+		last_modified = self.client.get(url)['Last-Modified']
+		response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+		self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+		response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+	def test_if_match(self):
+		url = reverse('appointment-detail', args=[self.appointments[0].id])
+		etag = self.client.get(url)['ETag']
+		response = self.client.patch(url, {'status': 'completed'}, format='json', HTTP_IF_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+		response = self.client.patch(url, {'status': 'cancelled'}, format='json', HTTP_IF_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+		self.assertEqual(Appointment.objects.get(pk=self.appointments[0].id).status, 'completed')
+		response = self.client.delete(url, HTTP_IF_MATCH=etag)
+		self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+		self.assertTrue(Appointment.objects.filter(pk=self.appointments[0].id).exists())
+
+	def test_if_match_detects_lost_update(self):
+		url = reverse('appointment-detail', args=[self.appointments[1].id])
+		etag = self.client.get(url)['ETag']
+		stale = Appointment.objects.get(pk=self.appointments[1].id)
+		Appointment.objects.filter(pk=stale.pk).update(version=F('version') + 1)
+		view = views.AppointmentRetrieveUpdateDestroyView()
+		view.request = mock.Mock(headers={'If-Match': etag})
+		view.get_validators = mock.Mock(return_value=(etag, None))
+		with self.assertRaises(PreconditionFailed):
+			view._check_if_match(stale)
+
+
+class RoleClaimAuthTestCase(APITestCase):
+	def setUp(self):
+		self.doctor_user = User.objects.create_user(username='doctor17', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		self.tokens = APIClient().post(
+			reverse('token_obtain_pair'), {'username': 'doctor17', 'password': 'pass123'}).data
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens["access"]}')
+		Doctor.objects.create(first_name='Claim', last_name='Doc', email='claimdoc@example.com')
+
+	def test_token_carries_role(self):
+		token = AccessToken(self.tokens['access'])
+		self.assertEqual(token['role'], 'doctor')
+		self.assertEqual(token['user_id'], str(self.doctor_user.id))
+		self.assertFalse(token['is_staff'])
+
+	def test_auth_and_permissions_need_no_queries(self):
+		url = reverse('doctor-list-create')
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertFalse([q for q in ctx.captured_queries if 'auth_user' in q['sql'] or 'userprofile' in q['sql']])
+		with self.assertNumQueries(0):
+			response = self.client.get(url)
+		self.assertEqual(response['X-Cache'], 'HIT')
+		response = self.client.get(reverse('appointment-list-create'))
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_tokens_without_role_claim_fall_back_to_database(self):
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.doctor_user).access_token}')
+		self.assertEqual(client.get(reverse('doctor-list-create')).status_code, status.HTTP_200_OK)
+
+	@override_settings(PHR_JWT_REVOCATION_SYNC_INTERVAL=0)
+	def test_revocation(self):
+		url = reverse('doctor-list-create')
+		jti = AccessToken(self.tokens['access'])['jti']
+		revocations.revoke_token(jti)
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+		# Revocations are shared: another worker, or this one after a restart, sees them too.
+		self.assertTrue(RevocationList().is_revoked(AccessToken(self.tokens['access'])))
+		TokenRevocation.objects.filter(subject=jti).delete()
+		revocations.clear()
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+		profile = UserProfile.objects.get(user=self.doctor_user)
+		profile.role = 'patient'
+		profile.save()
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+		response = APIClient().post(reverse('token_refresh'), {'refresh': self.tokens['refresh']})
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+		revocations.clear()
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+	def test_tokens_issued_right_after_revocation_are_valid(self):
+		revocations.revoke_user(self.doctor_user.pk)
+		self.assertEqual(self.client.get(reverse('doctor-list-create')).status_code, status.HTTP_401_UNAUTHORIZED)
+		# Usually within the same second as the revocation; iat is sub-second.
+		tokens = APIClient().post(reverse('token_obtain_pair'), {'username': 'doctor17', 'password': 'pass123'}).data
+		self.assertGreater(AccessToken(tokens['access'])['iat'], revocations._users[str(self.doctor_user.pk)])
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+		self.assertEqual(client.get(reverse('doctor-list-create')).status_code, status.HTTP_200_OK)
+
+	@override_settings(PHR_JWT_REVOCATION_SYNC_INTERVAL=0)
+	def test_refresh_uses_current_user(self):
+		refresh_url = reverse('token_refresh')
+		# Changes that bypass the revocation signals still reach refreshed tokens.
+		UserProfile.objects.filter(user=self.doctor_user).update(role='patient')
+		response = APIClient().post(refresh_url, {'refresh': self.tokens['refresh']})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(AccessToken(response.data['access'])['role'], 'patient')
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+		self.assertEqual(client.get(reverse('prescription-list-create')).status_code, status.HTTP_403_FORBIDDEN)
+
+		User.objects.filter(pk=self.doctor_user.pk).update(is_active=False)
+		response = APIClient().post(refresh_url, {'refresh': self.tokens['refresh']})
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+		self.doctor_user.refresh_from_db()
+		self.doctor_user.save()
+		revocations.clear()
+		self.assertEqual(self.client.get(reverse('doctor-list-create')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+
+class UserProvisioningTestCase(APITestCase):
+	def setUp(self):
+		self.staff_user = User.objects.create_user(username='staff4', password='pass123', is_staff=True)
+		self.doctor_user = User.objects.create_user(username='doctor20', password='pass123')
+		UserProfile.objects.filter(user=self.doctor_user).update(role='doctor')
+		token = APIClient().post(reverse('token_obtain_pair'), {'username': 'staff4', 'password': 'pass123'}).data['access']
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		self.url = reverse('user-bulk')
+
+	def test_user_save_skips_unchanged_profile(self):
+		with CaptureQueriesContext(connection) as ctx:
+			user = User.objects.create_user(username='patient23', password='pass123')
+		self.assertEqual([q['sql'].split()[0] for q in ctx.captured_queries], ['INSERT', 'INSERT'])
+		user = User.objects.select_related('profile').get(pk=user.pk)
+		user.first_name = 'Renamed'
+		with self.assertNumQueries(1):
+			user.save()
+		user.profile.role = 'patient'
+		user.save()
+		self.assertEqual(UserProfile.objects.get(user=user).role, 'patient')
+
+	def test_json_create_and_update(self):
+		response = self.client.post(self.url, [
+			{'username': 'patient24', 'password': 'Provision-pass-1', 'email': 'p24@example.com', 'role': 'patient'},
+			{'username': 'doctor20', 'role': 'doctor'},
+			{'username': 'staff4', 'first_name': 'Staff'},
+		], format='json')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual([(user['username'], user['result']) for user in response.data['users']], [
+			('patient24', 'created'), ('doctor20', 'unchanged'), ('staff4', 'updated')])
+		self.assertEqual((response.data['created'], response.data['updated'], response.data['unchanged']), (1, 1, 1))
+		user = User.objects.get(username='patient24')
+		self.assertTrue(user.check_password('Provision-pass-1'))
+		self.assertEqual((user.email, user.profile.role), ('p24@example.com', 'patient'))
+		self.assertEqual(User.objects.get(username='staff4').first_name, 'Staff')
+		self.assertEqual(UserProfile.objects.filter(user__username='patient24').count(), 1)
+
+		response = self.client.post(self.url, [{'username': 'patient24', 'role': 'patient'}], format='json')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['unchanged'], 1)
+
+	def test_csv(self):
+		body = 'username,password,role,is_staff\npatient25,Provision-pass-2,patient,\nstaff5,Provision-pass-3,,true\n'
+		response = self.client.post(self.url, body, content_type='text/csv')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(UserProfile.objects.get(user__username='patient25').role, 'patient')
+		staff = User.objects.get(username='staff5')
+		self.assertTrue(staff.is_staff)
+		self.assertEqual(staff.profile.role, '')
+
+	def test_invalid_rows_write_nothing(self):
+		response = self.client.post(self.url, [
+			{'username': 'patient26', 'password': 'Provision-pass-4', 'role': 'patient'},
+			{'username': 'patient27', 'role': 'patient'},
+			{'username': 'patient26', 'password': 'Provision-pass-4'},
+			{'username': 'patient28', 'password': '123'},
+			{'username': 'patient29', 'password': 'Provision-pass-5', 'role': 'nurse'},
+		], format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn('role', response.data['errors'][4])
+		response = self.client.post(self.url, [
+			{'username': 'patient26', 'password': 'Provision-pass-4', 'role': 'patient'},
+			{'username': 'patient27', 'role': 'patient'},
+			{'username': 'patient26', 'password': 'Provision-pass-4'},
+			{'username': 'patient28', 'password': '123'},
+		], format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		errors = response.data['errors']
+		self.assertEqual(errors[0], {})
+		self.assertIn('password', errors[1])
+		self.assertIn('username', errors[2])
+		self.assertIn('password', errors[3])
+		self.assertFalse(User.objects.filter(username__in=['patient26', 'patient27', 'patient28']).exists())
+
+	def test_requires_staff(self):
+		token = APIClient().post(reverse('token_obtain_pair'), {'username': 'doctor20', 'password': 'pass123'}).data['access']
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		response = client.post(self.url, [{'username': 'doctor20', 'role': 'patient'}], format='json')
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_role_change_revokes_tokens(self):
+		tokens = APIClient().post(reverse('token_obtain_pair'), {'username': 'doctor20', 'password': 'pass123'}).data
+		response = self.client.post(self.url, [{'username': 'doctor20', 'role': 'patient'}], format='json')
+		self.assertEqual(response.data['updated'], 1)
+		self.assertEqual(UserProfile.objects.get(user=self.doctor_user).role, 'patient')
+		response = APIClient().post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+	def test_command(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = Path(directory) / 'users.csv'
+			path.write_text('username,password,role\ndoctor21,Provision-pass-6,doctor\ndoctor20,,patient\n')
+			out = io.StringIO()
+			call_command('provision_users', str(path), '--batch-size', '1', '--workers', '2', stdout=out)
+			self.assertIn('Created 1, updated 1, unchanged 0 users', out.getvalue())
+			self.assertEqual(UserProfile.objects.get(user__username='doctor21').role, 'doctor')
+			self.assertEqual(UserProfile.objects.get(user=self.doctor_user).role, 'patient')
+
+			path.write_text('username,role\ndoctor22,doctor\n')
+			with self.assertRaisesMessage(CommandError, 'row 1'):
+				call_command('provision_users', str(path))
+
+
+
+class AuditLogTestCase(APITestCase):
+	def setUp(self):
+		for username, role in (('patient30', 'patient'), ('doctor23', 'doctor')):
+			user = User.objects.create_user(username=username, password='pass123')
+			UserProfile.objects.filter(user=user).update(role=role)
+		User.objects.create_user(username='staff6', password='pass123', is_staff=True)
+		self.patient_user = User.objects.get(username='patient30')
+		self.patient = Patient.objects.create(
+			first_name='Audit', last_name='Patient', date_of_birth='1980-01-01', email='audit@example.com')
+		self.doctor = Doctor.objects.create(first_name='Audit', last_name='Doc', email='auditdoc@example.com')
+		self.appointment = Appointment.objects.create(
+			patient=self.patient, doctor=self.doctor, appointment_datetime='2024-06-01T09:00:00Z')
+		self.record = HealthRecord.objects.create(
+			patient=self.patient, doctor=self.doctor, record_date='2024-06-01', diagnosis='Audited migraine')
+
+	def _client(self, username):
+		token = APIClient().post(reverse('token_obtain_pair'), {'username': username, 'password': 'pass123'}).data['access']
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _events(self):
+		audit_log.flush()
+		return list(AuditEvent.objects.order_by('id').values_list('user_id', 'role', 'action', 'model', 'object_id'))
+
+	def test_reads_and_writes_are_queued_then_written(self):
+		client = self._client('patient30')
+		url = reverse('patient-detail', kwargs={'pk': self.patient.pk})
+		client.get(url)
+		with self.assertNumQueries(0):
+			self.assertEqual(client.get(url)['X-Cache'], 'HIT')
+		client.patch(url, {'phone': '555'}, format='json')
+		self.assertFalse(AuditEvent.objects.exists())
+		pk, user_id = self.patient.pk, self.patient_user.pk
+		self.assertEqual(self._events(), [
+			(user_id, 'patient', 'read', 'patient', pk),
+			(user_id, 'patient', 'read', 'patient', pk),
+			(user_id, 'patient', 'update', 'patient', pk),
+		])
+		self.assertEqual(client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+		self.assertEqual(self._events()[-1], (user_id, 'patient', 'delete', 'patient', pk))
+		client.get(url)
+		self.assertEqual(len(self._events()), 4)
+
+	def test_nested_searched_and_exported_objects(self):
+		self._client('patient30').get(reverse('appointment-list-create'), {'expand': 'patient'})
+		doctor = self._client('doctor23')
+		doctor.get(reverse('healthrecord-search'), {'q': 'migraine'})
+		doctor.get(reverse('doctor-list-create'))
+		self._client('patient30').get(reverse('patient-export', kwargs={'pk': self.patient.pk}))
+		self.assertEqual([event[2:] for event in self._events()], [
+			('read', 'patient', self.patient.pk),
+			('read', 'healthrecord', self.record.pk),
+			('export', 'patient', self.patient.pk),
+		])
+
+	def test_endpoint(self):
+		client = self._client('patient30')
+		client.get(reverse('patient-list-create'))
+		client.get(reverse('patient-detail', kwargs={'pk': self.patient.pk}))
+		self._client('doctor23').get(reverse('healthrecord-detail', kwargs={'pk': self.record.pk}))
+		audit_log.flush()
+
+		url = reverse('audit-list')
+		self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+		staff = self._client('staff6')
+		response = staff.get(url, {'model': 'patient', 'object_id': self.patient.pk})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(len(response.data['results']), 2)
+		self.assertEqual(response.data['results'][0]['user_id'], self.patient_user.pk)
+		response = staff.get(url, {'user': User.objects.get(username='doctor23').pk, 'from': '2000-01-01'})
+		self.assertEqual([event['model'] for event in response.data['results']], ['healthrecord'])
+		self.assertEqual(staff.get(url, {'action': 'peek'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+	@override_settings(PHR_AUDIT_WRITER_THREAD=True, PHR_AUDIT_BATCH_SIZE=3, PHR_AUDIT_FLUSH_INTERVAL=0.05)
+	def test_writer_thread_batches_with_backpressure(self):
+		written, gate = [], threading.Event()
+
+		def write(entries):
+			gate.wait()
+			written.append(sum(len(entry[-1]) for entry in entries))
+
+		log = AuditLog(write=write, maxsize=2)
+		entry = (1, 'doctor', datetime.now(timezone.utc), (('read', 'patient', 1), ('read', 'patient', 2)))
+		for _ in range(3):
+			log.put(entry)
+		producer = threading.Thread(target=lambda: [log.put(entry) for _ in range(3)])
+		producer.start()
+		producer.join(0.2)
+		# The writer is stuck and the queue is full, so the producer waits.
+		self.assertTrue(producer.is_alive())
+		gate.set()
+		producer.join(5)
+		self.assertFalse(producer.is_alive())
+		log.close()
+		self.assertEqual(sum(written), 12)
+		self.assertTrue(all(events <= 4 for events in written))
+
+
+
+class IdempotencyKeyTestCase(APITestCase):
+	def setUp(self):
+		for username in ('patient31', 'patient32'):
+			user = User.objects.create_user(username=username, password='pass123')
+			UserProfile.objects.filter(user=user).update(role='patient')
+		self.patient = Patient.objects.create(
+			first_name='Idem', last_name='Patient', date_of_birth='1980-01-01', email='idem@example.com')
+		self.doctor = Doctor.objects.create(first_name='Idem', last_name='Doc', email='idemdoc@example.com')
+		self.client = self._client('patient31')
+		self.url = reverse('appointment-list-create')
+		self.body = {'patient_id': self.patient.pk, 'doctor_id': self.doctor.pk, 'appointment_datetime': '2024-06-01T09:00:00Z'}
+
+	def _client(self, username):
+		token = APIClient().post(reverse('token_obtain_pair'), {'username': username, 'password': 'pass123'}).data['access']
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _post(self, client=None, key='retry-1', body=None, url=None):
+		return (client or self.client).post(url or self.url, body or self.body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+	def test_retry_replays_first_response(self):
+		first = self._post()
+		self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+		with CaptureQueriesContext(connection) as ctx:
+			retry = self._post()
+		self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(retry.content, first.content)
+		self.assertEqual(retry['Content-Type'], first['Content-Type'])
+		self.assertEqual(retry['Idempotent-Replayed'], 'true')
+		self.assertFalse([q for q in ctx.captured_queries if 'records_appointment' in q['sql']])
+		self.assertEqual(Appointment.objects.count(), 1)
+		record = IdempotencyKey.objects.get()
+		self.assertLess(len(record.body), len(first.content))
+
+		# Another key runs the view again (and hits the double-booking check).
+		self.assertEqual(self._post(key='retry-2').status_code, status.HTTP_400_BAD_REQUEST)
+		other = self._post(client=self._client('patient32'), body={**self.body, 'appointment_datetime': '2024-06-01T10:00:00Z'})
+		self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(Appointment.objects.count(), 2)
+
+	def test_key_reuse_and_errors(self):
+		invalid = {**self.body, 'doctor_id': 0}
+		first = self._post(body=invalid)
+		self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self._post(body=invalid).content, first.content)
+		self.assertEqual(self._post().status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+		self.assertEqual(self._post(key='x' * 256).status_code, status.HTTP_400_BAD_REQUEST)
+
+		response = self._post(key='bulk-1', body=[self.body], url=reverse('appointment-bulk'))
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(self._post(key='bulk-1', body=[self.body], url=reverse('appointment-bulk')).content, response.content)
+		self.assertEqual(Appointment.objects.count(), 1)
+
+	@override_settings(PHR_IDEMPOTENCY_WAIT=0.1, PHR_IDEMPOTENCY_LOCK_TIMEOUT=60)
+	def test_pending_duplicate_waits_then_conflicts(self):
+		self._post()
+		now = datetime.now(timezone.utc)
+		IdempotencyKey.objects.update(status_code=None, body=None, created_at=now)
+		self.assertEqual(self._post().status_code, status.HTTP_409_CONFLICT)
+		# A request that died without finishing leaves a stale claim, which is taken over.
+		IdempotencyKey.objects.update(created_at=now - timedelta(minutes=5))
+		self.assertEqual(self._post().status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(Appointment.objects.count(), 1)
+
+	def test_expired_keys_are_purged(self):
+		self._post()
+		self._post(key='retry-2', body={**self.body, 'appointment_datetime': '2024-06-02T09:00:00Z'})
+		IdempotencyKey.objects.filter(key='retry-1').update(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+		self.assertEqual(purge_expired_keys(batch_size=1), 1)
+		self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['retry-2'])
+		self.assertEqual(self._post().status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ArchiveTestCase(APITestCase):
+	def setUp(self):
+		for username, role in (('patient33', 'patient'), ('doctor25', 'doctor')):
+			user = User.objects.create_user(username=username, password='pass123')
+			UserProfile.objects.filter(user=user).update(role=role)
+		self.patient = Patient.objects.create(
+			first_name='Cold', last_name='Patient', date_of_birth='1950-01-01', email='cold@example.com')
+		self.doctor = Doctor.objects.create(first_name='Cold', last_name='Doc', email='colddoc@example.com')
+		now = datetime.now(timezone.utc)
+		self.old = Appointment.objects.create(
+			patient=self.patient, doctor=self.doctor, appointment_datetime=datetime(2020, 3, 1, 9, tzinfo=timezone.utc),
+			status='completed')
+		self.old_scheduled = Appointment.objects.create(
+			patient=self.patient, doctor=self.doctor, appointment_datetime=datetime(2020, 3, 2, 9, tzinfo=timezone.utc))
+		self.recent = Appointment.objects.create(
+			patient=self.patient, doctor=self.doctor, appointment_datetime=now - timedelta(days=10), status='completed')
+		self.prescriptions = [
+			Prescription.objects.create(appointment=self.old, medication=medication, dosage='1/day')
+			for medication in ('Aspirin', 'Statin')
+		]
+		self.recent_prescription = Prescription.objects.create(appointment=self.recent, medication='Aspirin', dosage='2/day')
+		self.old_record = HealthRecord.objects.create(
+			patient=self.patient, doctor=self.doctor, record_date='2015-05-05', diagnosis='Old fracture')
+		self.recent_record = HealthRecord.objects.create(
+			patient=self.patient, doctor=self.doctor, record_date=(now - timedelta(days=30)).date(), diagnosis='Flu')
+
+	def _client(self, username):
+		token = APIClient().post(reverse('token_obtain_pair'), {'username': username, 'password': 'pass123'}).data['access']
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _ids(self, client, url, **params):
+		response = client.get(url, params)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		return [item['id'] for item in response.data['results']]
+
+	def test_archive_moves_rows_with_prescriptions(self):
+		moved = archive_records(chunk_size=1)
+		self.assertEqual(moved, {'appointments': 1, 'health_records': 1})
+		self.assertEqual(list(Appointment.objects.order_by('id').values_list('id', flat=True)), [self.old_scheduled.pk, self.recent.pk])
+		self.assertEqual(list(ArchivedAppointment.objects.values_list('id', 'status')), [(self.old.pk, 'completed')])
+		self.assertEqual(
+			sorted(ArchivedPrescription.objects.values_list('id', 'appointment_id')),
+			[(prescription.pk, self.old.pk) for prescription in self.prescriptions])
+		self.assertEqual(list(Prescription.objects.values_list('id', flat=True)), [self.recent_prescription.pk])
+		self.assertEqual(list(ArchivedHealthRecord.objects.values_list('id', flat=True)), [self.old_record.pk])
+		with connection.cursor() as cursor:
+			cursor.execute('PRAGMA foreign_key_check')
+			self.assertEqual(cursor.fetchall(), [])
+		# Moves count in the archive tables, so the summaries are unchanged.
+		self.assertEqual(stats_differences(), [])
+		self.assertEqual(MedicationStats.objects.get(medication='Aspirin').prescriptions, 2)
+
+		# Moved rows no longer qualify, so a re-run (or an interrupted one) picks up where it stopped.
+		self.assertEqual(archive_records(), {'appointments': 0, 'health_records': 0})
+		self.patient.delete()
+		self.assertFalse(ArchivedAppointment.objects.exists() or ArchivedPrescription.objects.exists())
+		self.assertEqual(stats_differences(), [])
+
+	def test_include_archived_unions_archive(self):
+		patient_client, doctor_client = self._client('patient33'), self._client('doctor25')
+		appointments = reverse('appointment-list-create')
+		hot = [self.old.pk, self.old_scheduled.pk, self.recent.pk]
+		self.assertEqual(self._ids(patient_client, appointments), hot)
+		archive_records()
+
+		# The cached page was evicted by the move.
+		self.assertEqual(self._ids(patient_client, appointments), hot[1:])
+		self.assertEqual(self._ids(patient_client, appointments, include_archived='true'), hot)
+		self.assertEqual(self._ids(patient_client, appointments, include_archived='true', status='completed'), [self.old.pk, self.recent.pk])
+		self.assertEqual(self._ids(
+			doctor_client, reverse('prescription-list-create'), include_archived='1'),
+			[prescription.pk for prescription in self.prescriptions] + [self.recent_prescription.pk])
+		self.assertEqual(self._ids(doctor_client, reverse('prescription-list-create')), [self.recent_prescription.pk])
+		records = reverse('healthrecord-list-create')
+		self.assertEqual(self._ids(patient_client, records), [self.recent_record.pk])
+		self.assertEqual(self._ids(patient_client, records, include_archived='yes'), [self.old_record.pk, self.recent_record.pk])
+
+		detail = reverse('appointment-detail', args=[self.old.pk])
+		self.assertEqual(patient_client.get(detail).status_code, status.HTTP_404_NOT_FOUND)
+		response = patient_client.get(detail, {'include_archived': 'true', 'expand': 'patient'})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['patient']['id'], self.patient.pk)
+		# Archived rows are read-only.
+		self.assertEqual(patient_client.delete(f'{detail}?include_archived=true').status_code, status.HTTP_404_NOT_FOUND)
+		self.assertEqual(patient_client.get(appointments, {'include_archived': 'maybe'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+		timeline = reverse('patient-timeline', args=[self.patient.pk])
+		self.assertEqual(len(patient_client.get(timeline).data['results']), 4)
+		self.assertEqual(len(patient_client.get(timeline, {'include_archived': 'true'}).data['results']), 8)
+
+	def test_archive_records_command(self):
+		out = io.StringIO()
+		call_command('archive_records', '--dry-run', stdout=out)
+		self.assertIn('Would archive 1 appointments and 1 health records.', out.getvalue())
+		self.assertFalse(ArchivedAppointment.objects.exists())
+		with self.assertRaises(CommandError):
+			call_command('archive_records', '--chunk-size', '1000', stdout=io.StringIO())
+		call_command('archive_records', '--appointment-days', '0', '--chunk-size', '1', stdout=out)
+		self.assertIn('Archived 2 appointments and 1 health records', out.getvalue())
+		self.assertEqual(list(Appointment.objects.values_list('id', flat=True)), [self.old_scheduled.pk])
+
+
+class AsyncReadViewTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient18', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.token = APIClient().post(
+			reverse('token_obtain_pair'), {'username': 'patient18', 'password': 'pass123'}).data['access']
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+		self.patient = Patient.objects.create(
+			first_name='Async', last_name='Read', date_of_birth='1975-01-01', email='async@example.com')
+		self.doctor = Doctor.objects.create(first_name='Async', last_name='Doc', email='asyncdoc@example.com')
+		for day in range(1, 6):
+			Appointment.objects.create(
+				patient=self.patient, doctor=self.doctor, appointment_datetime=f'2025-12-0{day}T10:00:00Z')
+		self.factory = AsyncRequestFactory()
+
+	async def _async_get(self, view_class, path, params=None, **headers):
+		view = AsyncReadView.as_view(view_class=view_class)
+		request = self.factory.get(path, params or {}, headers={'Authorization': f'Bearer {self.token}', **headers})
+		match = resolve(path)
+		return await view(request, *match.args, **match.kwargs)
+
+	def _sync_get(self, path, params=None, **headers):
+		return self.client.get(path, params or {}, **headers)
+
+	async def test_list_and_detail_match_sync_views(self):
+		cases = [
+			(views.AppointmentListCreateView, reverse('appointment-list-create'), {'page_size': 2, 'expand': 'patient'}),
+			(views.AppointmentListCreateView, reverse('appointment-list-create'), {'fields': 'id,status', 'status': 'scheduled'}),
+			(views.PatientRetrieveUpdateDestroyView, reverse('patient-detail', args=[self.patient.id]), {}),
+			(views.PatientListCreateView, reverse('patient-list-create'), {'ids': f'{self.patient.id},0'}),
+		]
+		for view_class, path, params in cases:
+			sync_response = await sync_to_async(self._sync_get)(path, params)
+			await sync_to_async(cache.clear)()
+			async_response = await self._async_get(view_class, path, params)
+			self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+			self.assertEqual(async_response.content, sync_response.content)
+			self.assertEqual(async_response['ETag'], sync_response['ETag'])
+			self.assertEqual(async_response['X-Cache'], 'MISS')
+			self.assertEqual((await self._async_get(view_class, path, params))['X-Cache'], 'HIT')
+
+	async def test_cursor_pages_and_conditional_get(self):
+		path = reverse('appointment-list-create')
+		first = json.loads((await self._async_get(views.AppointmentListCreateView, path, {'page_size': 3})).content)
+		cursor = first['next'].split('cursor=')[1].split('&')[0]
+		second = await self._async_get(views.AppointmentListCreateView, path, {'page_size': 3, 'cursor': cursor})
+		self.assertEqual(len(json.loads(second.content)['results']), 2)
+		response = await self._async_get(
+			views.AppointmentListCreateView, path, {'page_size': 3, 'cursor': cursor}, **{'If-None-Match': second['ETag']})
+		self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+	async def test_errors(self):
+		response = await self._async_get(
+			views.PatientRetrieveUpdateDestroyView, reverse('patient-detail', args=[999999]))
+		self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+		response = await self._async_get(views.DoctorListCreateView, reverse('doctor-list-create'))
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+	async def test_writes_are_delegated(self):
+		view = AsyncReadView.as_view(view_class=views.PatientRetrieveUpdateDestroyView)
+		path = reverse('patient-detail', args=[self.patient.id])
+		request = self.factory.patch(
+			path, {'phone': '42'}, content_type='application/json', headers={'Authorization': f'Bearer {self.token}'})
+		response = await view(request, pk=self.patient.id)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual((await Patient.objects.aget(pk=self.patient.id)).phone, '42')
+
+	async def test_cache_and_full_audit_queue_stay_off_the_loop(self):
+		loop_thread, calls = threading.get_ident(), []
+		put = audit_log.put
+
+		def tracked(name, function):
+			def call(*args):
+				calls.append((name, args[1:], threading.get_ident() == loop_thread))
+				return function(*args)
+			return call
+
+		full = mock.Mock(wraps=audit_log._queue)
+		full.put_nowait.side_effect = [queue.Full, None]
+		full.full.return_value = False
+		with mock.patch('records.async_views.get_cached', tracked('get_cached', get_cached)), \
+				mock.patch('records.async_views.set_cached', tracked('set_cached', set_cached)), \
+				mock.patch.object(audit_log, 'put', lambda entry, block=True: tracked('put', put)(entry, block)), \
+				mock.patch.object(audit_log, '_queue', full):
+			response = await self._async_get(
+				views.PatientRetrieveUpdateDestroyView, reverse('patient-detail', args=[self.patient.id]))
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual([(name, on_loop) for name, _, on_loop in calls], [
+			('get_cached', False), ('set_cached', False), ('put', True), ('put', False)])
+		self.assertEqual(calls[2][1], (False,))
+		audit_log.discard()
+
+	@override_settings(PHR_JWT_REVOCATION_SYNC_INTERVAL=0)
+	async def test_revocation_sync_runs_off_the_loop(self):
+		loop_thread, synced_on_loop = threading.get_ident(), []
+		remember = revocations._remember
+
+		def tracked(rows):
+			synced_on_loop.append(threading.get_ident() == loop_thread)
+			return remember(rows)
+
+		view_class = views.PatientRetrieveUpdateDestroyView
+		path = reverse('patient-detail', args=[self.patient.id])
+		with mock.patch.object(revocations, '_remember', tracked), \
+				mock.patch.object(view_class, 'initial', autospec=True, side_effect=view_class.initial) as initial:
+			response = await self._async_get(view_class, path)
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			# Another worker revokes the user; the next request picks it up.
+			await TokenRevocation.objects.acreate(kind='user', subject=str(self.patient_user.pk), revoked_at=datetime.now(timezone.utc))
+			response = await self._async_get(view_class, path)
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+		self.assertEqual(synced_on_loop, [False, False])
+		# No SynchronousOnlyOperation fallback re-ran initial() in a thread.
+		self.assertEqual(initial.call_count, 2)
+
+	async def test_fast_list_path(self):
+		path = reverse('appointment-list-create')
+		with self.settings(PHR_FAST_LIST_SERIALIZATION=True, PHR_RESPONSE_CACHE_ENABLED=False):
+			sync_response = await sync_to_async(self._sync_get)(path, {'expand': 'doctor'})
+			async_response = await self._async_get(views.AppointmentListCreateView, path, {'expand': 'doctor'})
+		self.assertEqual(async_response.content, sync_response.content)
+		self.assertEqual(async_response['ETag'], sync_response['ETag'])
+
+
+@override_settings(PHR_REPLICA_DATABASES=['replica1', 'replica2'], PHR_REPLICA_SELECTION='round_robin')
+class ReplicaRoutingTestCase(APITestCase):
+	def setUp(self):
+		self.factory = RequestFactory()
+		self.router = ReplicaRouter()
+		self.user = User.objects.create_user(username='patient20', password='pass123')
+		self.other_user = User.objects.create_user(username='patient21', password='pass123')
+
+	def _route(self, method, user=None, writes=False):
+		"""Aliases ``ReplicaRouter`` picks for records reads during a request, before and after an optional write."""
+		request = self.factory.generic(method, '/api/patients/')
+		request.user = user or self.user
+		aliases = []
+
+		def view(request):
+			aliases.append(self.router.db_for_read(Patient))
+			if writes:
+				self.assertEqual(self.router.db_for_write(Patient), 'default')
+				aliases.append(self.router.db_for_read(Patient))
+			return HttpResponse()
+
+		ReplicaRoutingMiddleware(view)(request)
+		return aliases
+
+	def test_safe_reads_go_to_replicas_in_turn(self):
+		first, second = self._route('GET'), self._route('HEAD')
+		self.assertEqual({first[0], second[0]}, {'replica1', 'replica2'})
+		self.assertEqual(self._route('POST'), ['default'])
+		# Other apps and work outside requests stay on the primary.
+		self.assertIsNone(self.router.db_for_read(Patient))
+		self.assertEqual(routing.replicas.active, {'replica1': 0, 'replica2': 0})
+
+	def test_writes_stick_to_primary(self):
+		self.assertEqual(self._route('GET', writes=True)[1], 'default')
+		self.assertEqual(self._route('GET'), ['default'])
+		self.assertIn(self._route('GET', user=self.other_user)[0], ('replica1', 'replica2'))
+		with self.settings(PHR_PRIMARY_STICKY_SECONDS=0):
+			self._route('PATCH', user=self.other_user, writes=True)
+		self.assertIn(self._route('GET', user=self.other_user)[0], ('replica1', 'replica2'))
+		cache.delete(routing.pin_key(self.user.pk))
+		self.assertIn(self._route('GET')[0], ('replica1', 'replica2'))
+
+	def test_lagging_replica_does_not_refill_cache(self):
+		UserProfile.objects.filter(user=self.user).update(role='patient')
+		patient = Patient.objects.create(first_name='Lag', last_name='Patient', date_of_birth='1980-01-01', email='lag@example.com')
+		client = APIClient()
+		client.force_authenticate(User.objects.get(pk=self.user.pk))
+		url = reverse('patient-detail', args=[patient.pk])
+		with self.settings(PHR_REPLICA_DATABASES=[]), mock.patch('records.views.set_cached', wraps=set_cached) as stored:
+			stale = client.get(url).data
+		key, _, tags = stored.call_args[0]
+		self.assertEqual(client.patch(url, {'first_name': 'Fresh'}, format='json').status_code, status.HTTP_200_OK)
+
+		# Another user's read from a replica that has not applied the write yet.
+		request = self.factory.get(url)
+		request.user = self.other_user
+
+		def lagging_read(request):
+			routing._current.get().read_alias()
+			set_cached(key, stale, tags)
+			return HttpResponse()
+
+		ReplicaRoutingMiddleware(lagging_read)(request)
+		self.assertIsNone(get_cached(key))
+		# Even with a stale entry in place, the pinned writer reads the primary.
+		set_cached(key, stale, tags)
+		response = client.get(url)
+		self.assertEqual(response.data['first_name'], 'Fresh')
+		self.assertNotIn('X-Cache', response)
+		with self.settings(PHR_PRIMARY_STICKY_SECONDS=0):
+			ReplicaRoutingMiddleware(lagging_read)(request)
+		self.assertEqual(get_cached(key), stale)
+
+	def test_least_loaded_selection(self):
+		pool = routing.ReplicaPool()
+		aliases = ['replica1', 'replica2']
+		held = [pool.acquire(aliases, 'least_loaded') for _ in range(3)]
+		self.assertEqual(held, ['replica1', 'replica2', 'replica1'])
+		pool.release('replica1')
+		pool.release('replica1')
+		# Round robin would be back at replica2; replica1 now has no requests.
+		self.assertEqual(pool.acquire(aliases, 'least_loaded'), 'replica1')
+
+
+# Only the requests under test are sampled, not the token requests in setUp.
+@override_settings(PHR_METRICS_SAMPLE_RATE=0)
+class InstrumentationTestCase(APITestCase):
+	def setUp(self):
+		self.patient_user = User.objects.create_user(username='patient19', password='pass123')
+		UserProfile.objects.filter(user=self.patient_user).update(role='patient')
+		self.staff_user = User.objects.create_user(username='staff2', password='pass123', is_staff=True)
+		self.patient_client = self._auth_client(self._get_token('patient19', 'pass123'))
+		self.staff_client = self._auth_client(self._get_token('staff2', 'pass123'))
+		self.patient = Patient.objects.create(
+			first_name='Timed', last_name='Patient', date_of_birth='1980-01-01', email='timed@example.com')
+		self.doctor = Doctor.objects.create(first_name='Timed', last_name='Doc', email='timeddoc@example.com')
+		for day in range(1, 4):
+			Appointment.objects.create(
+				patient=self.patient, doctor=self.doctor, appointment_datetime=f'2025-11-0{day}T10:00:00Z')
+
+	def _get_token(self, username, password):
+		return APIClient().post(reverse('token_obtain_pair'), {'username': username, 'password': password}).data['access']
+
+	def _auth_client(self, token):
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+		return client
+
+	def _timings(self, response):
+		return {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+
+	def test_server_timing_header_and_metrics(self):
+		with self.settings(PHR_METRICS_SAMPLE_RATE=1.0, PHR_RESPONSE_CACHE_ENABLED=False):
+			with CaptureQueriesContext(connection) as queries:
+				response = self.patient_client.get(reverse('appointment-list-create'), {'expand': 'doctor'})
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			timings = self._timings(response)
+			self.assertEqual(set(timings), {'db', 'auth', 'serialize', 'render', 'total'})
+			query_count = len(queries)
+			self.assertIn(f'desc="{query_count} queries"', timings['db'])
+			self.patient_client.get(reverse('appointment-detail', args=[self.patient.appointments.first().id]))
+
+			metrics = self.staff_client.get(reverse('metrics')).data['endpoints']
+		listing = metrics['GET /api/appointments/']
+		self.assertEqual(listing['count'], 1)
+		self.assertEqual(listing['mean_queries'], query_count)
+		self.assertLessEqual(listing['p50_ms'], listing['p99_ms'])
+		self.assertGreater(listing['mean_serialize_ms'], 0)
+		self.assertEqual(metrics['GET /api/appointments/<int:pk>/']['count'], 1)
+
+	def test_streaming_responses_are_recorded_when_sent(self):
+		endpoint = 'GET /api/patients/<int:pk>/export/'
+		with self.settings(PHR_METRICS_SAMPLE_RATE=1.0):
+			response = self.patient_client.get(reverse('patient-export', args=[self.patient.id]))
+			timings = self._timings(response)
+			self.assertIn('desc="until headers"', timings['total'])
+			self.assertNotIn(endpoint, self.staff_client.get(reverse('metrics')).data['endpoints'])
+			b''.join(response.streaming_content)
+			export = self.staff_client.get(reverse('metrics')).data['endpoints'][endpoint]
+		# The sample includes the queries and time spent producing the body.
+		self.assertEqual(export['count'], 1)
+		self.assertGreater(export['mean_queries'], int(timings['db'].split('desc="')[1].split()[0]))
+		self.assertGreater(export['mean_ms'], float(timings['total'].split('dur=')[1].split(';')[0]))
+
+	def test_unsampled_requests_are_not_recorded(self):
+		with self.settings(PHR_METRICS_SAMPLE_RATE=0):
+			response = self.patient_client.get(reverse('appointment-list-create'))
+			self.assertNotIn('Server-Timing', response)
+		with self.settings(PHR_METRICS_SAMPLE_RATE=1.0):
+			self.assertEqual(self.staff_client.get(reverse('metrics')).data['endpoints'], {})
+
+	def test_metrics_require_staff(self):
+		self.assertEqual(self.patient_client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+		with self.settings(PHR_METRICS_SAMPLE_RATE=1.0):
+			self.patient_client.get(reverse('appointment-list-create'))
+		self.assertEqual(self.staff_client.delete(reverse('metrics')).status_code, status.HTTP_204_NO_CONTENT)
+		self.assertEqual(self.staff_client.get(reverse('metrics')).data['endpoints'], {})
+
+	async def test_async_views_attribute_worker_thread_queries(self):
+		path = reverse('appointment-list-create')
+		middleware = InstrumentationMiddleware(AsyncReadView.as_view(view_class=views.AppointmentListCreateView))
+		token = await sync_to_async(self._get_token)('patient19', 'pass123')
+		request = AsyncRequestFactory().get(path, headers={'Authorization': f'Bearer {token}'})
+		request.resolver_match = resolve(path)
+		with self.settings(PHR_METRICS_SAMPLE_RATE=1.0, PHR_RESPONSE_CACHE_ENABLED=False):
+			response = await middleware(request)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertNotIn('desc="0 queries"', self._timings(response)['db'])
+
+	def test_histogram_percentiles(self):
+		histogram = LatencyHistogram()
+		for ms in range(1, 101):
+			histogram.add(float(ms))
+		self.assertAlmostEqual(histogram.percentile(0.50), 50, delta=5)
+		self.assertAlmostEqual(histogram.percentile(0.95), 95, delta=9.5)
+		self.assertAlmostEqual(histogram.percentile(0.99), 99, delta=9.9)
+		self.assertLessEqual(histogram.percentile(1.0), 100)
+		self.assertIsNone(LatencyHistogram().percentile(0.5))
+
+
+class BenchmarkTestCase(APITransactionTestCase):
+	# Transactional, so the benchmark's client threads see the seeded rows.
+	def test_seed_is_deterministic(self):
+		created = seed_dataset(patients=5, doctors=2, appointments=8, prescriptions=6, health_records=4, seed=7)
+		self.assertEqual(len(created['appointments']), 8)
+		rows = list(Appointment.objects.order_by('pk').values_list('patient_id', 'doctor_id', 'appointment_datetime', 'status'))
+		slots = Appointment.objects.values_list('doctor_id', 'appointment_datetime')
+		self.assertEqual(len(set(slots)), 8)
+		for model in (Prescription, HealthRecord, Appointment, Doctor, Patient):
+			model.objects.all().delete()
+		seed_dataset(patients=5, doctors=2, appointments=8, prescriptions=6, health_records=4, seed=7)
+		self.assertEqual(
+			list(Appointment.objects.order_by('pk').values_list('patient_id', 'doctor_id', 'appointment_datetime', 'status')), rows)
+
+	def test_benchmark_covers_every_route(self):
+		output = io.StringIO()
+		call_command(
+			'benchmark_api', '--seed', '--patients', '10', '--doctors', '2', '--appointments', '20',
+			'--prescriptions', '20', '--health-records', '10', '--requests', '2', '--concurrency', '1', stdout=output)
+		report = json.loads(output.getvalue())
+		self.assertEqual(report['rows']['appointments'], 20 + 2 + 2 * 10)
+		names = {route.split(' ', 1)[1] for route in report['routes']}
+		self.assertEqual(names, {pattern.name for pattern in urls.urlpatterns} | {'token_obtain_pair'})
+		for route, result in report['routes'].items():
+			self.assertEqual(result['errors'], 0, route)
+			self.assertEqual(result['requests'], 2)
+			self.assertIsNotNone(result['mean_queries'])
+		self.assertEqual(report['routes']['GET patient-detail']['mean_queries'], 1)
+
+	def test_mixed_workload(self):
+		output = io.StringIO()
+		call_command(
+			'benchmark_api', 'GET patient-detail', 'PATCH patient-detail', 'POST healthrecord-list-create', '--mixed',
+			'--seed', '--patients', '10', '--doctors', '2', '--appointments', '10', '--prescriptions', '5',
+			'--health-records', '5', '--requests', '12', '--concurrency', '1', stdout=output)
+		report = json.loads(output.getvalue())
+		self.assertEqual(list(report['routes']), ['mixed'])
+		self.assertEqual(report['routes']['mixed']['requests'], 12)
+		self.assertEqual(report['routes']['mixed']['errors'], 0)
+		self.assertEqual(HealthRecord.objects.count(), 5 + 4)
+
+
+class DatabaseProfileTestCase(APITestCase):
+	def test_production_pragmas(self):
+		if connection.vendor != 'sqlite':
+			self.skipTest('SQLite only.')
+		# The suite runs on the default (basic) profile; open a connection with
+		# the production settings on a scratch file instead.
+		with tempfile.TemporaryDirectory() as directory:
+			wrapper = type(connections['default'])(
+				{**connection.settings_dict, **settings.PHR_SQLITE_PRODUCTION, 'NAME': str(Path(directory) / 'profile.sqlite3')},
+				alias='profile')
+			try:
+				with wrapper.cursor() as cursor:
+					pragmas = {}
+					for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store', 'cache_size'):
+						cursor.execute(f'PRAGMA {name}')
+						pragmas[name] = cursor.fetchone()[0]
+				self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+			finally:
+				wrapper.close()
+		# synchronous NORMAL is 1, temp_store MEMORY is 2.
+		self.assertEqual(pragmas, {
+			'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2, 'cache_size': -64000})
+
+	def test_basic_profile_is_the_default(self):
+		self.assertEqual(settings.PHR_DB_PROFILE, 'basic')
+		self.assertNotIn('init_command', settings.DATABASES['default'].get('OPTIONS', {}))
+
+	def test_immediate_transactions_skip_booking_lock_update(self):
+		doctor = Doctor.objects.create(first_name='Lock', last_name='Free', specialty='Cardiology', email='lockfree@example.com')
+		with mock.patch.object(connections['default'], 'transaction_mode', 'IMMEDIATE'), \
+				transaction.atomic(), CaptureQueriesContext(connection) as queries:
+			lock_doctors([doctor.pk])
+		self.assertEqual(len(queries), 0)
+
+
+class SeedCommandTestCase(APITestCase):
+	def test_seed_phr(self):
+		output = io.StringIO()
+		call_command(
+			'seed_phr', '--patients', '30', '--doctors', '3', '--appointments', '60', '--prescriptions', '40',
+			'--health-records', '25', '--chunk-size', '7', '--password', 'seedpass1', stdout=output)
+		self.assertIn('Seeded 224 rows', output.getvalue())
+		self.assertEqual(HealthRecord.objects.count(), 25)
+		self.assertEqual(UserProfile.objects.filter(role='doctor').count(), 3)
+		self.assertFalse(Prescription.objects.exclude(appointment__in=Appointment.objects.all()).exists())
+		slots = Appointment.objects.values_list('doctor_id', 'appointment_datetime')
+		self.assertEqual(len(set(slots)), 60)
+		self.assertEqual(Appointment.objects.first().version, 1)
+		# The summaries were rebuilt after the load and their triggers reinstalled.
+		self.assertEqual(stats_differences(), [])
+		Prescription.objects.create(appointment=Appointment.objects.first(), medication='Aspirin', dosage='1/day')
+		self.assertEqual(stats_differences(), [])
+
+		def stats_triggers():
+			with connection.cursor() as cursor:
+				cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'records_stats_%'")
+				return cursor.fetchone()[0]
+		installed, during_load = stats_triggers(), set()
+		seed_dataset(patients=5, doctors=2, appointments=20, prescriptions=10, health_records=0, seed=1,
+			log=lambda message: during_load.add(stats_triggers()))
+		self.assertEqual(during_load, {0})
+		self.assertEqual(stats_triggers(), installed)
+		self.assertEqual(stats_differences(), [])
+
+		# Seeded rows are searchable and seeded users can log in.
+		search_term = HealthRecord.objects.first().diagnosis.split()[-1]
+		patient = Patient.objects.first()
+		response = self.client.post(reverse('token_obtain_pair'), {'username': f'patient-{patient.pk}', 'password': 'seedpass1'})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+		response = self.client.get(reverse('healthrecord-search'), {'q': search_term})
+		self.assertGreater(len(response.data['results']), 0)
+		self.assertEqual(self.client.get(reverse('patient-detail', args=[patient.pk])).data['email'], patient.email)
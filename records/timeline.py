@@ -0,0 +1,106 @@
+import heapq
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, time, timezone
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .fastpath import ValuesReader
+from .models import (
+	Appointment, Prescription, HealthRecord, AppointmentWithArchive, PrescriptionWithArchive, HealthRecordWithArchive,
+)
+from .serializers import AppointmentSerializer, PrescriptionSerializer, HealthRecordSerializer
+
+
+class TimelineSource:
+	"""
+	One sorted stream of timeline events: a queryset ordered by
+	``(timestamp_field, id)`` and the serializer used to render its rows.
+	"""
+	def __init__(self, event_type, queryset, serializer_class, timestamp_field, is_date=False):
+		self.event_type = event_type
+		self.queryset = queryset
+		self.serializer_class = serializer_class
+		self.timestamp_field = timestamp_field
+		self.is_date = is_date
+
+	def to_timestamp(self, value):
+		if self.is_date:
+			return datetime.combine(value, time.min, tzinfo=timezone.utc)
+		return value
+
+	def after(self, cursor):
+		"""Filter for rows whose (timestamp, type, id) key sorts after ``cursor``."""
+		timestamp, event_type, pk = cursor
+		field = self.timestamp_field
+		if self.is_date:
+			timestamp = timestamp.astimezone(timezone.utc)
+			if timestamp.time() != time.min:
+				# No date falls strictly inside a day, so only later days remain.
+				return Q(**{f'{field}__gt': timestamp.date()})
+			timestamp = timestamp.date()
+		if self.event_type > event_type:
+			return Q(**{f'{field}__gte': timestamp})
+		if self.event_type == event_type:
+			return Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk})
+		return Q(**{f'{field}__gt': timestamp})
+
+	def events(self, cursor, limit):
+		reader = ValuesReader(self.serializer_class())
+		queryset = self.queryset.order_by(self.timestamp_field, 'id')
+		if cursor is not None:
+			queryset = queryset.filter(self.after(cursor))
+		for row in reader.values(queryset, [self.timestamp_field])[:limit]:
+			timestamp = self.to_timestamp(row[self.timestamp_field])
+			yield (timestamp, self.event_type, row['id']), reader.render_row(row)
+
+
+def timeline_sources(patient_id, include_archived=False):
+	appointments, health_records, prescriptions = (
+		(AppointmentWithArchive, HealthRecordWithArchive, PrescriptionWithArchive) if include_archived
+		else (Appointment, HealthRecord, Prescription))
+	return [
+		TimelineSource(
+			'appointment', appointments.objects.filter(patient_id=patient_id),
+			AppointmentSerializer, 'appointment_datetime'),
+		TimelineSource(
+			'health_record', health_records.objects.filter(patient_id=patient_id),
+			HealthRecordSerializer, 'record_date', is_date=True),
+		TimelineSource(
+			'prescription', prescriptions.objects.filter(appointment__patient_id=patient_id),
+			PrescriptionSerializer, 'appointment__appointment_datetime'),
+	]
+
+
+def timeline_page(patient_id, cursor, limit, include_archived=False):
+	"""
+	Return up to ``limit`` events after ``cursor`` and whether more follow,
+	from the hot tables or, with ``include_archived``, the archive views.
+
+	Each source contributes at most ``limit + 1`` rows from an ordered,
+	indexed query; ``heapq.merge`` interleaves the already-sorted streams, so
+	the full history is never loaded or sorted in Python.
+	"""
+	streams = [source.events(cursor, limit + 1) for source in timeline_sources(patient_id, include_archived)]
+	merged = heapq.merge(*streams, key=lambda event: event[0])
+	events = [event for _, event in zip(range(limit + 1), merged)]
+	return events[:limit], len(events) > limit
+
+
+def encode_cursor(key):
+	timestamp, event_type, pk = key
+	payload = json.dumps([timestamp.isoformat(), event_type, pk], separators=(',', ':'))
+	return urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(value):
+	"""Decode a cursor produced by ``encode_cursor``; raises ValueError if invalid."""
+	try:
+		timestamp, event_type, pk = json.loads(urlsafe_b64decode(value.encode()))
+		timestamp = parse_datetime(timestamp)
+	except (TypeError, ValueError):
+		raise ValueError('Invalid cursor')
+	if timestamp is None or timestamp.tzinfo is None or not isinstance(event_type, str) or not isinstance(pk, int):
+		raise ValueError('Invalid cursor')
+	return timestamp, event_type, pk
@@ -1,24 +1,49 @@
 from django.urls import path
 from . import views
+from .async_views import read_view
 
 urlpatterns = [
     # Patient endpoints
-    path('patients/', views.PatientListCreateView.as_view(), name='patient-list-create'),
-    path('patients/<int:pk>/', views.PatientRetrieveUpdateDestroyView.as_view(), name='patient-detail'),
+    path('patients/', read_view(views.PatientListCreateView), name='patient-list-create'),
+    path('patients/<int:pk>/', read_view(views.PatientRetrieveUpdateDestroyView), name='patient-detail'),
+    path('patients/<int:pk>/export/', views.PatientExportView.as_view(), name='patient-export'),
+    path('patients/<int:pk>/timeline/', views.PatientTimelineView.as_view(), name='patient-timeline'),
 
     # Doctor endpoints
-    path('doctors/', views.DoctorListCreateView.as_view(), name='doctor-list-create'),
-    path('doctors/<int:pk>/', views.DoctorRetrieveUpdateDestroyView.as_view(), name='doctor-detail'),
+    path('doctors/', read_view(views.DoctorListCreateView), name='doctor-list-create'),
+    path('doctors/<int:pk>/', read_view(views.DoctorRetrieveUpdateDestroyView), name='doctor-detail'),
+    path('doctors/<int:pk>/availability/', views.DoctorAvailabilityView.as_view(), name='doctor-availability'),
 
     # Appointment endpoints
-    path('appointments/', views.AppointmentListCreateView.as_view(), name='appointment-list-create'),
-    path('appointments/<int:pk>/', views.AppointmentRetrieveUpdateDestroyView.as_view(), name='appointment-detail'),
+    path('appointments/', read_view(views.AppointmentListCreateView), name='appointment-list-create'),
+    path('appointments/<int:pk>/', read_view(views.AppointmentRetrieveUpdateDestroyView), name='appointment-detail'),
+    path('appointments/bulk/', views.AppointmentBulkView.as_view(), name='appointment-bulk'),
 
     # Prescription endpoints
-    path('prescriptions/', views.PrescriptionListCreateView.as_view(), name='prescription-list-create'),
-    path('prescriptions/<int:pk>/', views.PrescriptionRetrieveUpdateDestroyView.as_view(), name='prescription-detail'),
+    path('prescriptions/', read_view(views.PrescriptionListCreateView), name='prescription-list-create'),
+    path('prescriptions/<int:pk>/', read_view(views.PrescriptionRetrieveUpdateDestroyView), name='prescription-detail'),
+    path('prescriptions/bulk/', views.PrescriptionBulkView.as_view(), name='prescription-bulk'),
 
     # HealthRecord endpoints
-    path('health-records/', views.HealthRecordListCreateView.as_view(), name='healthrecord-list-create'),
-    path('health-records/<int:pk>/', views.HealthRecordRetrieveUpdateDestroyView.as_view(), name='healthrecord-detail'),
+    path('health-records/', read_view(views.HealthRecordListCreateView), name='healthrecord-list-create'),
+    path('health-records/<int:pk>/', read_view(views.HealthRecordRetrieveUpdateDestroyView), name='healthrecord-detail'),
+    path('health-records/bulk/', views.HealthRecordBulkView.as_view(), name='healthrecord-bulk'),
+    path('health-records/search/', views.HealthRecordSearchView.as_view(), name='healthrecord-search'),
+
+    # User endpoints
+    path('users/bulk/', views.UserBulkProvisionView.as_view(), name='user-bulk'),
+
+    # Audit endpoints
+    path('audit/', views.AuditEventListView.as_view(), name='audit-list'),
+
+    # Cache endpoints
+    path('cache/stats/', views.CacheStatsView.as_view(), name='cache-stats'),
+
+    # Stats endpoints
+    path('stats/appointments/daily/', views.DoctorDayStatsView.as_view(), name='stats-doctor-days'),
+    path('stats/appointments/status/', views.AppointmentStatusStatsView.as_view(), name='stats-appointment-status'),
+    path('stats/medications/', views.TopMedicationsView.as_view(), name='stats-top-medications'),
+
+    # Metrics endpoints
+    path('_metrics/', views.MetricsView.as_view(), name='metrics'),
 ]
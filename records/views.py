@@ -1,15 +1,55 @@
 
+import copy
+from operator import attrgetter, itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
 # Django REST Framework generic views and schema utilities
-from rest_framework import generics
-from drf_spectacular.utils import extend_schema
+from rest_framework import generics, serializers, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.permissions import SAFE_METHODS, IsAdminUser
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 
 # Import models and serializers for each resource
-from .models import Patient, Doctor, Appointment, Prescription, HealthRecord
+from .models import (
+	Patient, Doctor, Appointment, Prescription, HealthRecord, DoctorDayStats, AppointmentStatusStats, MedicationStats,
+	AuditEvent, AppointmentWithArchive, PrescriptionWithArchive, HealthRecordWithArchive
+)
 from .serializers import (
-	PatientSerializer, DoctorSerializer, AppointmentSerializer,
-	PrescriptionSerializer, HealthRecordSerializer
+	AuditEventSerializer, AvailabilityQuerySerializer, PatientSerializer, DoctorSerializer, AppointmentSerializer,
+	PrescriptionSerializer, HealthRecordSerializer, DoctorDayStatsSerializer, TopMedicationsQuerySerializer,
+	UserProvisionSerializer, optimize_queryset, preload_related_objects
+)
+from .archive import include_archived
+from .audit import AUDIT_ACTIONS, audit_log, rendered_objects
+from .conditional import (
+	PreconditionFailed, compute_validators, etag_matches, not_modified, set_validators, version_columns,
+	version_rows
 )
+from .caching import (
+	collect_tags, get_cached, invalidate_instances, list_tag, request_cache_key, response_cache_usable, set_cached, stats
+)
+from .export import EXPORT_FORMATS, iter_export_lines
+from .fastpath import ValuesReader
+from .filters import RecordFilterBackend
+from .idempotency import IDEMPOTENCY_HEADER, IdempotentResponse, claim_key, release_key, request_fingerprint, store_response
+from .instrumentation import metrics
 from .permissions import IsDoctor, IsPatient
+from .provisioning import CSVRowsParser, ProvisioningError, provision_users
+from .scheduling import find_conflicts, free_intervals, lock_doctors
+from .search import search_health_records
+from .stats import STATUSES
+from .timeline import decode_cursor, encode_cursor, timeline_page
 
 # -----------------------------------------------------------------------------
 # Permission Mixins
@@ -26,16 +66,369 @@ class DoctorPermissionMixin:
 	"""
 	permission_classes = [IsDoctor]
 
+# -----------------------------------------------------------------------------
+# Query Mixins
+# -----------------------------------------------------------------------------
+SPARSE_PARAMETERS = [
+	OpenApiParameter('fields', str, description="Comma-separated list of fields to return, e.g. 'id,status'."),
+	OpenApiParameter('expand', str, description="Comma-separated relations to nest, e.g. 'patient,doctor' or 'appointment.patient'."),
+]
+
+LIST_PARAMETERS = SPARSE_PARAMETERS + [
+	OpenApiParameter('ids', str, description="Comma-separated ids to fetch instead of a page, e.g. '12,3,40'; the response lists them in this order plus the 'missing' ones."),
+]
+
+ARCHIVE_PARAMETER = OpenApiParameter('include_archived', bool, description='Also return archived rows (default false).')
+
+class SparseFieldsMixin:
+	"""
+	Mixin that narrows read querysets to the fields and expansions requested
+	with ?fields= and ?expand=, so unrequested relations are never joined.
+	"""
+	def get_queryset(self):
+		queryset = super().get_queryset()
+		if self.request.method not in SAFE_METHODS:
+			return queryset
+		ordering = [order.lstrip('-') for order in getattr(self, 'ordering', None) or ()]
+		return optimize_queryset(queryset, self.get_serializer(), ordering)
+
+class ArchiveMixin:
+	"""
+	Mixin for views over archivable models. Reads scan the hot table only;
+	a GET with ?include_archived=true reads ``archive_queryset`` instead, a
+	view unioning in the archive table (records/archive.py). Archived rows
+	are read-only, so writes never see them. Listed last, right before the
+	generic view, so the other mixins narrow whichever queryset it returns.
+	"""
+	archive_queryset = None
+
+	def get_queryset(self):
+		if self.request.method in SAFE_METHODS and include_archived(self.request):
+			return self.archive_queryset.all()
+		return super().get_queryset()
+
+class FastListMixin:
+	"""
+	Mixin for list views that renders GET pages straight from .values() rows
+	when PHR_FAST_LIST_SERIALIZATION is enabled, skipping per-row serializer
+	instances. Output is identical to the regular serializer path.
+	"""
+	def list(self, request, *args, **kwargs):
+		reader = self.get_values_reader()
+		if reader is None:
+			return super().list(request, *args, **kwargs)
+		queryset = self.get_values_queryset(reader)
+		page = self.paginate_queryset(queryset)
+		if page is not None:
+			return self.get_paginated_response(reader.render(page))
+		return Response(reader.render(queryset))
+
+	def get_values_reader(self):
+		"""The ValuesReader for this request, or None to use the serializer path."""
+		if not getattr(settings, 'PHR_FAST_LIST_SERIALIZATION', False):
+			return None
+		return ValuesReader.for_serializer(self.get_serializer())
+
+	def get_values_queryset(self, reader):
+		ordering = [order.lstrip('-') for order in getattr(self, 'ordering', None) or ()]
+		return reader.values(self.filter_queryset(self.get_queryset()), ordering)
+
+class ResponseCacheMixin:
+	"""
+	Mixin for list and detail views that serves GETs from the response cache.
+	Entries are keyed on path, query parameters and role, and tagged with
+	every object they render (plus the model's list tag for list pages), so
+	the post_save/post_delete receivers in signals.py evict exactly the
+	responses a write affects. Requests pinned to the primary after their
+	user's write (records/routing.py) bypass the cache.
+	"""
+	def get(self, request, *args, **kwargs):
+		if not response_cache_usable():
+			return super().get(request, *args, **kwargs)
+		key = request_cache_key(request)
+		data = get_cached(key)
+		if data is not None:
+			return Response(data, headers={'X-Cache': 'HIT'})
+		response = super().get(request, *args, **kwargs)
+		if response.status_code == status.HTTP_200_OK:
+			set_cached(key, response.data, self.get_cache_tags(response.data))
+			response['X-Cache'] = 'MISS'
+		return response
+
+	def get_cache_tags(self, data):
+		serializer = self.get_serializer()
+		if (self.lookup_url_kwarg or self.lookup_field) in self.kwargs:
+			return collect_tags(serializer, [data], set())
+		items = data['results'] if isinstance(data, dict) else data
+		return collect_tags(serializer, items, {list_tag(serializer.Meta.model)})
+
+class MultiGetMixin:
+	"""
+	Mixin for list views answering ?ids=12,3,40 with those objects, in the
+	requested order, instead of a page: ``{"results": [...], "missing": [...]}``
+	where ``missing`` holds the ids that do not exist or that the other query
+	filters exclude. Objects are fetched with ``pk IN (...)`` queries of at
+	most PHR_MULTI_GET_BATCH_SIZE ids, so SQLite's bound-parameter limit is
+	never reached, and expanded relations are joined as on list pages.
+	Listed before ConditionalRequestMixin so validators cover exactly these
+	rows; the response cache tags the result like a list page.
+	"""
+	def is_multi_get(self):
+		return self.request.method in SAFE_METHODS and 'ids' in self.request.query_params
+
+	def get_requested_ids(self):
+		"""The ``?ids=`` values as distinct integers in request order."""
+		if not hasattr(self, '_requested_ids'):
+			ids = []
+			for value in self.request.query_params.get('ids').split(','):
+				try:
+					ids.append(int(value))
+				except ValueError:
+					raise ValidationError({'ids': [f"Invalid id '{value.strip()}'."]})
+			ids = list(dict.fromkeys(ids))
+			limit = getattr(settings, 'PHR_MAX_MULTI_GET_IDS', 500)
+			if len(ids) > limit:
+				raise ValidationError({'ids': [f'At most {limit} ids per request.']})
+			self._requested_ids = ids
+		return self._requested_ids
+
+	def fetch_by_ids(self, queryset, key=attrgetter('pk')):
+		"""``{pk: row}`` for the requested ids, one ``IN`` query per batch."""
+		ids = self.get_requested_ids()
+		batch_size = getattr(settings, 'PHR_MULTI_GET_BATCH_SIZE', 500)
+		found = {}
+		for start in range(0, len(ids), batch_size):
+			for row in queryset.filter(pk__in=ids[start:start + batch_size]):
+				found[key(row)] = row
+		return found
+
+	def list(self, request, *args, **kwargs):
+		if not self.is_multi_get():
+			return super().list(request, *args, **kwargs)
+		found = self.fetch_by_ids(self.filter_queryset(self.get_queryset()))
+		objects = [found[pk] for pk in self.get_requested_ids() if pk in found]
+		for obj in objects:
+			self.check_object_permissions(request, obj)
+		return Response({
+			'results': self.get_serializer(objects, many=True).data,
+			'missing': [pk for pk in self.get_requested_ids() if pk not in found],
+		})
+
+	def get_validators(self):
+		if not self.is_multi_get():
+			return super().get_validators()
+		# version_columns start with the primary key.
+		found = self.fetch_by_ids(self.get_validator_queryset(), key=itemgetter(0))
+		return self.validators_from_rows([found[pk] for pk in self.get_requested_ids() if pk in found], False)
+
+	def get_data_validators(self, data):
+		if not self.is_multi_get():
+			return super().get_data_validators(data)
+		rows = version_rows(self.get_serializer(), data['results'])
+		return compute_validators(self.request, rows) if rows is not None else None
+
+class AuditMixin:
+	"""
+	Mixin for views that render or change audited models (PHR_AUDIT_MODELS).
+	Successful responses queue an audit event per audited object they
+	contain, including expanded relations and cached responses, for the
+	background writer in records/audit.py; the request adds no query.
+	"""
+	audit_action = None
+	# AsyncReadView turns this off so the event loop never waits on a full
+	# queue; it puts the entry left in audit_pending from a worker thread.
+	audit_blocking = True
+	audit_pending = None
+
+	def finalize_response(self, request, response, *args, **kwargs):
+		response = super().finalize_response(request, response, *args, **kwargs)
+		if status.is_success(response.status_code):
+			self.audit_pending = audit_log.record(
+				request, self.get_audited_objects(request, response), block=self.audit_blocking)
+		return response
+
+	def get_audited_objects(self, request, response):
+		"""``(action, model, pk)`` for every object the response read or changed."""
+		action = self.audit_action or AUDIT_ACTIONS.get(request.method)
+		# Idempotent replays carry no data; the original response was audited.
+		if action is None or not hasattr(response, 'data'):
+			return []
+		lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+		if request.method == 'DELETE' and lookup_url_kwarg in self.kwargs:
+			return [(action, self.get_queryset().model, self.kwargs[lookup_url_kwarg])]
+		data = response.data
+		if isinstance(data, dict) and 'results' in data and lookup_url_kwarg not in self.kwargs:
+			data = data['results']
+		return rendered_objects(self.get_serializer(), data if isinstance(data, list) else [data], action)
+
+class IdempotencyMixin:
+	"""
+	Mixin for create views honouring an ``Idempotency-Key`` header on POST
+	(records/idempotency.py). The first request with a key runs and its
+	rendered response is stored compressed for PHR_IDEMPOTENCY_TTL seconds;
+	retries with the same key and body get that response back, marked
+	``Idempotent-Replayed: true``, without running the view. Keys are
+	scoped to the user.
+	"""
+	idempotency_record = None
+
+	def initial(self, request, *args, **kwargs):
+		super().initial(request, *args, **kwargs)
+		key = request.headers.get(IDEMPOTENCY_HEADER)
+		if request.method != 'POST' or key is None:
+			return
+		if not 0 < len(key) <= 255:
+			raise ValidationError({IDEMPOTENCY_HEADER: ['Must be 1 to 255 characters.']})
+		record, response = claim_key(int(request.user.pk), key, request_fingerprint(request))
+		if response is not None:
+			raise IdempotentResponse(response)
+		self.idempotency_record = record
+
+	def handle_exception(self, exc):
+		if isinstance(exc, IdempotentResponse):
+			return exc.response
+		try:
+			return super().handle_exception(exc)
+		except Exception:
+			# Unhandled errors propagate without a response to store.
+			if self.idempotency_record is not None:
+				release_key(self.idempotency_record)
+				self.idempotency_record = None
+			raise
+
+	def finalize_response(self, request, response, *args, **kwargs):
+		response = super().finalize_response(request, response, *args, **kwargs)
+		if self.idempotency_record is not None:
+			store_response(self.idempotency_record, response)
+			self.idempotency_record = None
+		return response
+
+class ConditionalRequestMixin:
+	"""
+	Mixin for list and detail views that sends strong ETag and Last-Modified
+	validators derived from the version columns of the rows a response
+	renders, including expanded relations. A GET carrying If-None-Match or
+	If-Modified-Since reads just those columns and answers 304 before the
+	serializer runs; other GETs take the validators from the rendered data.
+	PUT, PATCH and DELETE with a stale If-Match fail with 412.
+	"""
+	def is_detail_request(self):
+		return (self.lookup_url_kwarg or self.lookup_field) in self.kwargs
+
+	def get_validators(self):
+		"""Return ``(etag, last_modified)`` from the database, or None when the object does not exist."""
+		queryset = self.get_validator_queryset()
+		rows = None if self.is_detail_request() else self.paginate_queryset(queryset)
+		return self.validators_from_rows(list(queryset) if rows is None else rows, rows is not None)
+
+	def get_validator_queryset(self):
+		"""The version columns of the rows the response renders, as a values_list queryset."""
+		queryset = self.filter_queryset(self.get_queryset())
+		if self.is_detail_request():
+			lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+			queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+		return queryset.values_list(*version_columns(self.get_serializer()))
+
+	def validators_from_rows(self, rows, paginated):
+		if self.is_detail_request():
+			return compute_validators(self.request, rows) if rows else None
+		if not paginated:
+			return compute_validators(self.request, rows)
+		links = (bool(rows) and self.paginator.has_next, bool(rows) and self.paginator.has_previous)
+		return compute_validators(self.request, rows, links)
+
+	def get_data_validators(self, data):
+		"""Validators from rendered data, matching get_validators(); None if they cannot be derived."""
+		serializer = self.get_serializer()
+		if self.is_detail_request():
+			rows = version_rows(serializer, [data])
+			return compute_validators(self.request, rows) if rows is not None else None
+		if not isinstance(data, dict):
+			rows = version_rows(serializer, data)
+			return compute_validators(self.request, rows) if rows is not None else None
+		rows = version_rows(serializer, data['results'])
+		links = (data['next'] is not None, data['previous'] is not None)
+		return compute_validators(self.request, rows, links) if rows is not None else None
+
+	def get(self, request, *args, **kwargs):
+		validators = None
+		if 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers:
+			validators = self.get_validators()
+			if validators and not_modified(request, *validators):
+				return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), *validators)
+		response = super().get(request, *args, **kwargs)
+		if response.status_code == status.HTTP_200_OK:
+			validators = validators or self.get_data_validators(response.data) or self.get_validators()
+			if validators:
+				set_validators(response, *validators)
+		return response
+
+	def update(self, request, *args, **kwargs):
+		response = super().update(request, *args, **kwargs)
+		validators = self.get_data_validators(response.data) or self.get_validators()
+		if validators:
+			set_validators(response, *validators)
+		return response
+
+	def perform_update(self, serializer):
+		with transaction.atomic():
+			self._check_if_match(serializer.instance)
+			super().perform_update(serializer)
+
+	def perform_destroy(self, instance):
+		with transaction.atomic():
+			self._check_if_match(instance)
+			super().perform_destroy(instance)
+
+	def _check_if_match(self, instance):
+		if_match = self.request.headers.get('If-Match')
+		if if_match is None:
+			return
+		validators = self.get_validators()
+		if validators is None or not etag_matches(if_match, validators[0]):
+			raise PreconditionFailed()
+		# Claim the version the client saw; a concurrent writer that got there
+		# first has already bumped it, so this matches no row.
+		claimed = type(instance).objects.filter(pk=instance.pk, version=instance.version).update(version=F('version') + 1)
+		if not claimed:
+			raise PreconditionFailed()
+
+DOUBLE_BOOKING_MESSAGE = 'The doctor already has a scheduled appointment overlapping this time.'
+
+class AppointmentBookingMixin:
+	"""
+	Mixin for appointment create/update views that rejects double bookings.
+	The doctor's schedule is locked for the transaction, so concurrent
+	requests cannot both pass the overlap check.
+	"""
+	def perform_create(self, serializer):
+		self._book(serializer, Appointment(**serializer.validated_data))
+
+	def perform_update(self, serializer):
+		candidate = copy.copy(serializer.instance)
+		for attr, value in serializer.validated_data.items():
+			setattr(candidate, attr, value)
+		self._book(serializer, candidate)
+
+	def _book(self, serializer, candidate):
+		with transaction.atomic():
+			lock_doctors([candidate.doctor_id])
+			if find_conflicts([candidate])[0]:
+				raise ValidationError({'appointment_datetime': [DOUBLE_BOOKING_MESSAGE]})
+			serializer.save()
+
 # -----------------------------------------------------------------------------
 # Patient API Views
 # -----------------------------------------------------------------------------
-class PatientListCreateView(PatientPermissionMixin, generics.ListCreateAPIView):
+class PatientListCreateView(PatientPermissionMixin, AuditMixin, IdempotencyMixin, MultiGetMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, generics.ListCreateAPIView):
 	queryset = Patient.objects.all()
 	serializer_class = PatientSerializer
+	ordering = ('id',)
 
 	@extend_schema(
 		description="List and create patients. Requires JWT authentication and 'patient' role.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=LIST_PARAMETERS,
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
@@ -47,27 +440,103 @@ class PatientListCreateView(PatientPermissionMixin, generics.ListCreateAPIView):
 	def post(self, request, *args, **kwargs):
 		return super().post(request, *args, **kwargs)
 
-class PatientRetrieveUpdateDestroyView(PatientPermissionMixin, generics.RetrieveUpdateDestroyAPIView):
+class PatientRetrieveUpdateDestroyView(PatientPermissionMixin, AuditMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
 	queryset = Patient.objects.all()
 	serializer_class = PatientSerializer
 
 	@extend_schema(
 		description="Retrieve, update, or delete a patient. Requires JWT authentication and 'patient' role.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=SPARSE_PARAMETERS,
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
 
+class PatientExportView(PatientPermissionMixin, AuditMixin, APIView):
+	"""
+	Stream a patient's full chart (profile, health records, appointments and
+	prescriptions) as NDJSON or CSV without loading it into memory.
+	"""
+	@extend_schema(
+		description="Stream a patient's full record as NDJSON (default) or CSV. Requires JWT authentication and 'patient' role.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=[OpenApiParameter('output', str, enum=list(EXPORT_FORMATS), description="'ndjson' or 'csv'.")],
+		responses={(200, content_type): str for content_type in EXPORT_FORMATS.values()},
+	)
+	def get(self, request, pk, *args, **kwargs):
+		export_format = request.query_params.get('output', 'ndjson')
+		if export_format not in EXPORT_FORMATS:
+			return Response({'detail': f"Unsupported output '{export_format}'."}, status=status.HTTP_400_BAD_REQUEST)
+		if not Patient.objects.filter(pk=pk).exists():
+			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+		response = StreamingHttpResponse(
+			iter_export_lines(pk, export_format), content_type=EXPORT_FORMATS[export_format])
+		response['Content-Disposition'] = f'attachment; filename="patient-{pk}.{export_format}"'
+		return response
+
+	def get_audited_objects(self, request, response):
+		# The whole chart is exported; one event on the patient stands for it.
+		return [('export', Patient, self.kwargs['pk'])]
+
+class PatientTimelineView(PatientPermissionMixin, AuditMixin, APIView):
+	"""
+	A patient's appointments, health records and prescriptions as one
+	chronological stream, paginated by a (timestamp, type, id) cursor.
+	"""
+	@extend_schema(
+		description="List a patient's appointments, health records and prescriptions in chronological order. Requires JWT authentication and 'patient' role.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=[
+			OpenApiParameter('cursor', str, description='The pagination cursor value.'),
+			OpenApiParameter('page_size', int, description='Number of results to return per page.'),
+			ARCHIVE_PARAMETER,
+		],
+		responses={200: OpenApiTypes.OBJECT},
+	)
+	def get(self, request, pk, *args, **kwargs):
+		if not Patient.objects.filter(pk=pk).exists():
+			raise NotFound()
+		cursor = request.query_params.get('cursor')
+		try:
+			cursor = decode_cursor(cursor) if cursor else None
+		except ValueError:
+			raise NotFound('Invalid cursor')
+		try:
+			page_size = min(int(request.query_params['page_size']), getattr(settings, 'PHR_MAX_PAGE_SIZE', 500))
+		except (KeyError, ValueError):
+			page_size = api_settings.PAGE_SIZE
+		page_size = max(page_size, 1)
+
+		events, has_more = timeline_page(pk, cursor, page_size, include_archived(request))
+		timestamp_field = serializers.DateTimeField()
+		results = [
+			{'type': event_type, 'timestamp': timestamp_field.to_representation(timestamp), 'data': data}
+			for (timestamp, event_type, _), data in events
+		]
+		next_link = None
+		if has_more:
+			next_link = replace_query_param(
+				request.build_absolute_uri(), 'cursor', encode_cursor(events[-1][0]))
+		return Response({'next': next_link, 'results': results})
+
+	def get_audited_objects(self, request, response):
+		models = {'appointment': Appointment, 'health_record': HealthRecord, 'prescription': Prescription}
+		return [('read', Patient, self.kwargs['pk'])] + [
+			('read', models[event['type']], event['data']['id']) for event in response.data['results']]
+
 # -----------------------------------------------------------------------------
 # Doctor API Views
 # -----------------------------------------------------------------------------
-class DoctorListCreateView(DoctorPermissionMixin, generics.ListCreateAPIView):
+class DoctorListCreateView(DoctorPermissionMixin, IdempotencyMixin, MultiGetMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, generics.ListCreateAPIView):
 	queryset = Doctor.objects.all()
 	serializer_class = DoctorSerializer
+	ordering = ('id',)
 
 	@extend_schema(
 		description="List and create doctors. Requires JWT authentication and 'doctor' role.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=LIST_PARAMETERS,
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
@@ -79,27 +548,60 @@ class DoctorListCreateView(DoctorPermissionMixin, generics.ListCreateAPIView):
 	def post(self, request, *args, **kwargs):
 		return super().post(request, *args, **kwargs)
 
-class DoctorRetrieveUpdateDestroyView(DoctorPermissionMixin, generics.RetrieveUpdateDestroyAPIView):
+class DoctorRetrieveUpdateDestroyView(DoctorPermissionMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
 	queryset = Doctor.objects.all()
 	serializer_class = DoctorSerializer
 
 	@extend_schema(
 		description="Retrieve, update, or delete a doctor. Requires JWT authentication and 'doctor' role.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=SPARSE_PARAMETERS,
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
 
+class DoctorAvailabilityView(APIView):
+	"""
+	Free gaps in a doctor's schedule between ?from= and ?to= that are at
+	least ?duration= minutes long. Open to both doctors and patients.
+	"""
+	permission_classes = [IsDoctor | IsPatient]
+
+	@extend_schema(
+		description="List a doctor's free time between 'from' and 'to' in gaps of at least 'duration' minutes. Requires JWT authentication and 'doctor' or 'patient' role.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=[AvailabilityQuerySerializer],
+		responses={200: OpenApiTypes.OBJECT},
+	)
+	def get(self, request, pk, *args, **kwargs):
+		if not Doctor.objects.filter(pk=pk).exists():
+			raise NotFound()
+		query = AvailabilityQuerySerializer(data=request.query_params)
+		query.is_valid(raise_exception=True)
+		start, end = query.validated_data['from'], query.validated_data['to']
+		timestamp_field = serializers.DateTimeField()
+		free = [
+			{'start': timestamp_field.to_representation(gap_start), 'end': timestamp_field.to_representation(gap_end)}
+			for gap_start, gap_end in free_intervals(pk, start, end, query.validated_data['duration'])
+		]
+		return Response({'doctor_id': pk, 'free': free})
+
 # -----------------------------------------------------------------------------
 # Appointment API Views
 # -----------------------------------------------------------------------------
-class AppointmentListCreateView(PatientPermissionMixin, generics.ListCreateAPIView):
-	queryset = Appointment.objects.all()
+class AppointmentListCreateView(PatientPermissionMixin, AuditMixin, IdempotencyMixin, MultiGetMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, FastListMixin, AppointmentBookingMixin, ArchiveMixin, generics.ListCreateAPIView):
+	queryset = Appointment.objects.select_related('patient', 'doctor')
+	archive_queryset = AppointmentWithArchive.objects.select_related('patient', 'doctor')
 	serializer_class = AppointmentSerializer
+	ordering = ('appointment_datetime', 'id')
+	filter_backends = [RecordFilterBackend]
+	filter_fields = {'patient': 'patient_id', 'doctor': 'doctor_id', 'status': 'status'}
+	date_range_field = 'appointment_datetime'
 
 	@extend_schema(
 		description="List and create appointments. Requires JWT authentication and 'patient' role.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=LIST_PARAMETERS + [ARCHIVE_PARAMETER],
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
@@ -111,13 +613,15 @@ class AppointmentListCreateView(PatientPermissionMixin, generics.ListCreateAPIVi
 	def post(self, request, *args, **kwargs):
 		return super().post(request, *args, **kwargs)
 
-class AppointmentRetrieveUpdateDestroyView(PatientPermissionMixin, generics.RetrieveUpdateDestroyAPIView):
-	queryset = Appointment.objects.all()
+class AppointmentRetrieveUpdateDestroyView(PatientPermissionMixin, AuditMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, AppointmentBookingMixin, ArchiveMixin, generics.RetrieveUpdateDestroyAPIView):
+	queryset = Appointment.objects.select_related('patient', 'doctor')
+	archive_queryset = AppointmentWithArchive.objects.select_related('patient', 'doctor')
 	serializer_class = AppointmentSerializer
 
 	@extend_schema(
 		description="Retrieve, update, or delete an appointment. Requires JWT authentication and 'patient' role.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=SPARSE_PARAMETERS + [ARCHIVE_PARAMETER],
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
@@ -125,13 +629,16 @@ class AppointmentRetrieveUpdateDestroyView(PatientPermissionMixin, generics.Retr
 # -----------------------------------------------------------------------------
 # Prescription API Views
 # -----------------------------------------------------------------------------
-class PrescriptionListCreateView(DoctorPermissionMixin, generics.ListCreateAPIView):
-	queryset = Prescription.objects.all()
+class PrescriptionListCreateView(DoctorPermissionMixin, AuditMixin, IdempotencyMixin, MultiGetMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, ArchiveMixin, generics.ListCreateAPIView):
+	queryset = Prescription.objects.select_related('appointment__patient', 'appointment__doctor')
+	archive_queryset = PrescriptionWithArchive.objects.select_related('appointment__patient', 'appointment__doctor')
 	serializer_class = PrescriptionSerializer
+	ordering = ('id',)
 
 	@extend_schema(
 		description="List and create prescriptions. Requires JWT authentication and 'doctor' role.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=LIST_PARAMETERS + [ARCHIVE_PARAMETER],
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
@@ -143,13 +650,15 @@ class PrescriptionListCreateView(DoctorPermissionMixin, generics.ListCreateAPIVi
 	def post(self, request, *args, **kwargs):
 		return super().post(request, *args, **kwargs)
 
-class PrescriptionRetrieveUpdateDestroyView(DoctorPermissionMixin, generics.RetrieveUpdateDestroyAPIView):
-	queryset = Prescription.objects.all()
+class PrescriptionRetrieveUpdateDestroyView(DoctorPermissionMixin, AuditMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, ArchiveMixin, generics.RetrieveUpdateDestroyAPIView):
+	queryset = Prescription.objects.select_related('appointment__patient', 'appointment__doctor')
+	archive_queryset = PrescriptionWithArchive.objects.select_related('appointment__patient', 'appointment__doctor')
 	serializer_class = PrescriptionSerializer
 
 	@extend_schema(
 		description="Retrieve, update, or delete a prescription. Requires JWT authentication and 'doctor' role.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=SPARSE_PARAMETERS + [ARCHIVE_PARAMETER],
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
@@ -157,13 +666,19 @@ class PrescriptionRetrieveUpdateDestroyView(DoctorPermissionMixin, generics.Retr
 # -----------------------------------------------------------------------------
 # HealthRecord API Views
 # -----------------------------------------------------------------------------
-class HealthRecordListCreateView(generics.ListCreateAPIView):
-	queryset = HealthRecord.objects.all()
+class HealthRecordListCreateView(AuditMixin, IdempotencyMixin, MultiGetMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, FastListMixin, ArchiveMixin, generics.ListCreateAPIView):
+	queryset = HealthRecord.objects.select_related('patient', 'doctor')
+	archive_queryset = HealthRecordWithArchive.objects.select_related('patient', 'doctor')
 	serializer_class = HealthRecordSerializer
+	ordering = ('record_date', 'id')
+	filter_backends = [RecordFilterBackend]
+	filter_fields = {'patient': 'patient_id', 'doctor': 'doctor_id'}
+	date_range_field = 'record_date'
 
 	@extend_schema(
 		description="List and create health records. Requires JWT authentication.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=LIST_PARAMETERS + [ARCHIVE_PARAMETER],
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
@@ -175,13 +690,413 @@ class HealthRecordListCreateView(generics.ListCreateAPIView):
 	def post(self, request, *args, **kwargs):
 		return super().post(request, *args, **kwargs)
 
-class HealthRecordRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-	queryset = HealthRecord.objects.all()
+class HealthRecordSearchView(AuditMixin, APIView):
+	"""
+	Full-text search over health record diagnosis and treatment, best match
+	first, with a highlighted snippet per result. ?include_archived=true
+	searches the archived records too.
+	"""
+	@extend_schema(
+		description="Search health records by diagnosis and treatment. Supports \"quoted phrases\" and prefix* terms. Requires JWT authentication.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=[
+			OpenApiParameter('q', str, required=True, description='Search terms.'),
+			OpenApiParameter('page_size', int, description='Number of results to return.'),
+			*SPARSE_PARAMETERS,
+			ARCHIVE_PARAMETER,
+		],
+		responses={200: OpenApiTypes.OBJECT},
+	)
+	def get(self, request, *args, **kwargs):
+		query = request.query_params.get('q', '').strip()
+		if not query:
+			raise ValidationError({'q': ['This parameter is required.']})
+		try:
+			limit = min(int(request.query_params['page_size']), getattr(settings, 'PHR_MAX_PAGE_SIZE', 500))
+		except (KeyError, ValueError):
+			limit = api_settings.PAGE_SIZE
+		archived = include_archived(request)
+		matches = search_health_records(query, max(limit, 1), include_archived=archived)
+
+		model = HealthRecordWithArchive if archived else HealthRecord
+		records = optimize_queryset(
+			model.objects.filter(pk__in=[pk for pk, _, _ in matches]),
+			HealthRecordSerializer(context={'request': request, 'view': self})).in_bulk()
+		matches = [(records[pk], rank, snippet) for pk, rank, snippet in matches if pk in records]
+		data = HealthRecordSerializer(
+			[record for record, _, _ in matches], many=True, context={'request': request, 'view': self}).data
+		results = [
+			{**item, 'rank': rank, 'snippet': snippet}
+			for item, (_, rank, snippet) in zip(data, matches)
+		]
+		return Response({'results': results})
+
+	def get_audited_objects(self, request, response):
+		serializer = HealthRecordSerializer(context={'request': request, 'view': self})
+		return rendered_objects(serializer, response.data['results'], 'read')
+
+class HealthRecordRetrieveUpdateDestroyView(AuditMixin, ConditionalRequestMixin, ResponseCacheMixin, SparseFieldsMixin, ArchiveMixin, generics.RetrieveUpdateDestroyAPIView):
+	queryset = HealthRecord.objects.select_related('patient', 'doctor')
+	archive_queryset = HealthRecordWithArchive.objects.select_related('patient', 'doctor')
 	serializer_class = HealthRecordSerializer
 
 	@extend_schema(
 		description="Retrieve, update, or delete a health record. Requires JWT authentication.",
 		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=SPARSE_PARAMETERS + [ARCHIVE_PARAMETER],
+	)
+	def get(self, request, *args, **kwargs):
+		return super().get(request, *args, **kwargs)
+
+
+# -----------------------------------------------------------------------------
+# Bulk API Views
+# -----------------------------------------------------------------------------
+def get_bulk_items(request):
+	"""The request's list of objects and None, or None and an error response."""
+	items = request.data
+	if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+		return None, Response({'detail': 'Expected a list of objects.'}, status=status.HTTP_400_BAD_REQUEST)
+	max_items = getattr(settings, 'PHR_BULK_MAX_ITEMS', 5000)
+	if len(items) > max_items:
+		return None, Response(
+			{'detail': f'At most {max_items} items may be sent per request.'},
+			status=status.HTTP_400_BAD_REQUEST)
+	return items, None
+
+class BulkCreateUpdateAPIView(AuditMixin, IdempotencyMixin, generics.GenericAPIView):
+	"""
+	Create (POST) or partially update (PATCH) many objects from a JSON array.
+
+	Foreign keys for the whole batch are resolved with one IN query per
+	related model, rows are written with bulk_create/bulk_update in batches of
+	PHR_BULK_BATCH_SIZE inside one transaction, and validation failures are
+	reported per item as an `errors` list aligned with the input. Nothing is
+	written unless every item is valid. Subclasses can add checks that need
+	the whole batch (and the transaction) by overriding check_batch().
+	"""
+	def _get_items(self, request):
+		return get_bulk_items(request)
+
+	def get_serializer_context(self):
+		context = super().get_serializer_context()
+		context['related_objects'] = getattr(self, 'related_objects', {})
+		return context
+
+	def check_batch(self, objects):
+		"""Return per-object error dicts for unsaved objects, inside the write transaction."""
+		return [{} for _ in objects]
+
+	def _rejected(self, errors):
+		transaction.set_rollback(True)
+		return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+	def post(self, request, *args, **kwargs):
+		items, error = self._get_items(request)
+		if error:
+			return error
+		self.related_objects = preload_related_objects(self.get_serializer(), items)
+		serializer = self.get_serializer(data=items, many=True)
+		if not serializer.is_valid():
+			return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+		model = self.get_queryset().model
+		objects = [model(**attrs) for attrs in serializer.validated_data]
+		with transaction.atomic():
+			errors = self.check_batch(objects)
+			if any(errors):
+				return self._rejected(errors)
+			model.objects.bulk_create(objects, batch_size=getattr(settings, 'PHR_BULK_BATCH_SIZE', 500))
+			# bulk_create/bulk_update send no post_save signals.
+			invalidate_instances(model, [obj.pk for obj in objects])
+		return Response(self.get_serializer(objects, many=True).data, status=status.HTTP_201_CREATED)
+
+	def patch(self, request, *args, **kwargs):
+		items, error = self._get_items(request)
+		if error:
+			return error
+		self.related_objects = preload_related_objects(self.get_serializer(), items)
+		instances = self.get_queryset().in_bulk([item['id'] for item in items if isinstance(item.get('id'), int)])
+
+		errors, objects, fields, seen = [], [], set(), set()
+		now = timezone.now()
+		for item in items:
+			instance = instances.get(item.get('id'))
+			if instance is None:
+				errors.append({'id': ['Object with this id does not exist.']})
+				continue
+			if instance.pk in seen:
+				# Both items would update the same instance, and bulk_update
+				# would write it twice with the last item winning.
+				errors.append({'id': ['Object with this id appears more than once.']})
+				continue
+			seen.add(instance.pk)
+			serializer = self.get_serializer(instance, data=item, partial=True)
+			if not serializer.is_valid():
+				errors.append(serializer.errors)
+				continue
+			errors.append({})
+			for attr, value in serializer.validated_data.items():
+				setattr(instance, attr, value)
+			# bulk_update bypasses save(), so bump the row version here.
+			instance.version += 1
+			instance.updated_at = now
+			fields.update(serializer.validated_data, ('version', 'updated_at'))
+			objects.append(instance)
+		if any(errors):
+			return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+		if fields:
+			with transaction.atomic():
+				errors = self.check_batch(objects)
+				if any(errors):
+					return self._rejected(errors)
+				self.get_queryset().model.objects.bulk_update(
+					objects, sorted(fields), batch_size=getattr(settings, 'PHR_BULK_BATCH_SIZE', 500))
+				invalidate_instances(self.get_queryset().model, [obj.pk for obj in objects])
+		return Response(self.get_serializer(objects, many=True).data)
+
+class AppointmentBulkView(PatientPermissionMixin, BulkCreateUpdateAPIView):
+	queryset = Appointment.objects.all()
+	serializer_class = AppointmentSerializer
+
+	def check_batch(self, objects):
+		lock_doctors([appointment.doctor_id for appointment in objects])
+		return [
+			{'appointment_datetime': [DOUBLE_BOOKING_MESSAGE]} if conflict else {}
+			for conflict in find_conflicts(objects)
+		]
+
+	@extend_schema(
+		description="Create appointments in bulk from a list. Requires JWT authentication and 'patient' role.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		request=AppointmentSerializer(many=True),
+		responses={201: AppointmentSerializer(many=True)},
+	)
+	def post(self, request, *args, **kwargs):
+		return super().post(request, *args, **kwargs)
+
+	@extend_schema(
+		description="Partially update appointments in bulk; each item must include its 'id'. Requires JWT authentication and 'patient' role.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		request=AppointmentSerializer(many=True),
+		responses={200: AppointmentSerializer(many=True)},
+	)
+	def patch(self, request, *args, **kwargs):
+		return super().patch(request, *args, **kwargs)
+
+class PrescriptionBulkView(DoctorPermissionMixin, BulkCreateUpdateAPIView):
+	queryset = Prescription.objects.all()
+	serializer_class = PrescriptionSerializer
+
+	@extend_schema(
+		description="Create prescriptions in bulk from a list. Requires JWT authentication and 'doctor' role.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		request=PrescriptionSerializer(many=True),
+		responses={201: PrescriptionSerializer(many=True)},
+	)
+	def post(self, request, *args, **kwargs):
+		return super().post(request, *args, **kwargs)
+
+	@extend_schema(
+		description="Partially update prescriptions in bulk; each item must include its 'id'. Requires JWT authentication and 'doctor' role.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		request=PrescriptionSerializer(many=True),
+		responses={200: PrescriptionSerializer(many=True)},
+	)
+	def patch(self, request, *args, **kwargs):
+		return super().patch(request, *args, **kwargs)
+
+class HealthRecordBulkView(BulkCreateUpdateAPIView):
+	queryset = HealthRecord.objects.all()
+	serializer_class = HealthRecordSerializer
+
+	@extend_schema(
+		description="Create health records in bulk from a list. Requires JWT authentication.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		request=HealthRecordSerializer(many=True),
+		responses={201: HealthRecordSerializer(many=True)},
+	)
+	def post(self, request, *args, **kwargs):
+		return super().post(request, *args, **kwargs)
+
+	@extend_schema(
+		description="Partially update health records in bulk; each item must include its 'id'. Requires JWT authentication.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		request=HealthRecordSerializer(many=True),
+		responses={200: HealthRecordSerializer(many=True)},
+	)
+	def patch(self, request, *args, **kwargs):
+		return super().patch(request, *args, **kwargs)
+
+# -----------------------------------------------------------------------------
+# User API Views
+# -----------------------------------------------------------------------------
+class UserBulkProvisionView(IdempotencyMixin, APIView):
+	"""
+	Create or update users and their roles in bulk (records/provisioning.py).
+	"""
+	permission_classes = [IsAdminUser]
+	parser_classes = [JSONParser, CSVRowsParser]
+
+	@extend_schema(
+		description=(
+			"Create or update users, matched by username, with their roles from a JSON array or a CSV body "
+			"(text/csv with a header line). A password is required for new users. Nothing is written unless "
+			"every item is valid; users whose role or staff flag changes have their tokens revoked. "
+			"Requires JWT authentication and staff status."
+		),
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		request=UserProvisionSerializer(many=True),
+		responses={200: OpenApiTypes.OBJECT, 201: OpenApiTypes.OBJECT},
+	)
+	def post(self, request, *args, **kwargs):
+		items, error = get_bulk_items(request)
+		if error:
+			return error
+		try:
+			result = provision_users(items)
+		except ProvisioningError as exc:
+			return Response({'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+		return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+
+# -----------------------------------------------------------------------------
+# Audit API Views
+# -----------------------------------------------------------------------------
+class AuditEventListView(generics.ListAPIView):
+	"""
+	The PHI access audit log (records/audit.py), oldest first. Events reach
+	it in batches, up to PHR_AUDIT_FLUSH_INTERVAL seconds after the request.
+	"""
+	permission_classes = [IsAdminUser]
+	queryset = AuditEvent.objects.all()
+	serializer_class = AuditEventSerializer
+	ordering = ('timestamp', 'id')
+	filter_backends = [RecordFilterBackend]
+	filter_fields = {'user': 'user_id', 'model': 'model', 'object_id': 'object_id', 'action': 'action'}
+	date_range_field = 'timestamp'
+
+	@extend_schema(
+		description=(
+			"List audit events (who read or changed which patient, health record or prescription), optionally "
+			"for one 'user', 'model' (e.g. 'patient') and 'object_id', 'action', and between 'from' and 'to'. "
+			"Requires JWT authentication and staff status."
+		),
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
 	)
 	def get(self, request, *args, **kwargs):
 		return super().get(request, *args, **kwargs)
+
+# -----------------------------------------------------------------------------
+# Cache API Views
+# -----------------------------------------------------------------------------
+class CacheStatsView(APIView):
+	"""
+	Response cache hit/miss/invalidation counters for this worker process.
+	"""
+	permission_classes = [IsAdminUser]
+
+	@extend_schema(
+		description="Response cache counters for the serving process. Requires JWT authentication and staff status.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		responses={200: OpenApiTypes.OBJECT},
+	)
+	def get(self, request, *args, **kwargs):
+		return Response(stats.as_dict())
+
+
+# -----------------------------------------------------------------------------
+# Stats API Views
+# -----------------------------------------------------------------------------
+class DoctorDayStatsView(generics.ListAPIView):
+	"""
+	Appointments per doctor per UTC day, by status, read from the
+	incrementally maintained summary table (records/stats.py).
+	"""
+	permission_classes = [IsAdminUser]
+	queryset = DoctorDayStats.objects.all()
+	serializer_class = DoctorDayStatsSerializer
+	ordering = ('day', 'id')
+	filter_backends = [RecordFilterBackend]
+	filter_fields = {'doctor': 'doctor_id'}
+	date_range_field = 'day'
+
+	@extend_schema(
+		description="Appointments per doctor per day with per-status counts, optionally for one 'doctor' and between 'from' and 'to'. Requires JWT authentication and staff status.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+	)
+	def get(self, request, *args, **kwargs):
+		return super().get(request, *args, **kwargs)
+
+class AppointmentStatusStatsView(APIView):
+	"""
+	Appointment counts and shares per status, from one summary row per status.
+	"""
+	permission_classes = [IsAdminUser]
+
+	@extend_schema(
+		description="Number and share of appointments in each status. Requires JWT authentication and staff status.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		responses={200: OpenApiTypes.OBJECT},
+	)
+	def get(self, request, *args, **kwargs):
+		counts = dict.fromkeys(STATUSES, 0)
+		counts.update(AppointmentStatusStats.objects.values_list('status', 'appointments'))
+		total = sum(counts.values())
+		return Response({
+			'total': total,
+			'statuses': [
+				{'status': name, 'appointments': count, 'rate': round(count / total, 4) if total else None}
+				for name, count in counts.items()
+			],
+		})
+
+class TopMedicationsView(APIView):
+	"""
+	The most-prescribed medications, read in order from the summary table's
+	index.
+	"""
+	permission_classes = [IsAdminUser]
+
+	@extend_schema(
+		description="The ?limit= (default 10, at most 100) most-prescribed medications with their prescription counts. Requires JWT authentication and staff status.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		parameters=[TopMedicationsQuerySerializer],
+		responses={200: OpenApiTypes.OBJECT},
+	)
+	def get(self, request, *args, **kwargs):
+		query = TopMedicationsQuerySerializer(data=request.query_params)
+		query.is_valid(raise_exception=True)
+		rows = MedicationStats.objects.order_by('-prescriptions', 'medication').values('medication', 'prescriptions')
+		return Response({'results': list(rows[:query.validated_data['limit']])})
+
+
+# -----------------------------------------------------------------------------
+# Metrics API Views
+# -----------------------------------------------------------------------------
+class MetricsView(APIView):
+	"""
+	Per-endpoint latency percentiles and phase breakdowns of the requests
+	sampled by the instrumentation middleware in this worker process.
+	"""
+	permission_classes = [IsAdminUser]
+
+	@extend_schema(
+		description="Per-endpoint p50/p95/p99 latency, query count and DB, auth, serialization and render time of sampled requests in the serving process. Requires JWT authentication and staff status.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		responses={200: OpenApiTypes.OBJECT},
+	)
+	def get(self, request, *args, **kwargs):
+		return Response({
+			'sample_rate': getattr(settings, 'PHR_METRICS_SAMPLE_RATE', 0.0),
+			'endpoints': metrics.as_dict(),
+		})
+
+	@extend_schema(
+		description="Clear the serving process's request metrics, e.g. before a load test. Requires JWT authentication and staff status.",
+		auth=[{'type': 'http', 'scheme': 'bearer'}],
+		responses={204: None},
+	)
+	def delete(self, request, *args, **kwargs):
+		metrics.reset()
+		return Response(status=status.HTTP_204_NO_CONTENT)